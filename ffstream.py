@@ -1,27 +1,29 @@
 #!/usr/bin/env python3
 
 from ffstream.core import Application
-from ffstream.generate import GeneratePlaylistCommand
-from ffstream.stream import StreamPlaylistCommand
-from ffstream.media import FixMediaMetaCommand
-from ffstream.testbed import TestbedCommand
-from ffstream.filter import IntervalTextFilter, ImageOverlayFilter, VideoInformationFilter
 
 
 def main():
 	try:
 		application = Application()
 
-		# Add in commands into the Application
-		application.add_command(GeneratePlaylistCommand(application))
-		application.add_command(StreamPlaylistCommand(application))
-		application.add_command(FixMediaMetaCommand(application))
-		application.add_command(TestbedCommand(application))
-
-		# Add in filters to the FilterManager
-		application.filter_manager().add(IntervalTextFilter())
-		application.filter_manager().add(ImageOverlayFilter())
-		application.filter_manager().add(VideoInformationFilter())
+		# Register commands with the Application, each is imported once it is run
+		application.register_command('generate:playlist', 'ffstream.generate:GeneratePlaylistCommand', 'Generates a playlist from specified directory')
+		application.register_command('stream:playlist', 'ffstream.stream:StreamPlaylistCommand', 'Start streaming from a json playlist')
+		application.register_command('playlist:compile', 'ffstream.compile:CompilePlaylistCommand', 'Compiles a json playlist into a memory mapped binary playlist')
+		application.register_command('library:import', 'ffstream.library:LibraryImportCommand', 'Imports playlist entries or indexed media into a playlist library')
+		application.register_command('library:playlist', 'ffstream.library:LibraryPlaylistCommand', 'Defines a playlist in a library by the query selecting its entries')
+		application.register_command('media:fix-meta', 'ffstream.media:FixMediaMetaCommand', 'Fix missing meta information from media files in directory.')
+		application.register_command('media:verify', 'ffstream.media:VerifyMediaCommand', 'Fully decode media files in directory, quarantining truncated or corrupt files.')
+		application.register_command('bench:filters', 'ffstream.bench:BenchFiltersCommand', 'Measures what each filter costs on a synthetic clip at the output resolution')
+		application.register_command('bench:profile', 'ffstream.bench:BenchProfileCommand', 'Finds the highest quality encoder preset this machine encodes the playlist fast enough with')
+		application.register_command('test', 'ffstream.testbed:TestbedCommand', 'TEST')
+
+		# Register filters with the FilterManager, each is imported once a playlist uses it
+		application.filter_manager().register('continuous_text', 'ffstream.filter:ContinuousTextFilter')
+		application.filter_manager().register('interval_text', 'ffstream.filter:IntervalTextFilter')
+		application.filter_manager().register('image_overlay', 'ffstream.filter:ImageOverlayFilter')
+		application.filter_manager().register('video_info', 'ffstream.filter:VideoInformationFilter')
 
 		return application.run()
 	except KeyboardInterrupt:
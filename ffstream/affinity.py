@@ -0,0 +1,195 @@
+import os
+import json
+import fcntl
+import tempfile
+import threading
+from collections import OrderedDict
+from .ffmpeg import ArgumentContainer
+
+
+"""
+CpuScheduler - Shares the host's cores between the channels running on it
+
+Every channel leases a core set for its encoder and one for its decoder from a state
+file shared by all ffstream processes on the host. Cores no other channel holds are
+handed out first, once none are left the least shared ones are. Leases of processes
+that are gone are dropped the next time the file is read.
+"""
+
+
+class CpuScheduler:
+	DEFAULT_ENCODER_CORES = 2
+	DEFAULT_DECODER_CORES = 1
+
+	def __init__(self, state_path: str = None, cores: list = None):
+		if state_path is None:
+			state_path = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(), 'ffstream-cpu.json')
+
+		self._state_path = state_path
+		self._cores = sorted(cores) if cores is not None else sorted(os.sched_getaffinity(0))
+
+	def state_path(self) -> str:
+		return self._state_path
+
+	def cores(self) -> list:
+		return self._cores
+
+	def _update(self, change):
+		# the file lock serializes every channel on the host
+		with open(self._state_path, 'a+') as fp:
+			fcntl.flock(fp, fcntl.LOCK_EX)
+
+			try:
+				fp.seek(0)
+				content = fp.read()
+
+				try:
+					leases = json.loads(content) if len(content.strip()) else {}
+				except ValueError:
+					leases = {}
+
+				leases = dict((k, v) for k, v in leases.items() if isinstance(v, dict) and CpuScheduler._alive(v.get('pid')))
+				result = change(leases)
+
+				fp.seek(0)
+				fp.truncate()
+				json.dump(leases, fp, indent=4)
+				fp.flush()
+			finally:
+				fcntl.flock(fp, fcntl.LOCK_UN)
+
+		return result
+
+	@staticmethod
+	def _alive(pid) -> bool:
+		if not isinstance(pid, int):
+			return False
+		try:
+			os.kill(pid, 0)
+		except ProcessLookupError:
+			return False
+		except PermissionError:
+			pass
+		return True
+
+	def _pick(self, count: int, usage: dict) -> list:
+		count = max(1, min(count, len(self._cores)))
+		# least used first, then in order so a channel's cores stay close together
+		return sorted(sorted(self._cores, key=lambda c: (usage.get(c, 0), c))[:count])
+
+	def allocate(self, channel: str, encoder_cores: int = None, decoder_cores: int = None) -> 'CpuAssignment':
+		"""
+		Lease core sets for a channel, replacing any lease it held before
+
+		:param channel: str
+		:param encoder_cores: int|None
+		:param decoder_cores: int|None
+		:return: CpuAssignment
+		:raises OSError: when the state file can not be used
+		"""
+
+		encoder_cores = encoder_cores if isinstance(encoder_cores, int) and encoder_cores > 0 else CpuScheduler.DEFAULT_ENCODER_CORES
+		decoder_cores = decoder_cores if isinstance(decoder_cores, int) and decoder_cores > 0 else CpuScheduler.DEFAULT_DECODER_CORES
+
+		def change(leases: dict):
+			leases.pop(channel, None)
+			usage = {}
+
+			for lease in leases.values():
+				for core in lease.get('encoder', []) + lease.get('decoder', []):
+					usage[core] = usage.get(core, 0) + 1
+
+			encoder = self._pick(encoder_cores, usage)
+
+			for core in encoder:
+				usage[core] = usage.get(core, 0) + 1
+
+			decoder = self._pick(decoder_cores, usage)
+			leases[channel] = {'pid': os.getpid(), 'encoder': encoder, 'decoder': decoder}
+
+			return CpuAssignment(channel, encoder, decoder)
+
+		return self._update(change)
+
+	def release(self, channel: str):
+		"""
+		:param channel: str
+		:raises OSError:
+		"""
+
+		self._update(lambda leases: leases.pop(channel, None))
+
+	def leases(self) -> dict:
+		"""
+		Every live channel's lease
+
+		:return: dict of channel to {pid, encoder, decoder}
+		:raises OSError:
+		"""
+
+		return self._update(lambda leases: json.loads(json.dumps(leases)))
+
+	@staticmethod
+	def lower_priority(nice: int):
+		"""
+		Raise the niceness of the calling thread, and of the processes it starts from then on.
+		Meant as a ThreadPoolExecutor initializer for background work
+
+		:param nice: int, 0 leaves the priority alone
+		"""
+
+		if nice <= 0:
+			return
+
+		tid = threading.get_native_id()
+
+		try:
+			os.setpriority(os.PRIO_PROCESS, tid, max(os.getpriority(os.PRIO_PROCESS, tid), nice))
+		except OSError:
+			pass
+
+
+"""
+CpuAssignment - The cores and thread budget a channel's processes run with
+"""
+
+
+class CpuAssignment:
+	def __init__(self, channel: str, encoder: list, decoder: list):
+		self._channel = channel
+		self._encoder = list(encoder)
+		self._decoder = list(decoder)
+
+	def channel(self) -> str:
+		return self._channel
+
+	def encoder(self) -> list:
+		return self._encoder
+
+	def decoder(self) -> list:
+		return self._decoder
+
+	@staticmethod
+	def budget(cores: list) -> ArgumentContainer:
+		"""
+		Profile layer limiting ffmpeg's decoding, encoding and filtering threads to the cores,
+		meant to go right above the defaults so thread counts a profile sets are kept
+
+		:param cores: list
+		:return: ArgumentContainer
+		"""
+
+		threads = str(max(1, len(cores)))
+
+		return ArgumentContainer({
+			'global': ['-filter_threads', threads, '-filter_complex_threads', threads],
+			'input': OrderedDict({'threads': threads}),
+			'output': OrderedDict({'threads': threads})
+		})
+
+	def serialize(self) -> dict:
+		return {
+			'channel': self._channel,
+			'encoder': self._encoder,
+			'decoder': self._decoder
+		}
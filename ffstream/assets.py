@@ -0,0 +1,293 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+
+"""
+AssetCache - Files generated for playout, stored by a hash of everything they are made from
+
+A cached file is written once and reused by every entry, loop and run that needs the same
+asset. Files are written to a temporary name and renamed into place, so a half written
+asset is never picked up.
+"""
+
+
+class AssetCache:
+	_default = None
+	_default_lock = threading.Lock()
+
+	def __init__(self, directory: str = None):
+		if directory is None:
+			base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+			directory = os.path.join(base, 'ffstream')
+
+		self._directory = directory
+		self._hashes = {}
+		self._locks = {}
+		self._lock = threading.Lock()
+
+	@staticmethod
+	def default() -> 'AssetCache':
+		with AssetCache._default_lock:
+			if AssetCache._default is None:
+				AssetCache._default = AssetCache()
+			return AssetCache._default
+
+	@staticmethod
+	def set_default(cache: 'AssetCache'):
+		with AssetCache._default_lock:
+			AssetCache._default = cache
+
+	def directory(self) -> str:
+		return self._directory
+
+	@staticmethod
+	def key(*parts) -> str:
+		"""
+		Hash any json serializable parts into a cache key
+
+		:return: str
+		"""
+
+		return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf8')).hexdigest()
+
+	def file_hash(self, path: str) -> str:
+		"""
+		Content hash of a file, only read again once its size or mtime changes
+
+		:param path: str
+		:return: str
+		:raises OSError:
+		"""
+
+		stat = os.stat(path)
+		signature = (stat.st_size, stat.st_mtime_ns)
+		known = self._hashes.get(path)
+
+		if known is not None and known[0] == signature:
+			return known[1]
+
+		digest = hashlib.sha256()
+
+		with open(path, 'rb') as fp:
+			for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+				digest.update(chunk)
+
+		self._hashes[path] = (signature, digest.hexdigest())
+		return self._hashes[path][1]
+
+	def path(self, key: str, extension: str) -> str:
+		return os.path.join(self._directory, key[:2], '%s.%s' % (key, extension))
+
+	def _key_lock(self, key: str) -> threading.Lock:
+		with self._lock:
+			if key not in self._locks:
+				self._locks[key] = threading.Lock()
+			return self._locks[key]
+
+	def get(self, key: str, extension: str, create) -> str:
+		"""
+		Path of the cached asset, calling create(path) to write it first when missing
+
+		:param key: str
+		:param extension: str
+		:param create: callable taking the temporary path to write to
+		:return: str
+		:raises OSError:
+		"""
+
+		path = self.path(key, extension)
+
+		if os.path.isfile(path):
+			return path
+
+		# concurrent requests for the same asset wait for the first one
+		with self._key_lock(key):
+			if os.path.isfile(path):
+				return path
+
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			fd, tmp = tempfile.mkstemp(suffix='.' + extension, dir=os.path.dirname(path))
+			os.close(fd)
+
+			try:
+				create(tmp)
+				os.replace(tmp, path)
+			finally:
+				if os.path.exists(tmp):
+					os.remove(tmp)
+
+		return path
+
+
+"""
+TextRenderer - Renders drawtext style text once into a cached transparent image
+
+Covers the drawtext options below for text at a fixed position. Text that drawtext
+would expand, positions given as expressions and any other option are reported as
+unsupported, those are left to drawtext.
+"""
+
+
+class TextRenderer:
+	# bump when rendered images change so older cached ones are not reused
+	RENDER_VERSION = 1
+	OFFSET_KEY = 'ffstream:offset'
+
+	SUPPORTED = (
+		'fontfile', 'fontsize', 'fontcolor', 'x', 'y', 'enable', 'box', 'boxcolor', 'boxborderw',
+		'borderw', 'bordercolor', 'shadowx', 'shadowy', 'shadowcolor'
+	)
+
+	# drawtext's own defaults
+	DEFAULTS = {
+		'fontsize': 16,
+		'fontcolor': 'black',
+		'box': 0,
+		'boxcolor': 'white',
+		'boxborderw': 0,
+		'borderw': 0,
+		'bordercolor': 'black',
+		'shadowx': 0,
+		'shadowy': 0,
+		'shadowcolor': 'black'
+	}
+
+	def __init__(self, cache: AssetCache = None):
+		self._cache = cache
+		self._fonts = {}
+		self._offsets = {}
+
+	def cache(self) -> AssetCache:
+		return self._cache if self._cache is not None else AssetCache.default()
+
+	@staticmethod
+	def supports(text: str, kwargs: dict) -> bool:
+		"""
+		Whether the rendered image would look like drawtext's output
+
+		:param text: str
+		:param kwargs: dict drawtext options
+		:return: bool
+		"""
+
+		if not isinstance(text, str) or not len(text) or '%' in text or '\\' in text:
+			return False
+
+		for key, value in kwargs.items():
+			if key not in TextRenderer.SUPPORTED:
+				return False
+			if key in ('x', 'y', 'fontsize', 'box', 'boxborderw', 'borderw', 'shadowx', 'shadowy') and (isinstance(value, bool) or not isinstance(value, int)):
+				return False
+
+		return isinstance(kwargs.get('fontfile'), str)
+
+	@staticmethod
+	def color(value: str) -> (int, int, int, int):
+		"""
+		Parse an ffmpeg color, a name or 0xRRGGBB[AA] / #RRGGBB[AA], optionally followed by @alpha
+
+		:param value: str
+		:return: (int, int, int, int)
+		:raises ValueError:
+		"""
+
+		from PIL import ImageColor
+
+		value, _, alpha = str(value).partition('@')
+
+		if value.lower().startswith('0x'):
+			value = '#' + value[2:]
+
+		rgba = ImageColor.getrgb(value)
+		rgba = rgba if len(rgba) == 4 else rgba + (255,)
+
+		if len(alpha):
+			rgba = rgba[:3] + (round(rgba[3] * min(1.0, max(0.0, float(alpha)))),)
+
+		return rgba
+
+	def render(self, text: str, kwargs: dict) -> (str, int, int):
+		"""
+		Render the text, reusing the cached image for the same text, font and style
+
+		:param text: str
+		:param kwargs: dict drawtext options, has to be supported
+		:return: (str, int, int) path of the image and where to overlay it
+		:raises OSError: when the font can not be read or the image not written
+		:raises ValueError: on a color that can not be parsed
+		"""
+
+		cache = self.cache()
+		style = dict(TextRenderer.DEFAULTS)
+		style.update((k, v) for k, v in kwargs.items() if k not in ('x', 'y', 'enable', 'fontfile'))
+
+		key = cache.key('drawtext', TextRenderer.RENDER_VERSION, text, cache.file_hash(kwargs['fontfile']), style)
+
+		if key not in self._offsets:
+			from PIL import Image
+
+			path = cache.get(key, 'png', lambda tmp: self._render(text, kwargs['fontfile'], style, tmp))
+
+			with Image.open(path) as im:
+				dx, dy = (int(v) for v in im.info.get(TextRenderer.OFFSET_KEY, '0,0').split(','))
+
+			self._offsets[key] = (path, dx, dy)
+
+		path, dx, dy = self._offsets[key]
+
+		return path, kwargs.get('x', 0) + dx, kwargs.get('y', 0) + dy
+
+	def _font(self, fontfile: str, size: int):
+		if (fontfile, size) not in self._fonts:
+			from PIL import ImageFont
+			self._fonts[(fontfile, size)] = ImageFont.truetype(fontfile, size)
+		return self._fonts[(fontfile, size)]
+
+	def _render(self, text: str, fontfile: str, style: dict, path: str):
+		from PIL import Image, ImageDraw, PngImagePlugin
+
+		font = self._font(fontfile, style['fontsize'])
+		ascent, descent = font.getmetrics()
+		lines = text.split('\n')
+		border = max(0, style['borderw'])
+		pad = max(0, style['boxborderw']) if style['box'] else 0
+		shadow = (style['shadowx'], style['shadowy'])
+
+		# drawtext puts the top of the line box at x/y, lines are ascent + descent apart
+		width = max(font.getlength(line) for line in lines)
+		height = len(lines) * (ascent + descent)
+		left = min(-pad, min(0, shadow[0]) - border)
+		top = min(-pad, min(0, shadow[1]) - border)
+		right = max(width + pad, width + max(0, shadow[0]) + border)
+		bottom = max(height + pad, height + max(0, shadow[1]) + border)
+
+		im = Image.new('RGBA', (int(right - left) + 1, int(bottom - top) + 1), (0, 0, 0, 0))
+		draw = ImageDraw.Draw(im)
+
+		if style['box']:
+			draw.rectangle((-pad - left, -pad - top, width + pad - left, height + pad - top), fill=TextRenderer.color(style['boxcolor']))
+
+		for i, line in enumerate(lines):
+			origin = (-left, i * (ascent + descent) - top)
+
+			if shadow != (0, 0):
+				self._draw_line(im, (origin[0] + shadow[0], origin[1] + shadow[1]), line, font, TextRenderer.color(style['shadowcolor']), 0, None)
+
+			self._draw_line(im, origin, line, font, TextRenderer.color(style['fontcolor']), border, TextRenderer.color(style['bordercolor']))
+
+		box = im.getchannel('A').getbbox() or (0, 0, 1, 1)
+		info = PngImagePlugin.PngInfo()
+		info.add_text(TextRenderer.OFFSET_KEY, '%d,%d' % (box[0] + left, box[1] + top))
+		im.crop(box).save(path, 'PNG', pnginfo=info)
+
+	@staticmethod
+	def _draw_line(im, origin, line: str, font, fill, border: int, border_fill):
+		from PIL import Image, ImageDraw
+
+		# translucent colors are blended onto the image, not written over it
+		layer = Image.new('RGBA', im.size, (0, 0, 0, 0))
+		ImageDraw.Draw(layer).text(origin, line, font=font, fill=fill, anchor='la', stroke_width=border, stroke_fill=border_fill)
+		im.alpha_composite(layer)
@@ -0,0 +1,708 @@
+import os
+import re
+import sys
+import copy
+import json
+import ffmpeg
+import datetime
+import tempfile
+import subprocess
+from collections import OrderedDict
+from .core import Application, Command, CommandArgumentParser
+from .loader import JsonPlaylistLoader, PlaylistLoaderError
+from .playlist import Playlist, PlaylistEntry
+from .ffmpeg import ArgumentContainer, CompiledProfile
+from .filter import FilterValidationException
+from .registry import FilterManagerError
+from .util import MediaInfo, MediaInfoError
+from .graph import DecoderGraph, EncoderGraph, DecoderGraphError
+from .version import Version
+
+
+"""
+FilterBenchmark - Measures what a filter costs to run on a synthetic clip
+
+A testsrc2 clip with a sine tone at the playlist's output resolution is run through the
+filter and the decoder profile's output, ffmpeg's -benchmark reports the cpu time. The
+same clip without any filter is the baseline, what the filter adds is its cost.
+"""
+
+
+class FilterBenchmark:
+	RATE = 25
+	TIMEOUT = 600
+
+	BENCH_TIMES = re.compile(r'bench: utime=([\d.]+)s stime=([\d.]+)s rtime=([\d.]+)s')
+	BENCH_RSS = re.compile(r'bench: maxrss=(\d+)')
+
+	def __init__(self, playlist: Playlist, seconds: float = 10.0, decoder_args: (ArgumentContainer, CompiledProfile) = None):
+		self._playlist = playlist
+		self._seconds = float(seconds)
+		self._decoder_args = decoder_args if decoder_args is not None else playlist.profile_compiler().decoder(playlist)
+		self._baseline = None
+
+	def seconds(self) -> float:
+		return self._seconds
+
+	def entry(self, title: str = 'Benchmark', author: str = 'ffstream') -> PlaylistEntry:
+		"""
+		An entry standing in for the synthetic clip
+
+		:return: PlaylistEntry
+		"""
+
+		resolution = self._playlist.output().resolution()
+		entry = PlaylistEntry(MediaInfo.from_probe_data('testsrc2', {
+			'streams': [
+				{'codec_type': 'video', 'width': resolution.x(), 'height': resolution.y(), 'duration': str(self._seconds)},
+				{'codec_type': 'audio', 'sample_rate': '48000', 'channels': 2, 'duration': str(self._seconds)}
+			]
+		}))
+
+		return entry.set_title(title).set_author(author)
+
+	def build(self, filters: list = None, entry: PlaylistEntry = None):
+		"""
+		:param filters: list of (Filter, dict options) applied in order
+		:param entry: PlaylistEntry|None defaults to entry()
+		:return: ffmpeg OutputStream
+		"""
+
+		entry = entry if entry is not None else self.entry()
+		resolution = self._playlist.output().resolution()
+
+		video = ffmpeg.input('testsrc2=size=%dx%d:rate=%d' % (resolution.x(), resolution.y(), FilterBenchmark.RATE), f='lavfi', t=self._seconds).video
+		audio = ffmpeg.input('sine=frequency=440:sample_rate=48000', f='lavfi', t=self._seconds).audio
+
+		for handler, options in (filters or []):
+			video, audio = handler.apply(self._playlist, entry, video, audio, copy.deepcopy(options))
+
+		args = dict(self._decoder_args.output_args())
+		args['t'] = self._seconds
+
+		return ffmpeg.output(video, audio, '-', **args).global_args('-benchmark', *self._decoder_args.global_args())
+
+	@staticmethod
+	def parse(output: str) -> dict:
+		"""
+		Read ffmpeg's -benchmark lines
+
+		:param output: str ffmpeg's stderr
+		:return: dict with utime, stime and rtime in seconds, maxrss in kB
+		:raises FilterBenchmarkError: when there is no benchmark line
+		"""
+
+		times = FilterBenchmark.BENCH_TIMES.search(output)
+
+		if times is None:
+			raise FilterBenchmarkError('No benchmark found in ffmpeg output')
+
+		rss = FilterBenchmark.BENCH_RSS.search(output)
+
+		return {
+			'utime': float(times.group(1)),
+			'stime': float(times.group(2)),
+			'rtime': float(times.group(3)),
+			'maxrss': int(rss.group(1)) if rss is not None else None
+		}
+
+	def run(self, filters: list = None, entry: PlaylistEntry = None) -> dict:
+		"""
+		Run the clip through the filters
+
+		:param filters: list of (Filter, dict options)
+		:param entry: PlaylistEntry|None
+		:return: dict as parse() with cpu_per_second, the cpu seconds per output second, and realtime_factor
+		:raises FilterBenchmarkError:
+		"""
+
+		try:
+			args = self.build(filters, entry).compile()
+		except Exception as e:
+			raise FilterBenchmarkError('Unable to build the benchmark graph - %s' % e, e)
+
+		return FilterBenchmark.execute(args, self._seconds)
+
+	@staticmethod
+	def execute(args: list, seconds: float) -> dict:
+		"""
+		Run ffmpeg with -benchmark among its args
+
+		:param args: list
+		:param seconds: float of output produced
+		:return: dict as parse() with cpu_per_second and realtime_factor
+		:raises FilterBenchmarkError:
+		"""
+
+		try:
+			p = subprocess.run(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=FilterBenchmark.TIMEOUT)
+		except (OSError, subprocess.TimeoutExpired) as e:
+			raise FilterBenchmarkError('Unable to run ffmpeg - %s' % e, e)
+
+		output = p.stderr.decode('utf8', 'replace')
+
+		if p.returncode != 0:
+			lines = [line for line in output.splitlines() if len(line.strip()) and not line.startswith('bench:')]
+			raise FilterBenchmarkError(lines[-1] if len(lines) else 'ffmpeg exited with code %d' % p.returncode)
+
+		result = FilterBenchmark.parse(output)
+		result['cpu_per_second'] = (result['utime'] + result['stime']) / seconds
+		result['realtime_factor'] = seconds / result['rtime'] if result['rtime'] > 0 else None
+
+		return result
+
+	@staticmethod
+	def ffmpeg_version() -> (str, None):
+		try:
+			p = subprocess.run(['ffmpeg', '-hide_banner', '-version'], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=30)
+		except (OSError, subprocess.TimeoutExpired):
+			return None
+
+		lines = p.stdout.decode('utf8', 'replace').splitlines()
+		return lines[0] if len(lines) else None
+
+	def baseline(self) -> dict:
+		if self._baseline is None:
+			self._baseline = self.run()
+		return self._baseline
+
+	def measure(self, handler, options: dict, entry: PlaylistEntry = None) -> dict:
+		"""
+		Run a single filter and what it costs over the baseline
+
+		:param handler: Filter
+		:param options: dict
+		:param entry: PlaylistEntry|None
+		:return: dict as run() with filter_cpu_per_second
+		:raises FilterBenchmarkError:
+		"""
+
+		result = self.run([(handler, options)], entry)
+		result['filter_cpu_per_second'] = result['cpu_per_second'] - self.baseline()['cpu_per_second']
+		return result
+
+	def compare_prerender(self, handler, options: dict, entry: PlaylistEntry = None) -> dict:
+		"""
+		Measure a text filter drawing with drawtext and with pre-rendered text
+
+		:param handler: Filter
+		:param options: dict
+		:param entry: PlaylistEntry|None
+		:return: dict with drawtext and prerender results
+		:raises FilterBenchmarkError:
+		"""
+
+		drawtext = dict(options, prerender=False)
+		prerender = dict(options, prerender=True)
+
+		return {
+			'drawtext': self.measure(handler, drawtext, entry),
+			'prerender': self.measure(handler, prerender, entry)
+		}
+
+
+"""
+ProfileBenchmark - Finds the slowest encoder preset this machine runs fast enough
+
+Sample entries of the playlist are decoded once through their decoder graphs, the way
+playout feeds the encoder. Every candidate preset, crf and maxrate is then encoded from
+those samples with the playlist's encoder profile, as fast as ffmpeg can, at the output
+resolution. A candidate is sustainable when its slowest sample still encodes the given
+headroom faster than realtime. Candidates are tried from the highest quality down: the
+slowest preset first, then the lowest crf, then the highest maxrate.
+"""
+
+
+class ProfileBenchmark:
+	PRESETS = ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower', 'veryslow')
+
+	DEFAULT_HEADROOM = 0.5
+
+	RATE_UNITS = {'k': 1000, 'm': 1000000, 'g': 1000000000}
+
+	def __init__(self, playlist: Playlist, seconds: float = 20.0, headroom: float = None):
+		self._playlist = playlist
+		self._seconds = float(seconds)
+		self._headroom = float(headroom) if headroom is not None else ProfileBenchmark.DEFAULT_HEADROOM
+
+	def seconds(self) -> float:
+		return self._seconds
+
+	def headroom(self) -> float:
+		return self._headroom
+
+	def samples(self, count: int) -> list:
+		"""
+		Entries spread evenly over the playlist, quarantined ones left out
+
+		:param count: int
+		:return: list of PlaylistEntry
+		"""
+
+		entries = [e for e in self._playlist.entries() if not e.is_quarantined()]
+
+		if count >= len(entries):
+			return entries
+
+		step = len(entries) / max(1, count)
+		return [entries[int(i * step)] for i in range(count)]
+
+	def prepare(self, entry: PlaylistEntry, path: str) -> float:
+		"""
+		Decode the start of an entry into a file, as its decoder would feed the encoder
+
+		:param entry: PlaylistEntry
+		:param path: str
+		:return: float seconds decoded
+		:raises FilterBenchmarkError:
+		"""
+
+		seconds = min(self._seconds, entry.end() - entry.start())
+
+		try:
+			args = DecoderGraph(self._playlist, entry).build(path, {'t': seconds}).overwrite_output().compile()
+		except (DecoderGraphError, MediaInfoError) as e:
+			raise FilterBenchmarkError('Unable to build the decoder graph for %s - %s' % (entry.source(), e.message()), e)
+
+		try:
+			p = subprocess.run(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=FilterBenchmark.TIMEOUT)
+		except (OSError, subprocess.TimeoutExpired) as e:
+			raise FilterBenchmarkError('Unable to run ffmpeg - %s' % e, e)
+
+		if p.returncode != 0:
+			lines = [line for line in p.stderr.decode('utf8', 'replace').splitlines() if len(line.strip())]
+			raise FilterBenchmarkError('Unable to decode %s - %s' % (entry.source(), lines[-1] if len(lines) else 'ffmpeg exited with code %d' % p.returncode))
+
+		return seconds
+
+	@staticmethod
+	def candidate(preset: str, crf=None, maxrate: str = None) -> ArgumentContainer:
+		"""
+		Profile layer with the candidate's settings, the input is read as fast as it can be
+
+		:param preset: str
+		:param crf: int|float|None None keeps the profile's
+		:param maxrate: str|None None keeps the profile's, bufsize is twice the maxrate
+		:return: ArgumentContainer
+		"""
+
+		output = OrderedDict({'preset': preset})
+
+		if crf is not None:
+			output['crf'] = str(crf)
+
+		if maxrate is not None:
+			output['maxrate'] = maxrate
+			output['bufsize'] = '%dk' % (ProfileBenchmark.rate(maxrate) * 2 // 1000)
+
+		return ArgumentContainer({'global': [], 'input': OrderedDict({'re': False}), 'output': output})
+
+	@staticmethod
+	def rate(value: str) -> int:
+		"""
+		:param value: str a bitrate like 1300k or 2.5M
+		:return: int bits per second
+		:raises ValueError:
+		"""
+
+		value = str(value).strip().lower()
+		unit = ProfileBenchmark.RATE_UNITS.get(value[-1:], 1)
+		return int(float(value[:-1] if value[-1:] in ProfileBenchmark.RATE_UNITS else value) * unit)
+
+	@staticmethod
+	def candidates(presets: list, crfs: list, maxrates: list) -> list:
+		"""
+		Every combination, highest quality first
+
+		:param presets: list of str
+		:param crfs: list of int|float|None
+		:param maxrates: list of str|None
+		:return: list of (str, int|float|None, str|None)
+		:raises ValueError: on an unknown preset or a bitrate that can not be read
+		"""
+
+		for preset in presets:
+			if preset not in ProfileBenchmark.PRESETS:
+				raise ValueError('Unknown preset %s' % preset)
+
+		combinations = [(p, c, m) for p in presets for c in crfs for m in maxrates]
+
+		return sorted(combinations, key=lambda c: (
+			-ProfileBenchmark.PRESETS.index(c[0]),
+			float(c[1]) if c[1] is not None else 0.00,
+			-ProfileBenchmark.rate(c[2]) if c[2] is not None else 0
+		))
+
+	def run(self, layer: ArgumentContainer, sample: str, seconds: float, destination: str) -> dict:
+		"""
+		Encode a prepared sample with the candidate layer over the playlist's encoder profile
+
+		:param layer: ArgumentContainer
+		:param sample: str
+		:param seconds: float of the sample
+		:param destination: str
+		:return: dict as FilterBenchmark.execute() with bitrate_kbps
+		:raises FilterBenchmarkError:
+		"""
+
+		graph = EncoderGraph(self._playlist, layer)
+
+		if graph.copies_video():
+			raise FilterBenchmarkError('The encoder profile copies the video, there is no preset to tune')
+
+		try:
+			args = graph.build(source=sample, destination=destination).global_args('-benchmark').compile()
+		except DecoderGraphError as e:
+			raise FilterBenchmarkError(e.message(), e)
+
+		try:
+			result = FilterBenchmark.execute(args, seconds)
+			result['bitrate_kbps'] = os.path.getsize(destination) * 8 / seconds / 1000
+		except OSError as e:
+			raise FilterBenchmarkError('Unable to read the encoded sample - %s' % e, e)
+		finally:
+			if os.path.exists(destination):
+				os.remove(destination)
+
+		return result
+
+	def measure(self, preset: str, crf, maxrate: str, samples: list, directory: str) -> dict:
+		"""
+		Encode every sample with a candidate
+
+		:param preset: str
+		:param crf: int|float|None
+		:param maxrate: str|None
+		:param samples: list of (str path, float seconds) from prepare()
+		:param directory: str for the encoded output
+		:return: dict with the slowest realtime_factor, mean cpu_per_second and bitrate_kbps, sustainable
+		:raises FilterBenchmarkError:
+		"""
+
+		layer = ProfileBenchmark.candidate(preset, crf, maxrate)
+		runs = [self.run(layer, path, seconds, os.path.join(directory, 'encoded')) for path, seconds in samples]
+		factors = [r['realtime_factor'] for r in runs if r['realtime_factor'] is not None]
+		slowest = min(factors) if len(factors) else None
+
+		return {
+			'preset': preset,
+			'crf': crf,
+			'maxrate': maxrate,
+			'output': OrderedDict((k, v) for k, v in layer.output_args().items()),
+			'realtime_factor': slowest,
+			'cpu_per_second': sum(r['cpu_per_second'] for r in runs) / len(runs),
+			'bitrate_kbps': sum(r['bitrate_kbps'] for r in runs) / len(runs),
+			'sustainable': slowest is not None and slowest >= 1.0 + self._headroom,
+			'samples': runs
+		}
+
+
+"""
+BenchFiltersCommand
+"""
+
+
+class BenchFiltersCommand(Command):
+	def __init__(self, application: Application, parser: CommandArgumentParser = None):
+		super().__init__(application, parser)
+
+	def name(self):
+		return "bench:filters"
+
+	def description(self):
+		return "Measures what each filter costs on a synthetic clip at the output resolution"
+
+	def init(self):
+		self.parser().add_argument('-p', '--playlist', help='Json playlist to take the resolution, decoder profile and filter options from', type=str, default=None)
+		self.parser().add_argument('-r', '--resolution', help='Output resolution without a playlist', type=str, default='1280x720')
+		self.parser().add_argument('-f', '--filter', nargs='*', help='Only benchmark these filters', default=None)
+		self.parser().add_argument('-s', '--seconds', help='Length of the synthetic clip in seconds', type=float, default=10.0)
+		self.parser().add_argument('-o', '--output', help='Write the results as json to this file instead of stdout', type=str, default=None)
+		self.parser().add_argument('--compare-prerender', help='Measure text filters with drawtext and with pre-rendered text', action='store_true', default=False)
+		self.set_args(self.parser().parse_args(sys.argv[2:]))
+
+	def run(self):
+		if self.args().playlist is not None:
+			try:
+				playlist = JsonPlaylistLoader(self.application()).load_header(self.args().playlist)
+			except PlaylistLoaderError as e:
+				self.logger().error(e.message())
+				return Command.COMMAND_ERROR
+		else:
+			playlist = Playlist('bench')
+			playlist.output().resolution().parse_str(self.args().resolution)
+
+		decoder_args = playlist.profile_compiler().decoder(playlist)
+		benchmark = FilterBenchmark(playlist, self.args().seconds, decoder_args)
+		results = []
+
+		with tempfile.TemporaryDirectory(prefix='ffstream-bench') as directory:
+			cases = self._cases(playlist, directory, results)
+
+			try:
+				baseline = benchmark.baseline()
+			except FilterBenchmarkError as e:
+				self.logger().error('Baseline failed - %s' % e.message())
+				return Command.COMMAND_ERROR
+
+			self.logger().info('Baseline: %.3f cpu seconds per output second, %.2fx realtime' % (baseline['cpu_per_second'], baseline['realtime_factor'] or 0))
+
+			for name, options, source in cases:
+				handler = self.application().filter_manager().get(name)
+				result = {'filter': name, 'source': source, 'options': options}
+
+				try:
+					if self.args().compare_prerender:
+						result.update(benchmark.compare_prerender(handler, options))
+					else:
+						result['result'] = benchmark.measure(handler, options)
+				except FilterBenchmarkError as e:
+					result['error'] = e.message()
+					self.logger().error('%s failed - %s' % (name, e.message()))
+					results.append(result)
+					continue
+
+				for label in ('result', 'drawtext', 'prerender'):
+					if label in result:
+						self.logger().info('%s%s: %+.3f cpu seconds per output second, %.2fx realtime, %s kB maxrss' % (
+							name, '' if label == 'result' else ' (%s)' % label, result[label]['filter_cpu_per_second'],
+							result[label]['realtime_factor'] or 0, result[label]['maxrss']
+						))
+
+				results.append(result)
+
+		report = {
+			'version': Version.version(),
+			'ffmpeg': FilterBenchmark.ffmpeg_version(),
+			'created': datetime.datetime.now().isoformat(timespec='seconds'),
+			'resolution': '%dx%d' % (int(playlist.output().resolution().x()), int(playlist.output().resolution().y())),
+			'seconds': benchmark.seconds(),
+			'decoder': decoder_args.serialize(),
+			'baseline': baseline,
+			'filters': results
+		}
+
+		if self.args().output is None:
+			print(json.dumps(report, indent=4))
+			return Command.COMMAND_SUCCESS
+
+		try:
+			with open(self.args().output, 'w') as fp:
+				json.dump(report, fp, indent=4)
+		except OSError as e:
+			self.logger().error('Unable to write %s - %s' % (self.args().output, e))
+			return Command.COMMAND_ERROR
+
+		return Command.COMMAND_SUCCESS
+
+	def _cases(self, playlist: Playlist, directory: str, results: list) -> list:
+		"""
+		Filters with the options to run them with, the playlist's own first, samples for the rest
+
+		:param playlist: Playlist
+		:param directory: str for sample files
+		:param results: list failures to set up a filter are added to
+		:return: list of (str name, dict options, str source)
+		"""
+
+		manager = self.application().filter_manager()
+		wanted = self.args().filter if self.args().filter is not None else manager.names()
+		cases = []
+
+		for f in (playlist.filters() if playlist.has_filters() else []):
+			if f.handler().name() in wanted:
+				cases.append((f.handler().name(), copy.deepcopy(f.options()), 'playlist'))
+
+		for name in wanted:
+			if any(case[0] == name for case in cases):
+				continue
+
+			try:
+				handler = manager.get(name)
+				options = handler.sample_options(directory) if handler is not None else None
+				if options is not None:
+					handler.validate(options)
+			except (FilterManagerError, FilterValidationException) as e:
+				results.append({'filter': name, 'source': 'sample', 'error': e.message()})
+				continue
+
+			if handler is None:
+				results.append({'filter': name, 'source': 'sample', 'error': 'Filter not found'})
+			elif options is None:
+				results.append({'filter': name, 'source': 'sample', 'error': 'No sample options, benchmark it with a playlist using it'})
+			else:
+				cases.append((name, options, 'sample'))
+
+		return cases
+
+
+"""
+BenchProfileCommand
+"""
+
+
+class BenchProfileCommand(Command):
+	def __init__(self, application: Application, parser: CommandArgumentParser = None):
+		super().__init__(application, parser)
+
+	def name(self):
+		return "bench:profile"
+
+	def description(self):
+		return "Finds the highest quality encoder preset this machine encodes the playlist fast enough with"
+
+	def init(self):
+		self.parser().add_argument('-p', '--playlist', help='Json playlist to take sample entries and the encoder profile from', type=str, required=True)
+		self.parser().add_argument('-n', '--samples', help='Number of entries to sample', type=int, default=3)
+		self.parser().add_argument('-s', '--seconds', help='Seconds of each sample to encode', type=float, default=20.0)
+		self.parser().add_argument('--presets', nargs='*', help='Presets to try', default=['veryfast', 'faster', 'fast', 'medium', 'slow', 'slower'])
+		self.parser().add_argument('--crf', nargs='*', help='Crf values to try, the profile\'s by default', type=float, default=None)
+		self.parser().add_argument('--maxrate', nargs='*', help='Maxrates to try, the profile\'s by default', type=str, default=None)
+		self.parser().add_argument('--headroom', help='How much faster than realtime the slowest sample has to encode, 0.5 is 1.5x', type=float, default=ProfileBenchmark.DEFAULT_HEADROOM)
+		self.parser().add_argument('--exhaustive', help='Measure every candidate instead of stopping at the first sustainable one', action='store_true', default=False)
+		self.parser().add_argument('-o', '--output', help='Write the results as json to this file instead of stdout', type=str, default=None)
+		self.parser().add_argument('-w', '--write', help='Write the recommended settings into the playlist\'s encoder profile', action='store_true', default=False)
+		self.set_args(self.parser().parse_args(sys.argv[2:]))
+
+	def run(self):
+		try:
+			playlist = JsonPlaylistLoader(self.application()).load(self.args().playlist, {'lazy': True})
+		except PlaylistLoaderError as e:
+			self.logger().error(e.message())
+			return Command.COMMAND_ERROR
+
+		benchmark = ProfileBenchmark(playlist, self.args().seconds, self.args().headroom)
+		crfs = [int(c) if float(c).is_integer() else c for c in self.args().crf] if self.args().crf else [None]
+
+		try:
+			candidates = benchmark.candidates(self.args().presets, crfs, self.args().maxrate or [None])
+		except ValueError as e:
+			self.logger().error(str(e))
+			return Command.COMMAND_ERROR
+
+		results = []
+		recommended = None
+
+		with tempfile.TemporaryDirectory(prefix='ffstream-bench') as directory:
+			samples = []
+
+			for i, entry in enumerate(benchmark.samples(self.args().samples)):
+				path = os.path.join(directory, 'sample-%d.ts' % i)
+
+				try:
+					samples.append((path, benchmark.prepare(entry, path)))
+				except FilterBenchmarkError as e:
+					self.logger().error('Skipping sample %s - %s' % (entry.source(), e.message()))
+
+			if not len(samples):
+				self.logger().error('No entry could be sampled')
+				return Command.COMMAND_ERROR
+
+			for preset, crf, maxrate in candidates:
+				try:
+					result = benchmark.measure(preset, crf, maxrate, samples, directory)
+				except FilterBenchmarkError as e:
+					self.logger().error('%s failed - %s' % (preset, e.message()))
+					results.append({'preset': preset, 'crf': crf, 'maxrate': maxrate, 'error': e.message()})
+					continue
+
+				self.logger().info('%s crf %s maxrate %s: %.2fx realtime, %.3f cpu seconds per second, %.0f kbps%s' % (
+					preset, crf if crf is not None else '-', maxrate or '-', result['realtime_factor'] or 0,
+					result['cpu_per_second'], result['bitrate_kbps'], '' if result['sustainable'] else ', not sustainable'
+				))
+
+				results.append(result)
+
+				if result['sustainable'] and recommended is None:
+					recommended = result
+					if not self.args().exhaustive:
+						break
+
+		if recommended is None:
+			self.logger().warning('No candidate encodes %.2fx faster than realtime on this machine' % (1.0 + benchmark.headroom()))
+		else:
+			self.logger().info('Recommended: %s' % ' '.join('-%s %s' % (k, v) for k, v in recommended['output'].items()))
+
+		report = {
+			'version': Version.version(),
+			'ffmpeg': FilterBenchmark.ffmpeg_version(),
+			'created': datetime.datetime.now().isoformat(timespec='seconds'),
+			'playlist': self.args().playlist,
+			'resolution': '%dx%d' % (int(playlist.output().resolution().x()), int(playlist.output().resolution().y())),
+			'seconds': benchmark.seconds(),
+			'headroom': benchmark.headroom(),
+			'samples': len(samples),
+			'encoder': EncoderGraph(playlist).encoder_args().serialize(),
+			'recommended': recommended['output'] if recommended is not None else None,
+			'candidates': results
+		}
+
+		if self.args().write and recommended is not None:
+			try:
+				BenchProfileCommand.write(self.args().playlist, recommended['output'])
+			except (OSError, ValueError) as e:
+				self.logger().error('Unable to write %s - %s' % (self.args().playlist, e))
+				return Command.COMMAND_ERROR
+
+			self.logger().info('Wrote the recommended settings to %s' % self.args().playlist)
+
+		if self.args().output is None:
+			print(json.dumps(report, indent=4))
+			return Command.COMMAND_SUCCESS
+
+		try:
+			with open(self.args().output, 'w') as fp:
+				json.dump(report, fp, indent=4)
+		except OSError as e:
+			self.logger().error('Unable to write %s - %s' % (self.args().output, e))
+			return Command.COMMAND_ERROR
+
+		return Command.COMMAND_SUCCESS
+
+	@staticmethod
+	def write(path: str, output: dict):
+		"""
+		Set output args in a json playlist's encoder profile, leaving the rest of the file as is
+
+		:param path: str
+		:param output: dict
+		:raises OSError:
+		:raises ValueError: when the file is not a json playlist
+		"""
+
+		with open(path, 'r') as fp:
+			document = json.load(fp, object_pairs_hook=OrderedDict)
+
+		if not isinstance(document, dict):
+			raise ValueError('Expected a json object')
+
+		profile = document.setdefault('profile', OrderedDict())
+		encoder = profile.setdefault('encoder', OrderedDict([('global', []), ('input', OrderedDict()), ('output', OrderedDict())]))
+		encoder.setdefault('output', OrderedDict()).update(output)
+
+		tmp = path + '.tmp'
+
+		try:
+			with open(tmp, 'w') as fp:
+				json.dump(document, fp, indent=4)
+			os.replace(tmp, path)
+		finally:
+			if os.path.exists(tmp):
+				os.remove(tmp)
+
+
+"""
+FilterBenchmarkError
+"""
+
+
+class FilterBenchmarkError(Exception):
+	def __init__(self, message: str = '', other: Exception = None):
+		self._message = message
+		self._other = other
+
+	def message(self) -> str:
+		return self._message
+
+	def other(self) -> Exception:
+		return self._other
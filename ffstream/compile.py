@@ -0,0 +1,58 @@
+import os
+import sys
+from .core import Application, Command, CommandArgumentParser
+from .loader import StreamingJsonPlaylistLoader, PlaylistLoaderError
+from .compiled import CompiledPlaylistWriter, CompiledPlaylistError
+from .playlist import Playlist, PlaylistError
+
+
+"""
+CompilePlaylistCommand
+"""
+
+
+class CompilePlaylistCommand(Command):
+	def __init__(self, application: Application, parser: CommandArgumentParser = None):
+		super().__init__(application, parser)
+
+	def name(self):
+		return "playlist:compile"
+
+	def description(self):
+		return "Compiles a json playlist into a memory mapped binary playlist"
+
+	def init(self):
+		self.parser().add_argument('-p', '--playlist', help='The json playlist to compile', type=str, required=True)
+		self.parser().add_argument('-o', '--output', help='Location to write the compiled playlist to, defaults to the playlist with a .ffsp extension', type=str, default=None)
+		self.set_args(self.parser().parse_args(sys.argv[2:]))
+
+	def run(self):
+		output = self.args().output
+
+		if output is None:
+			output = os.path.splitext(self.args().playlist)[0] + '.ffsp'
+
+		playlist = Playlist(self.args().playlist)
+
+		# entries are read and written one at a time, sources are not probed
+		stream = StreamingJsonPlaylistLoader(self.application()).stream(playlist, {
+			'lazy': True
+		})
+
+		try:
+			CompiledPlaylistWriter().write(playlist, output, self._entries(playlist, stream))
+		except (PlaylistError, PlaylistLoaderError, CompiledPlaylistError) as e:
+			self.logger().error(e.message())
+			return Command.COMMAND_ERROR
+
+		self.logger().notice('Wrote compiled playlist to %s' % output)
+
+		return Command.COMMAND_SUCCESS
+
+	def _entries(self, playlist: Playlist, stream):
+		for i, entry in enumerate(stream, 1):
+			# the writer keeps its own columns, the playlist only needs the header
+			playlist.entries().clear()
+			if self.args().verbose and i % 10000 == 0:
+				self.logger().info('Compiled %d entries' % i)
+			yield entry
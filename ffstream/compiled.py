@@ -0,0 +1,451 @@
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from .registry import FilterManager, FilterManagerError
+from .util import LazyMediaInfo
+from .playlist import Playlist, PlaylistEntry, PlaylistProfile, PlaylistEntryProfile, PlaylistFilterEntry, PlaylistSegments
+
+
+"""
+CompiledPlaylist - Memory mapped, columnar binary playlist
+
+Layout, little endian:
+
+	header   magic, version, entry count, meta offset, meta length, total duration
+	columns  start, end, duration, timeline, weight (f64) then source, title, author,
+	         filters, profile (u32) with one value per entry
+	strings  u64 offsets followed by the utf8 blob, ids index into it
+	meta     json with the playlist members, filter sets, profiles and the offsets above
+
+Entries are only turned into PlaylistEntry objects when asked for, everything else is read
+straight from the mapped columns.
+"""
+
+
+class CompiledPlaylist:
+	MAGIC = b'FFSP'
+	VERSION = 2
+	HEADER = struct.Struct('<4sIQQQd')
+	NONE = 0xFFFFFFFF
+	FLOAT_COLUMNS = ('start', 'end', 'duration', 'timeline', 'weight')
+	ID_COLUMNS = ('source', 'title', 'author', 'filters', 'profile')
+
+	def __init__(self, path: str, filter_manager: FilterManager = None):
+		self._path = path
+		self._filter_manager = filter_manager
+		self._columns = {}
+		self._profiles = {}
+		self._fp = None
+		self._map = None
+		self._string_offsets = None
+		self._string_blob = None
+
+		try:
+			self._fp = open(path, 'rb')
+			self._map = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+		except (OSError, ValueError) as e:
+			self.close()
+			raise CompiledPlaylistError('Unable to open compiled playlist %s' % path, e)
+
+		# a rejected file is closed before raising, nothing of it stays mapped
+		try:
+			self._read()
+		except CompiledPlaylistError:
+			self.close()
+			raise
+		except (ValueError, KeyError, TypeError, IndexError) as e:
+			self.close()
+			raise CompiledPlaylistError('%s is a corrupt compiled playlist' % path, e)
+
+	def _read(self):
+		"""
+		Read the header and metadata and map the columns
+
+		:raises CompiledPlaylistError:
+		"""
+
+		if len(self._map) < CompiledPlaylist.HEADER.size:
+			raise CompiledPlaylistError('%s is not a compiled playlist' % self._path)
+
+		magic, version, count, meta_offset, meta_length, total = CompiledPlaylist.HEADER.unpack_from(self._map, 0)
+
+		if magic != CompiledPlaylist.MAGIC:
+			raise CompiledPlaylistError('%s is not a compiled playlist' % self._path)
+
+		if version != CompiledPlaylist.VERSION:
+			raise CompiledPlaylistError('Unsupported compiled playlist version %d' % version)
+
+		self._count = count
+		self._total_duration = total
+		self._meta = json.loads(bytes(self._map[meta_offset:meta_offset + meta_length]).decode('utf8'), object_pairs_hook=OrderedDict)
+
+		# the columns are views of their own, this one is released so the map can be closed
+		with memoryview(self._map) as view:
+			for name in CompiledPlaylist.FLOAT_COLUMNS + CompiledPlaylist.ID_COLUMNS:
+				offset = self._meta['columns'][name]
+				typecode = 'd' if name in CompiledPlaylist.FLOAT_COLUMNS else 'I'
+				self._columns[name] = self._column(view, offset, typecode, count)
+
+			strings = self._meta['strings']
+			self._string_offsets = self._column(view, strings['offsets'], 'Q', strings['count'] + 1)
+			blob = strings['blob']
+
+			if blob < 0 or blob + self._string_offsets[-1] > len(view):
+				raise CompiledPlaylistError('%s has strings past its end' % self._path)
+
+			self._string_blob = view[blob:blob + self._string_offsets[-1]]
+
+	@staticmethod
+	def _column(view: memoryview, offset: int, typecode: str, count: int):
+		size = array(typecode).itemsize * count
+
+		if offset < 0 or offset + size > len(view):
+			raise CompiledPlaylistError('Compiled playlist column at %d is past its end' % offset)
+
+		if sys.byteorder == 'little':
+			return view[offset:offset + size].cast(typecode)
+
+		# big endian hosts pay for a swapped copy
+		column = array(typecode, view[offset:offset + size].tobytes())
+		column.byteswap()
+		return column
+
+	@staticmethod
+	def is_compiled(path: str) -> bool:
+		try:
+			with open(path, 'rb') as fp:
+				return fp.read(len(CompiledPlaylist.MAGIC)) == CompiledPlaylist.MAGIC
+		except OSError:
+			return False
+
+	def path(self) -> str:
+		return self._path
+
+	def __len__(self) -> int:
+		return self._count
+
+	def column(self, name: str):
+		"""
+		Raw column values, float seconds for start, end, duration and timeline, string ids otherwise
+
+		:param name: str
+		:return: memoryview
+		"""
+
+		return self._columns[name]
+
+	def string(self, string_id: int) -> str:
+		if string_id == CompiledPlaylist.NONE:
+			return ''
+		return bytes(self._string_blob[self._string_offsets[string_id]:self._string_offsets[string_id + 1]]).decode('utf8')
+
+	def total_duration(self) -> float:
+		return self._total_duration
+
+	def entry_at(self, position: float) -> int:
+		"""
+		Index of the entry playing at a position in seconds from the start of the playlist
+
+		:param position: float
+		:return: int, -1 when past the end
+		"""
+
+		if position < 0 or position >= self._total_duration:
+			return -1
+
+		return bisect_right(self._columns['timeline'], position) - 1
+
+	def playlist(self, playlist: Playlist = None) -> Playlist:
+		"""
+		Apply every playlist member except the entries to playlist, or a new Playlist
+
+		:param playlist: Playlist|None
+		:return: Playlist
+		:raises CompiledPlaylistError:
+		"""
+
+		meta = self._meta['playlist']
+		playlist = playlist if isinstance(playlist, Playlist) else Playlist(self._path)
+
+		playlist.set_name(meta['name'])
+		playlist.output().set_destination(meta['output']['destination'])
+		playlist.output().resolution().parse_str(meta['output']['resolution'])
+
+		if 'segments' in meta['output']:
+			playlist.output().set_segments(PlaylistSegments(meta['output']['segments']))
+		playlist.set_should_shuffle(meta['shuffle'])
+		playlist.set_should_loop(meta['loop'])
+		playlist.set_should_loop_shuffle(meta['loop_shuffle'])
+
+		playlist.set_profile(PlaylistProfile(meta['profile']))
+
+		if 'separation' in meta:
+			playlist.set_separation(dict(meta['separation']))
+
+		for f in self._filters(meta['filters']):
+			playlist.add_filter(f)
+
+		return playlist
+
+	def _filters(self, serialized: list) -> list:
+		result = []
+
+		for f in serialized:
+			try:
+				handler = self._filter_manager.get(f['type']) if self._filter_manager is not None else None
+			except FilterManagerError as e:
+				raise CompiledPlaylistError(e.message(), e)
+			if handler is None:
+				raise CompiledPlaylistError('Filter handler %s not found' % f['type'])
+			result.append(PlaylistFilterEntry(handler, dict(f['options']), f.get('encoder') is True))
+
+		return result
+
+	def entry(self, index: int) -> PlaylistEntry:
+		"""
+		Materialize a single entry, its media is probed lazily
+
+		:param index: int
+		:return: PlaylistEntry
+		:raises CompiledPlaylistError:
+		"""
+
+		if index < 0 or index >= self._count:
+			raise IndexError(index)
+
+		columns = self._columns
+
+		entry = PlaylistEntry(LazyMediaInfo(self.string(columns['source'][index])))
+		entry.set_start(columns['start'][index])
+		entry.set_end(columns['end'][index])
+		entry.set_duration(columns['duration'][index])
+		entry.set_title(self.string(columns['title'][index]))
+		entry.set_author(self.string(columns['author'][index]))
+		entry.set_weight(columns['weight'][index])
+
+		if columns['filters'][index] != CompiledPlaylist.NONE:
+			entry.set_filters(self._filters(self._meta['filter_sets'][columns['filters'][index]]))
+
+		profile_id = columns['profile'][index]
+
+		if profile_id != CompiledPlaylist.NONE:
+			# entries sharing a profile share the instance, like entries without one share EMPTY
+			if profile_id not in self._profiles:
+				self._profiles[profile_id] = PlaylistEntryProfile(self._meta['profiles'][profile_id])
+			entry.set_profile(self._profiles[profile_id])
+
+		return entry
+
+	def entries(self, start: int = 0):
+		for i in range(start, self._count):
+			yield self.entry(i)
+
+	def rows(self):
+		"""
+		Every entry as a CompiledPlaylistRow, to order entries without materializing them
+
+		:return: generator of CompiledPlaylistRow
+		"""
+
+		for i in range(self._count):
+			yield CompiledPlaylistRow(self, i)
+
+	def close(self):
+		for name in list(self._columns):
+			if isinstance(self._columns[name], memoryview):
+				self._columns[name].release()
+		self._columns = {}
+		for view in (self._string_offsets, self._string_blob):
+			if isinstance(view, memoryview):
+				view.release()
+		if self._map is not None:
+			self._map.close()
+		if self._fp is not None:
+			self._fp.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.close()
+
+
+"""
+CompiledPlaylistRow - An entry of a CompiledPlaylist read straight from its columns
+
+Has the members a Rotation orders entries by, an entry is materialized from its index once
+it is played.
+"""
+
+
+class CompiledPlaylistRow:
+	__slots__ = ('_playlist', '_index')
+
+	def __init__(self, playlist: CompiledPlaylist, index: int):
+		self._playlist = playlist
+		self._index = index
+
+	def index(self) -> int:
+		return self._index
+
+	def weight(self) -> float:
+		return self._playlist.column('weight')[self._index]
+
+	def source(self) -> str:
+		return self._playlist.string(self._playlist.column('source')[self._index])
+
+	def title(self) -> str:
+		return self._playlist.string(self._playlist.column('title')[self._index])
+
+	def author(self) -> str:
+		return self._playlist.string(self._playlist.column('author')[self._index])
+
+
+"""
+CompiledPlaylistWriter
+"""
+
+
+class CompiledPlaylistWriter:
+	def __init__(self):
+		self._floats = dict((name, array('d')) for name in CompiledPlaylist.FLOAT_COLUMNS)
+		self._ids = dict((name, array('I')) for name in CompiledPlaylist.ID_COLUMNS)
+		self._strings = {}
+		self._string_list = []
+		self._filter_sets = {}
+		self._profiles = {}
+		self._total_duration = 0.00
+
+	def _intern(self, value: str) -> int:
+		if value in (None, ''):
+			return CompiledPlaylist.NONE
+		if value not in self._strings:
+			self._strings[value] = len(self._string_list)
+			self._string_list.append(value)
+		return self._strings[value]
+
+	@staticmethod
+	def _intern_json(table: dict, value) -> int:
+		key = json.dumps(value, sort_keys=False)
+		if key not in table:
+			table[key] = len(table)
+		return table[key]
+
+	def add_entry(self, entry: PlaylistEntry) -> 'CompiledPlaylistWriter':
+		self._floats['start'].append(entry.start())
+		self._floats['end'].append(entry.end())
+		self._floats['duration'].append(entry.duration())
+		self._floats['timeline'].append(self._total_duration)
+		self._floats['weight'].append(entry.weight())
+		self._total_duration += entry.output_duration()
+
+		self._ids['source'].append(self._intern(entry.source()))
+		self._ids['title'].append(self._intern(entry.title()))
+		self._ids['author'].append(self._intern(entry.author()))
+
+		if entry.has_filters():
+			self._ids['filters'].append(self._intern_json(self._filter_sets, [f.serialize() for f in entry.filters()]))
+		else:
+			self._ids['filters'].append(CompiledPlaylist.NONE)
+
+		if entry.profile().decoder_args().has_args():
+			self._ids['profile'].append(self._intern_json(self._profiles, entry.profile().serialize()))
+		else:
+			self._ids['profile'].append(CompiledPlaylist.NONE)
+
+		return self
+
+	def write(self, playlist: Playlist, path: str, entries=None):
+		"""
+		Write the compiled playlist atomically
+
+		:param playlist: Playlist for the playlist level members
+		:param path: str
+		:param entries: iterable of PlaylistEntry, defaults to playlist.entries()
+		:raises CompiledPlaylistError:
+		"""
+
+		tmp = path + '.tmp'
+
+		try:
+			for entry in (entries if entries is not None else playlist.entries()):
+				self.add_entry(entry)
+
+			meta = OrderedDict()
+			meta['playlist'] = playlist.serialize(entries=False)
+			meta['filter_sets'] = [json.loads(k) for k in sorted(self._filter_sets, key=self._filter_sets.get)]
+			meta['profiles'] = [json.loads(k) for k in sorted(self._profiles, key=self._profiles.get)]
+			meta['columns'] = OrderedDict()
+
+			count = len(self._ids['source'])
+
+			with open(tmp, 'wb') as fp:
+				fp.write(b'\0' * CompiledPlaylist.HEADER.size)
+
+				for name, column in list(self._floats.items()) + list(self._ids.items()):
+					meta['columns'][name] = self._write_array(fp, column)
+
+				offsets = array('Q', [0])
+				blob = bytearray()
+				for value in self._string_list:
+					blob += value.encode('utf8')
+					offsets.append(len(blob))
+
+				meta['strings'] = OrderedDict([
+					('count', len(self._string_list)),
+					('offsets', self._write_array(fp, offsets)),
+					('blob', self._write_bytes(fp, bytes(blob)))
+				])
+
+				encoded = json.dumps(meta).encode('utf8')
+				meta_offset = self._write_bytes(fp, encoded)
+
+				fp.seek(0)
+				fp.write(CompiledPlaylist.HEADER.pack(CompiledPlaylist.MAGIC, CompiledPlaylist.VERSION, count, meta_offset, len(encoded), self._total_duration))
+
+			os.replace(tmp, path)
+		except OSError as e:
+			raise CompiledPlaylistError('Unable to write compiled playlist %s' % path, e)
+		finally:
+			# nothing half written is left next to the playlist, whatever stopped the write
+			if os.path.exists(tmp):
+				os.remove(tmp)
+
+	@staticmethod
+	def _write_bytes(fp, data: bytes) -> int:
+		# keep every block 8 byte aligned so columns can be cast in place
+		position = fp.tell()
+		if position % 8:
+			fp.write(b'\0' * (8 - position % 8))
+			position = fp.tell()
+		fp.write(data)
+		return position
+
+	@staticmethod
+	def _write_array(fp, column: array) -> int:
+		if sys.byteorder != 'little':
+			column = array(column.typecode, column)
+			column.byteswap()
+		return CompiledPlaylistWriter._write_bytes(fp, column.tobytes())
+
+
+"""
+CompiledPlaylistError
+"""
+
+
+class CompiledPlaylistError(Exception):
+	def __init__(self, message: str = '', other: Exception = None):
+		self._message = message
+		self._other = other
+
+	def message(self) -> str:
+		return self._message
+
+	def other(self) -> Exception:
+		return self._other
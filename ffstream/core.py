@@ -1,6 +1,8 @@
 import argparse
+import importlib
 import sys
-from .filter import FilterManager
+from collections import OrderedDict
+from .registry import FilterManager
 from .util import Logger, StdOutLogger, TextColor
 from ffstream.version import Version
 
@@ -9,7 +11,9 @@ class Application:
 	singleton = None
 
 	def __init__(self, parser: 'ArgumentParser' = None):
-		self._commands = []
+		# name to Command, or to the "module:Class" reference of a command not loaded yet
+		self._commands = OrderedDict()
+		self._descriptions = {}
 		self._parser = None
 		self._logger = StdOutLogger()
 		self._filter_manager = FilterManager()
@@ -23,15 +27,15 @@ class Application:
 		Application.singleton = self
 
 	@staticmethod
-	def name(self) -> str:
+	def name() -> str:
 		return 'ffstream'
 
 	@staticmethod
-	def description(self) -> str:
+	def description() -> str:
 		return ''
 
 	@staticmethod
-	def version(self) -> str:
+	def version() -> str:
 		return Version.version()
 
 	def run(self):
@@ -42,23 +46,19 @@ class Application:
 		"""
 
 		if self._parser is None:
-			commands = []
-			for command in self._commands:
-				commands.append(command.name())
-
 			self._parser = ArgumentParser(description='ffstream')
 			self._parser.add_argument('command', help='The command to execute')
 			self._parser.add_argument('-v', '--verbose', help='Display more verbose output', action='store_true', default=False)
 			self._parser.add_argument('-q', '--quiet', help='Display less or no output', action='store_true', default=False)
 
 		args = self._parser.parse_args(sys.argv[1:2])
+		command = self.command(args.command)
 
-		for command in self._commands:
-			if command.name() == args.command:
-				command.init()
-				if command.run() != Command.COMMAND_SUCCESS:
-					return sys.exit(1)
-				return sys.exit(0)
+		if command is not None:
+			command.init()
+			if command.run() != Command.COMMAND_SUCCESS:
+				return sys.exit(1)
+			return sys.exit(0)
 
 		self._parser.print_help()
 
@@ -72,29 +72,62 @@ class Application:
 		if not isinstance(command.application(), Application):
 			command.set_application(self)
 
-		self._commands.append(command)
+		self._commands[command.name()] = command
+		self._descriptions[command.name()] = command.description()
+		return self
+
+	def register_command(self, name: str, reference: str, description: str = '') -> 'Application':
+		"""
+		Register a command to import once it is run, so starting up does not import every
+		command and what they depend on
+
+		:param name: str has to match the command's name()
+		:param reference: str "module:Class"
+		:param description: str shown in the help without importing the command
+		:return: Application
+		"""
+
+		if not isinstance(self._commands.get(name), Command):
+			self._commands[name] = reference
+			self._descriptions[name] = description
 		return self
 
+	def command_names(self) -> list:
+		return list(self._commands.keys())
+
+	def command_description(self, name: str) -> str:
+		return self._descriptions.get(name, '')
+
 	def commands(self) -> list:
 		"""
-		Get the available command list
+		Get the available command list, importing commands not loaded yet
 
 		:return: list of Command
 		"""
 
-		return self._commands
+		return [self.command(name) for name in self.command_names()]
 
 	def command(self, name: str):
 		"""
-		Get a command by name
+		Get a command by name, importing it on first use
 
 		:return: Command|None
+		:raises ImportError: when a registered command can not be imported
 		"""
 
-		for command in self._commands:
-			if command.name() == name:
-				return command
-		return None
+		command = self._commands.get(name)
+
+		if command is None or isinstance(command, Command):
+			return command
+
+		module, _, attribute = command.partition(':')
+		command = getattr(importlib.import_module(module), attribute)(self)
+
+		if command.name() != name:
+			raise ImportError('Command %s registered as %s' % (command.name(), name))
+
+		self._commands[name] = command
+		return command
 
 	def parser(self) -> 'ArgumentParser':
 		"""
@@ -135,8 +168,8 @@ class ArgumentParser(argparse.ArgumentParser):
 
 		formatter = self._get_formatter()
 
-		for command in Application.singleton.commands():
-			formatter.add_text(TextColor.GREEN + command.name() + TextColor.WHITE + " - " + command.description())
+		for name in Application.singleton.command_names():
+			formatter.add_text(TextColor.GREEN + name + TextColor.WHITE + " - " + Application.singleton.command_description(name))
 
 		return base + "\r\n" + formatter.format_help()
 
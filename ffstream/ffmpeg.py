@@ -1,6 +1,12 @@
+import os
+import time
+import atexit
+import signal
+import weakref
 from .util import Serializable
-from subprocess import Popen
-from collections import OrderedDict
+from subprocess import Popen, PIPE, DEVNULL, TimeoutExpired
+from types import MappingProxyType
+from collections import OrderedDict, deque
 from threading import Thread, Lock
 
 
@@ -92,35 +98,382 @@ class ArgumentContainer(Serializable):
 
 
 '''
-FfmpegProcessThread
+FfmpegProcessThread - Supervises a single ffmpeg process
+
+Owns the process from spawn to reaping. It runs in its own process group, so stopping
+it also takes down anything it spawned, stderr is read on a thread into a bounded
+buffer so the pipe never fills up and stalls ffmpeg. Stopping closes stdin first so
+ffmpeg can finish its output, then escalates to SIGTERM and SIGKILL. A process that
+exits with an error can be restarted up to a configured number of times. Every live
+supervisor is stopped when the interpreter exits. The process can be pinned to a set of
+cores, it and every thread it starts are kept on them.
 '''
 
 
 class FfmpegProcessThread:
-	def __init__(self, config: ArgumentContainer):
+	# seconds to wait for ffmpeg to exit after its stdin is closed, then after SIGTERM
+	STOP_TIMEOUT = 5.0
+	KILL_TIMEOUT = 2.0
+
+	# stderr lines kept, older ones are dropped
+	STDERR_LINES = 200
+
+	_live = weakref.WeakSet()
+	_live_lock = Lock()
+
+	def __init__(self, config: (ArgumentContainer, 'CompiledProfile') = None, args: list = None, restarts: int = 0, restart_delay: float = 1.0, affinity: list = None):
 		self._config = config
+		self._args = list(args) if args is not None else None
+		self._affinity = sorted(affinity) if affinity else None
 		self._process = None
 		self._started = False
 		self._should_stop = False
-
-	def config(self) -> ArgumentContainer:
+		self._restarts = restarts if isinstance(restarts, int) and restarts > 0 else 0
+		self._restart_delay = restart_delay
+		self._restarted = 0
+		self._stderr = deque(maxlen=FfmpegProcessThread.STDERR_LINES)
+		self._stderr_lock = Lock()
+		self._stderr_thread = None
+		self._started_at = None
+		self._stopped_at = None
+		self._stats = {}
+
+	def config(self) -> (ArgumentContainer, 'CompiledProfile'):
 		return self._config
 
+	def args(self) -> list:
+		return self._args
+
+	def set_args(self, args: list) -> 'FfmpegProcessThread':
+		self._args = list(args)
+		return self
+
 	def process(self) -> Popen:
 		return self._process
 
-	def run(self):
-		pass
+	def affinity(self) -> (list, None):
+		return self._affinity
+
+	def set_affinity(self, cores: list) -> 'FfmpegProcessThread':
+		"""
+		Cores the process is started on, taking effect on the next run
+
+		:param cores: list|None, None runs it wherever the scheduler likes
+		:return: FfmpegProcessThread
+		"""
+
+		self._affinity = sorted(cores) if cores else None
+		return self
+
+	def pipes(self) -> (bool, bool):
+		"""
+		:return: (bool, bool) whether stdin and stdout are piped
+		"""
+
+		return False, False
+
+	def run(self) -> Popen:
+		"""
+		Spawn the process
+
+		:return: Popen
+		:raises OSError: when ffmpeg can not be started
+		"""
+
+		if self._args is None:
+			raise ValueError('No arguments to run')
+
+		if self.is_running():
+			return self._process
+
+		stdin, stdout = self.pipes()
+		previous = None
+
+		# affinity is per thread and inherited, ffmpeg is spawned from this thread while
+		# it is pinned, so no thread of ffmpeg ever runs elsewhere
+		if self._affinity is not None:
+			previous = os.sched_getaffinity(0)
+			cores = previous.intersection(self._affinity)
+			if len(cores):
+				os.sched_setaffinity(0, cores)
+			else:
+				previous = None
+
+		try:
+			self._process = Popen(
+				self._args,
+				stdin=PIPE if stdin else DEVNULL,
+				stdout=PIPE if stdout else DEVNULL,
+				stderr=PIPE,
+				start_new_session=True
+			)
+		finally:
+			if previous is not None:
+				os.sched_setaffinity(0, previous)
+
+		self._started = True
+		self._should_stop = False
+		self._started_at = time.monotonic()
+		self._stopped_at = None
+		self._stats = {}
+
+		self._stderr_thread = Thread(target=self._read_stderr, args=(self._process,), name='ffmpeg-stderr-%d' % self._process.pid)
+		self._stderr_thread.daemon = True
+		self._stderr_thread.start()
+
+		with FfmpegProcessThread._live_lock:
+			FfmpegProcessThread._live.add(self)
+
+		return self._process
+
+	def _read_stderr(self, process: Popen):
+		for line in iter(process.stderr.readline, b''):
+			line = line.decode('utf8', 'replace').rstrip()
+			if len(line):
+				with self._stderr_lock:
+					self._stderr.append(line)
+		process.stderr.close()
+
+	def errors(self, clear: bool = True) -> list:
+		"""
+		stderr lines read since the last call
+
+		:param clear: bool
+		:return: list of str
+		"""
+
+		with self._stderr_lock:
+			lines = list(self._stderr)
+			if clear:
+				self._stderr.clear()
+		return lines
+
+	def is_running(self) -> bool:
+		return self._process is not None and self._process.poll() is None
+
+	def returncode(self) -> (int, None):
+		return self._process.poll() if self._process is not None else None
+
+	def pid(self) -> (int, None):
+		return self._process.pid if self._process is not None else None
+
+	def stop(self, timeout: float = None) -> (int, None):
+		"""
+		Stop the process and everything in its process group, reaping it
+
+		:param timeout: float|None seconds to wait for a graceful exit, STOP_TIMEOUT by default
+		:return: int|None the exit code
+		"""
+
+		self._should_stop = True
+		process = self._process
+
+		if process is None:
+			return None
+
+		timeout = timeout if timeout is not None else FfmpegProcessThread.STOP_TIMEOUT
 
-	def stop(self):
-		pass
+		if process.poll() is None:
+			self.sample()
+
+		try:
+			if process.stdin is not None and not process.stdin.closed:
+				process.stdin.close()
+		except OSError:
+			pass
+
+		# the group is only signalled while its leader is unreaped, its id can not be reused yet
+		for sig, wait in ((None, timeout), (signal.SIGTERM, FfmpegProcessThread.KILL_TIMEOUT), (signal.SIGKILL, None)):
+			if sig is not None:
+				self._signal_group(process, sig)
+			try:
+				process.wait(wait)
+				break
+			except TimeoutExpired:
+				continue
+
+		if process.stdout is not None:
+			process.stdout.close()
+
+		if self._stderr_thread is not None:
+			self._stderr_thread.join(FfmpegProcessThread.KILL_TIMEOUT)
+
+		if self._stopped_at is None:
+			self._stopped_at = time.monotonic()
+
+		with FfmpegProcessThread._live_lock:
+			FfmpegProcessThread._live.discard(self)
+
+		return process.returncode
+
+	@staticmethod
+	def _signal_group(process: Popen, sig):
+		try:
+			os.killpg(process.pid, sig)
+		except (ProcessLookupError, PermissionError):
+			pass
+
+	def should_restart(self) -> bool:
+		"""
+		Whether an exited process is due a restart, it failed and restarts are left
+
+		:return: bool
+		"""
+
+		code = self.returncode()
+		return self._started and not self._should_stop and code not in (None, 0) and self._restarted < self._restarts
+
+	def restarts(self) -> int:
+		return self._restarted
+
+	def restart(self) -> Popen:
+		"""
+		Stop what is left of the process and spawn it again after the restart delay
+
+		:return: Popen
+		:raises OSError:
+		"""
+
+		self.stop(0)
+		self._restarted += 1
+		time.sleep(self._restart_delay)
+		return self.run()
+
+	def sample(self) -> dict:
+		"""
+		Resource use of the running process from /proc, kept for stats() once it exits
+
+		:return: dict
+		"""
+
+		if not self.is_running():
+			return self._stats
+
+		try:
+			with open('/proc/%d/stat' % self._process.pid, 'r') as fp:
+				# the command name may hold spaces, fields are counted from after it
+				fields = fp.read().rpartition(')')[2].split()
+			with open('/proc/%d/status' % self._process.pid, 'r') as fp:
+				status = dict(line.split(':', 1) for line in fp if ':' in line)
+			cpus = ','.join(str(c) for c in sorted(os.sched_getaffinity(self._process.pid)))
+		except (OSError, ValueError):
+			return self._stats
+
+		ticks = os.sysconf('SC_CLK_TCK')
+
+		self._stats = {
+			'cpu_user': int(fields[11]) / ticks,
+			'cpu_system': int(fields[12]) / ticks,
+			'threads': int(fields[17]),
+			'rss_kb': int(status.get('VmRSS', '0 kB').split()[0]),
+			'max_rss_kb': int(status.get('VmHWM', '0 kB').split()[0]),
+			'cpus': cpus
+		}
+
+		return self._stats
+
+	def stats(self) -> dict:
+		"""
+		:return: dict with pid, running, returncode, uptime, restarts and the last resource sample
+		"""
+
+		uptime = None
+
+		if self._started_at is not None:
+			uptime = (self._stopped_at if self._stopped_at is not None else time.monotonic()) - self._started_at
+
+		result = {
+			'pid': self.pid(),
+			'running': self.is_running(),
+			'returncode': self.returncode(),
+			'uptime': uptime,
+			'restarts': self._restarted
+		}
+
+		result.update(self.sample())
+		return result
+
+	@staticmethod
+	def stop_all():
+		with FfmpegProcessThread._live_lock:
+			live = list(FfmpegProcessThread._live)
+
+		for supervisor in live:
+			supervisor.stop(0)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.stop()
+
+
+atexit.register(FfmpegProcessThread.stop_all)
 
 
 class EncoderProcessThread(FfmpegProcessThread):
-	pass
+	def pipes(self) -> (bool, bool):
+		return True, False
+
+	def write(self, data: bytes) -> bool:
+		"""
+		:param data: bytes
+		:return: bool False once the encoder no longer takes input
+		"""
+
+		try:
+			self._process.stdin.write(data)
+			return True
+		except (OSError, ValueError, AttributeError):
+			return False
+
+	def flush(self) -> bool:
+		try:
+			self._process.stdin.flush()
+			return True
+		except (OSError, ValueError, AttributeError):
+			return False
+
 
 class DecoderProcessThread(FfmpegProcessThread):
-	pass
+	CHUNK_SIZE = 16 * 1024
+	SAMPLE_INTERVAL = 1.0
+
+	def pipes(self) -> (bool, bool):
+		return False, True
+
+	def pump(self, encoder: EncoderProcessThread, on_errors=None) -> int:
+		"""
+		Copy the decoder's output into the encoder until either is done
+
+		:param encoder: EncoderProcessThread
+		:param on_errors: callable taking a list of stderr lines, called as they come in
+		:return: int bytes copied
+		"""
+
+		copied = 0
+		read = self._process.stdout.read1 if hasattr(self._process.stdout, 'read1') else self._process.stdout.read
+		next_sample = time.monotonic()
+
+		while True:
+			# resource use can only be read while the process runs, sample it now and then
+			if time.monotonic() >= next_sample:
+				self.sample()
+				next_sample = time.monotonic() + DecoderProcessThread.SAMPLE_INTERVAL
+
+			if on_errors is not None:
+				lines = self.errors()
+				if len(lines):
+					on_errors(lines)
+
+			buf = read(DecoderProcessThread.CHUNK_SIZE)
+
+			if not buf or not encoder.write(buf):
+				break
+
+			copied += len(buf)
+
+		return copied
 
 
 class Profile:
@@ -224,3 +577,262 @@ class Profile:
 				'f': 'mpegts'
 			})
 		})
+
+
+"""
+CompiledProfile - Arguments resolved from every profile layer, read only
+"""
+
+
+class CompiledProfile(Serializable):
+	__slots__ = ('_global', '_input', '_output', '_input_argv', '_output_argv')
+
+	def __init__(self, global_args: tuple, input_args: tuple, output_args: tuple):
+		self._global = tuple(global_args)
+		self._input = MappingProxyType(OrderedDict(input_args))
+		self._output = MappingProxyType(OrderedDict(output_args))
+		self._input_argv = CompiledProfile._argv(self._input)
+		self._output_argv = CompiledProfile._argv(self._output)
+
+	@staticmethod
+	def _argv(args) -> tuple:
+		argv = []
+		for key, value in args.items():
+			argv.append('-' + key)
+			if value is not None:
+				argv.append(str(value))
+		return tuple(argv)
+
+	def global_args(self) -> tuple:
+		return self._global
+
+	def input_args(self) -> MappingProxyType:
+		return self._input
+
+	def output_args(self) -> MappingProxyType:
+		return self._output
+
+	def input_argv(self) -> tuple:
+		return self._input_argv
+
+	def output_argv(self) -> tuple:
+		return self._output_argv
+
+	def has_args(self) -> bool:
+		return len(self._global) > 0 or len(self._input) > 0 or len(self._output) > 0
+
+	def container(self) -> ArgumentContainer:
+		"""
+		:return: ArgumentContainer a copy that can be changed
+		"""
+
+		return ArgumentContainer(self.serialize())
+
+	def serialize(self) -> dict:
+		return {
+			'global': list(self._global),
+			'input': OrderedDict(self._input),
+			'output': OrderedDict(self._output)
+		}
+
+
+"""
+ProfileCompiler - Merges profile layers into compiled arguments
+
+The defaults, the playlist's profile and the entry's profile are merged option by
+option, each layer overriding the ones below it. Spellings of the same option, like
+c:v, codec:v and vcodec, count as one, an input or output option set to false drops
+it from the layers below. Global args are merged by option, flags add up.
+
+Compiled profiles are kept by the identity of their layers, entries sharing a profile
+share the result and resolving one again is a dictionary lookup. Layers are treated
+as read only once compiled.
+"""
+
+
+class ProfileCompiler:
+	CACHE_SIZE = 256
+
+	OPTION_ALIASES = {
+		'codec:v': 'c:v',
+		'vcodec': 'c:v',
+		'codec:a': 'c:a',
+		'acodec': 'c:a',
+		'codec:s': 'c:s',
+		'scodec': 'c:s',
+		'codec': 'c',
+		'vb': 'b:v',
+		'ab': 'b:a',
+		'vf': 'filter:v',
+		'af': 'filter:a',
+		'vframes': 'frames:v',
+		'aframes': 'frames:a',
+		'qscale:v': 'q:v',
+		'qscale:a': 'q:a',
+		'vtag': 'tag:v',
+		'atag': 'tag:a'
+	}
+
+	GLOBAL_ALIASES = {
+		'v': 'loglevel'
+	}
+
+	def __init__(self, encoder_layers: list = None, decoder_layers: list = None):
+		self._encoder_layers = tuple(encoder_layers) if encoder_layers is not None else (Profile.ffplayout_encoder(),)
+		self._decoder_layers = tuple(decoder_layers) if decoder_layers is not None else (Profile.ffplayout_decoder(),)
+		self._cache = OrderedDict()
+		self._lock = Lock()
+
+		for layer in self._encoder_layers + self._decoder_layers:
+			ProfileCompiler.validate(layer)
+
+	def encoder_layers(self) -> tuple:
+		return self._encoder_layers
+
+	def decoder_layers(self) -> tuple:
+		return self._decoder_layers
+
+	def encoder(self, playlist, *layers) -> CompiledProfile:
+		"""
+		:param playlist: Playlist
+		:param layers: ArgumentContainer merged over the playlist's profile
+		:return: CompiledProfile
+		:raises ProfileError:
+		"""
+
+		return self.compile(*(self._encoder_layers + (playlist.profile().encoder_args(),) + layers))
+
+	def decoder(self, playlist, entry=None) -> CompiledProfile:
+		"""
+		:param playlist: Playlist
+		:param entry: PlaylistEntry|None
+		:return: CompiledProfile
+		:raises ProfileError:
+		"""
+
+		layers = self._decoder_layers + (playlist.profile().decoder_args(),)
+
+		if entry is not None:
+			layers += (entry.profile().decoder_args(),)
+
+		return self.compile(*layers)
+
+	def compile(self, *layers) -> CompiledProfile:
+		"""
+		Merge the layers, lowest first
+
+		:param layers: ArgumentContainer
+		:return: CompiledProfile
+		:raises ProfileError: when a layer sets an option twice
+		"""
+
+		# empty layers change nothing, leaving them out lets entries without a profile share
+		layers = tuple(layer for layer in layers if layer.has_args())
+		key = tuple(id(layer) for layer in layers)
+
+		with self._lock:
+			cached = self._cache.get(key)
+
+			# ids are only unique among live objects, the layers are kept to tell
+			if cached is not None and all(a is b for a, b in zip(cached[0], layers)):
+				self._cache.move_to_end(key)
+				return cached[1]
+
+		global_args = OrderedDict()
+		input_args = OrderedDict()
+		output_args = OrderedDict()
+
+		for layer in layers:
+			ProfileCompiler.validate(layer)
+
+			for option, value in ProfileCompiler._options(layer.global_args()):
+				name = ProfileCompiler.GLOBAL_ALIASES.get(option, option)
+				global_args[name] = (option, value)
+
+			for merged, args in ((input_args, layer.input_args()), (output_args, layer.output_args())):
+				for option, value in args.items():
+					name = ProfileCompiler.OPTION_ALIASES.get(option, option)
+					if value is False:
+						merged.pop(name, None)
+					else:
+						merged[name] = (option, value)
+
+		flat = []
+
+		for option, value in global_args.values():
+			flat.append('-' + option)
+			if value is not None:
+				flat.append(value)
+
+		compiled = CompiledProfile(flat, input_args.values(), output_args.values())
+
+		with self._lock:
+			self._cache[key] = (layers, compiled)
+			while len(self._cache) > ProfileCompiler.CACHE_SIZE:
+				self._cache.popitem(last=False)
+
+		return compiled
+
+	@staticmethod
+	def _options(args: list) -> list:
+		# options start with a dash, a token following one that does not is its value
+		options = []
+
+		for token in args:
+			if token.startswith('-') and len(token) > 1 and not token[1:2].isdigit():
+				options.append([token[1:], None])
+			elif len(options) and options[-1][1] is None:
+				options[-1][1] = token
+			else:
+				raise ProfileError('Unexpected global argument %s' % token)
+
+		return [tuple(option) for option in options]
+
+	@staticmethod
+	def validate(layer: ArgumentContainer):
+		"""
+		Check a single layer, meant to run once when a profile is loaded
+
+		:param layer: ArgumentContainer
+		:raises ProfileError: on an option set twice or a value ffmpeg can not take
+		"""
+
+		if not isinstance(layer.global_args(), list) or not all(isinstance(a, str) for a in layer.global_args()):
+			raise ProfileError('Expected a list of strings for global args')
+
+		seen = {}
+
+		for option, value in ProfileCompiler._options(layer.global_args()):
+			name = ProfileCompiler.GLOBAL_ALIASES.get(option, option)
+			if name in seen and seen[name] != (option, value):
+				raise ProfileError('Conflicting global options -%s and -%s' % (seen[name][0], option))
+			seen[name] = (option, value)
+
+		for kind, args in (('input', layer.input_args()), ('output', layer.output_args())):
+			seen = {}
+
+			for option, value in args.items():
+				if value is True or not isinstance(value, (str, int, float, type(None), bool)):
+					raise ProfileError('Expected a string, number, null or false for %s option %s' % (kind, option))
+
+				name = ProfileCompiler.OPTION_ALIASES.get(option, option)
+				if name in seen:
+					raise ProfileError('Conflicting %s options %s and %s' % (kind, seen[name], option))
+				seen[name] = option
+
+
+"""
+ProfileError
+"""
+
+
+class ProfileError(Exception):
+	def __init__(self, message: str = '', other: Exception = None):
+		self._message = message
+		self._other = other
+
+	def message(self) -> str:
+		return self._message
+
+	def other(self) -> Exception:
+		return self._other
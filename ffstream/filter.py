@@ -1,6 +1,10 @@
-import ffmpeg
-from ffmpeg.nodes import Node
-from PIL import Image, ImageDraw
+import os
+import json
+from threading import Lock
+from collections import OrderedDict
+from concurrent.futures import Future
+from .assets import AssetCache, TextRenderer
+from .registry import FilterManager
 
 """
 Filter
@@ -8,11 +12,20 @@ Filter
 
 
 class Filter:
+	# shared so every filter instance reuses the loaded fonts and rendered texts
+	TEXT_RENDERER = TextRenderer()
+
+	# prepared results kept per filter instance, the least recently used go first
+	PRELOAD_CACHE_SIZE = 64
+
 	def __init__(self, options: dict = None):
 		self._options = dict()
 		if isinstance(options, dict):
 			self._options.update(options)
 
+		self._preloaded = OrderedDict()
+		self._preload_lock = Lock()
+
 	def name(self) -> str:
 		raise Exception('Must be implemented by inheritor')
 
@@ -28,13 +41,144 @@ class Filter:
 		"""
 		return True
 
-	# TODO: implement this for filters which may require generating assets
-	def preload(self, playlist: 'Playlist', entry: 'PlaylistEntry'):
-		raise Exception('Must be implemented by inheritor')
+	def assets(self, options: dict) -> list:
+		"""
+		Files the filter reads while playing, checked before a playlist airs
+
+		:param options: dict
+		:return: list of str
+		"""
+
+		kwargs = options['kwargs'] if 'kwargs' in options and isinstance(options['kwargs'], dict) else {}
+		return [kwargs[k] for k in ('fontfile', 'textfile') if isinstance(kwargs.get(k), str)]
 
-	def apply(self, playlist: 'Playlist', entry: 'PlaylistEntry', video: Node, audio: Node, apply_options: dict) -> [Node, Node]:
+	def preload(self, playlist: 'Playlist', entry: 'PlaylistEntry', options: dict):
+		"""
+		Prepare what apply needs for the entry, called ahead of playout on a worker.
+		Filters with nothing to prepare keep this default
+
+		:param playlist: Playlist
+		:param entry: PlaylistEntry
+		:param options: dict
+		:return: anything apply understands, None when there is nothing to prepare
+		"""
+
+		return None
+
+	def apply(self, playlist: 'Playlist', entry: 'PlaylistEntry', video: 'Node', audio: 'Node', apply_options: dict) -> ['Node', 'Node']:
 		raise Exception('Must be implemented by inheritor')
 
+	def supports_encoder(self) -> bool:
+		"""
+		Whether the filter can run once in the encoder graph, where apply gets no entry
+
+		:return: bool
+		"""
+
+		return False
+
+	def sample_options(self, directory: str) -> (dict, None):
+		"""
+		Options to benchmark the filter with when no playlist provides any
+
+		:param directory: str where files the options refer to may be written
+		:return: dict|None when the filter can not be benchmarked without options
+		"""
+
+		return None
+
+	@staticmethod
+	def preload_key(entry: 'PlaylistEntry', options: dict) -> tuple:
+		if entry is None:
+			return json.dumps(options, sort_keys=True, default=str),
+
+		return (
+			json.dumps(options, sort_keys=True, default=str),
+			entry.source(), entry.start(), entry.end(), entry.title(), entry.author()
+		)
+
+	def is_prepared(self, entry: 'PlaylistEntry', options: dict) -> bool:
+		with self._preload_lock:
+			return Filter.preload_key(entry, options) in self._preloaded
+
+	def prepared(self, playlist: 'Playlist', entry: 'PlaylistEntry', options: dict):
+		"""
+		The result of preload for the entry and options, prepared once. A preload still
+		running on a worker is waited for, a missing one is run right away
+
+		:param playlist: Playlist
+		:param entry: PlaylistEntry
+		:param options: dict
+		:return: whatever preload returned
+		"""
+
+		key = Filter.preload_key(entry, options)
+
+		with self._preload_lock:
+			future = self._preloaded.get(key)
+			owner = future is None
+
+			if owner:
+				future = self._preloaded[key] = Future()
+				while len(self._preloaded) > self.PRELOAD_CACHE_SIZE:
+					self._preloaded.popitem(last=False)
+			else:
+				self._preloaded.move_to_end(key)
+
+		if owner:
+			try:
+				future.set_result(self.preload(playlist, entry, options))
+			except Exception as e:
+				# failures are not kept, the next call tries again and sees the error
+				with self._preload_lock:
+					if self._preloaded.get(key) is future:
+						del self._preloaded[key]
+				future.set_exception(e)
+
+		return future.result()
+
+	def render_text(self, text: str, kwargs: dict, options: dict) -> (tuple, None):
+		"""
+		Pre-render the text where the renderer supports the kwargs. Options may set
+		prerender to false to always use drawtext
+
+		:param text: str
+		:param kwargs: dict drawtext options
+		:param options: dict the filter's options
+		:return: (str, int, int) as TextRenderer.render, None to use drawtext
+		"""
+
+		if options.get('prerender', True) is False or not TextRenderer.supports(text, kwargs):
+			return None
+
+		try:
+			return Filter.TEXT_RENDERER.render(text, kwargs)
+		except (OSError, ValueError):
+			return None
+
+	def draw_text(self, video: 'Node', text: str, kwargs: dict, rendered: tuple = None) -> 'Node':
+		"""
+		Overlay the text rendered by render_text, or draw it with drawtext
+
+		:param video: Node
+		:param text: str
+		:param kwargs: dict drawtext options, enable is kept for the overlay
+		:param rendered: (str, int, int)|None
+		:return: Node
+		"""
+
+		if rendered is None:
+			return video.drawtext(text, **kwargs)
+
+		path, x, y = rendered
+		overlay_kwargs = {'x': x, 'y': y}
+
+		if 'enable' in kwargs:
+			overlay_kwargs['enable'] = kwargs['enable']
+
+		import ffmpeg
+		return video.overlay(ffmpeg.input(path), **overlay_kwargs)
+
 	def validate_position(self, field: str, value):
 		if not isinstance(value, dict):
 			raise FilterValidationException('Expected a dictionary for %s' % field)
@@ -49,36 +193,6 @@ class Filter:
 			raise FilterValidationException('Expected member y to be as string or integer for %s' % field)
 
 
-"""
-FilterManager
-"""
-
-
-class FilterManager:
-	def __init__(self):
-		self._filters = []
-
-	def filters(self) -> list:
-		return self._filters
-
-	def add(self, f: Filter):
-		if isinstance(f, Filter):
-			self._filters.append(f)
-		return self
-
-	def has(self, name: str) -> bool:
-		for f in self._filters:
-			if f.name() == name:
-				return True
-		return False
-
-	def get(self, name: str) -> (Filter, None):
-		for f in self._filters:
-			if f.name() == name:
-				return f
-		return None
-
-
 """
 ContinuousTextFilter - Adds a text to the video for the whole duration
 """
@@ -95,10 +209,20 @@ class ContinuousTextFilter(Filter):
 		if 'kwargs' in options and not isinstance(options['kwargs'], dict):
 			raise FilterValidationException('Expected instance of dictionary for kwargs')
 
-	def apply(self, playlist: 'Playlist', playlist_entry: 'PlaylistEntry', video: Node, audio: Node, options: dict) -> [Node, Node]:
+	def supports_encoder(self) -> bool:
+		return True
+
+	def sample_options(self, directory: str) -> dict:
+		return {'text': 'ffstream benchmark', 'kwargs': {'x': 40, 'y': 40, 'fontsize': 32, 'fontcolor': 'white'}}
+
+	def preload(self, playlist: 'Playlist', entry: 'PlaylistEntry', options: dict):
+		return self.render_text(options['text'], options['kwargs'] if 'kwargs' in options else {}, options)
+
+	def apply(self, playlist: 'Playlist', playlist_entry: 'PlaylistEntry', video: 'Node', audio: 'Node', options: dict) -> ['Node', 'Node']:
+		rendered = self.prepared(playlist, playlist_entry, options)
 		kwargs = options['kwargs'] if 'kwargs' in options else {}
 
-		video = video.drawtext(options['text'], **kwargs)
+		video = self.draw_text(video, options['text'], kwargs, rendered)
 
 		return video, audio
 
@@ -138,7 +262,17 @@ class IntervalTextFilter(Filter):
 		if 'kwargs' in options and not isinstance(options['kwargs'], dict):
 			raise FilterValidationException('Expected instance of dictionary for kwargs')
 
-	def apply(self, playlist: 'Playlist', playlist_entry: 'PlaylistEntry', video: Node, audio: Node, options: dict) -> [Node, Node]:
+	def sample_options(self, directory: str) -> dict:
+		return {
+			'text': 'ffstream benchmark', 'duration': 5.0, 'interval': 10, 'fallback_divisor': 2,
+			'kwargs': {'x': 40, 'y': 40, 'fontsize': 32, 'fontcolor': 'white'}
+		}
+
+	def preload(self, playlist: 'Playlist', entry: 'PlaylistEntry', options: dict):
+		return self.render_text(options['text'], options['kwargs'] if 'kwargs' in options else {}, options)
+
+	def apply(self, playlist: 'Playlist', playlist_entry: 'PlaylistEntry', video: 'Node', audio: 'Node', options: dict) -> ['Node', 'Node']:
+		rendered = self.prepared(playlist, playlist_entry, options)
 		video_duration = playlist_entry.output_duration()
 		duration = int(options['duration'])
 		interval = int(options['interval'])
@@ -150,7 +284,7 @@ class IntervalTextFilter(Filter):
 
 		kwargs['enable'] = 'if ( between( t, 0, %d ), 1, lte( mod( t, %d ), %d) )' % (duration, interval, duration)
 
-		video = video.drawtext(options['text'], **kwargs)
+		video = self.draw_text(video, options['text'], kwargs, rendered)
 
 		return video, audio
 
@@ -161,6 +295,14 @@ ImageOverlayFilter
 
 
 class ImageOverlayFilter(Filter):
+	# bump when the prepared images change so older cached ones are not reused
+	RENDER_VERSION = 1
+	OFFSET_KEY = 'ffstream:offset'
+
+	def __init__(self, options: dict = None):
+		super().__init__(options)
+		self._prepared = OrderedDict()
+
 	def name(self):
 		return 'image_overlay'
 
@@ -174,16 +316,148 @@ class ImageOverlayFilter(Filter):
 		if 'kwargs' in options and not isinstance(options['kwargs'], dict):
 			raise FilterValidationException('Expected dict for kwargs')
 
+		for field in ('width', 'height'):
+			if field in options and (not isinstance(options[field], int) or options[field] <= 0):
+				raise FilterValidationException('Expected a positive int for %s' % field)
+
 		return True
 
-	def apply(self, playlist: 'Playlist', playlist_entry: 'PlaylistEntry', video: Node, audio: Node, options: dict) -> [Node, Node]:
-		kwargs = options['kwargs'] if 'kwargs' in options else {}
+	def assets(self, options: dict) -> list:
+		return super().assets(options) + ([options['image']] if isinstance(options.get('image'), str) else [])
+
+	def supports_encoder(self) -> bool:
+		return True
+
+	def sample_options(self, directory: str) -> dict:
+		from PIL import Image, ImageDraw
+
+		path = os.path.join(directory, 'image_overlay.png')
+		image = Image.new('RGBA', (320, 180), (255, 255, 255, 160))
+		ImageDraw.Draw(image).rectangle((20, 20, 300, 160), fill=(200, 0, 0, 255))
+		image.save(path, 'PNG')
+		return {'image': path, 'kwargs': {'x': 40, 'y': 40}}
+
+	def prepare(self, playlist: 'Playlist', options: dict) -> (str, dict):
+		"""
+		Render a still image for the playlist's output once and cache it by content
+
+		The image is scaled to the requested size, or down to fit the output, converted to
+		RGBA, or RGB when it has no transparency, and cut down to the part that is visible
+		and not fully transparent when it is placed at a fixed position.
+
+		:param playlist: Playlist
+		:param options: dict
+		:return: (str, dict) path of the prepared image and the overlay kwargs to use with it
+		:raises OSError: when the image can not be read or rendered
+		"""
+
+		kwargs = dict(options['kwargs']) if isinstance(options.get('kwargs'), dict) else {}
+		resolution = (int(playlist.output().resolution().x()), int(playlist.output().resolution().y()))
+		cache = AssetCache.default()
+
+		key = cache.key(
+			self.name(), ImageOverlayFilter.RENDER_VERSION, cache.file_hash(options['image']), resolution,
+			options.get('width'), options.get('height'), kwargs.get('x'), kwargs.get('y')
+		)
+
+		with self._preload_lock:
+			prepared = self._prepared.get(key)
+			if prepared is not None:
+				self._prepared.move_to_end(key)
+
+		if prepared is None:
+			from PIL import Image
+
+			path = cache.get(key, 'png', lambda tmp: self._render(options, kwargs, resolution, tmp))
+
+			with Image.open(path) as im:
+				offset = im.info.get(ImageOverlayFilter.OFFSET_KEY)
 
+			if offset is not None:
+				dx, dy = (int(v) for v in offset.split(','))
+				kwargs['x'] = int(kwargs.get('x', 0)) + dx
+				kwargs['y'] = int(kwargs.get('y', 0)) + dy
+
+			prepared = (path, kwargs)
+
+			# images change over a long playout, only the most recently used are held on to
+			with self._preload_lock:
+				self._prepared[key] = prepared
+				while len(self._prepared) > self.PRELOAD_CACHE_SIZE:
+					self._prepared.popitem(last=False)
+
+		return prepared[0], dict(prepared[1])
+
+	def _render(self, options: dict, kwargs: dict, resolution: (int, int), path: str):
+		from PIL import Image, PngImagePlugin
+
+		with Image.open(options['image']) as source:
+			im = source.convert('RGBA')
+
+		width, height = im.size
+
+		if 'width' in options or 'height' in options:
+			size = (
+				options.get('width', max(1, round(width * options['height'] / height)) if 'height' in options else width),
+				options.get('height', max(1, round(height * options['width'] / width)) if 'width' in options else height)
+			)
+		else:
+			scale = min(1.0, resolution[0] / width, resolution[1] / height)
+			size = (max(1, round(width * scale)), max(1, round(height * scale)))
+
+		if size != im.size:
+			im = im.resize(size, Image.LANCZOS)
+
+		info = PngImagePlugin.PngInfo()
+
+		# only a fixed position tells what is visible, expressions are left to ffmpeg
+		if isinstance(kwargs.get('x', 0), int) and isinstance(kwargs.get('y', 0), int):
+			x, y = kwargs.get('x', 0), kwargs.get('y', 0)
+			visible = (max(0, -x), max(0, -y), min(im.size[0], resolution[0] - x), min(im.size[1], resolution[1] - y))
+			box = im.getchannel('A').crop(visible).getbbox() if visible[2] > visible[0] and visible[3] > visible[1] else None
+
+			if box is None:
+				# nothing would show, keep a single transparent pixel
+				box = (0, 0, 1, 1)
+				visible = (0, 0, 1, 1)
+				im = Image.new('RGBA', (1, 1), (0, 0, 0, 0))
+
+			box = (box[0] + visible[0], box[1] + visible[1], box[2] + visible[0], box[3] + visible[1])
+			im = im.crop(box)
+			info.add_text(ImageOverlayFilter.OFFSET_KEY, '%d,%d' % (box[0], box[1]))
+
+		if im.getchannel('A').getextrema()[0] == 255:
+			im = im.convert('RGB')
+
+		im.save(path, 'PNG', pnginfo=info)
+
+	def preload(self, playlist: 'Playlist', entry: 'PlaylistEntry', options: dict):
 		if 'animated' in options and options['animated'] is True:
+			return None
+
+		try:
+			return self.prepare(playlist, options)
+		except (OSError, ValueError):
+			return None
+
+	def apply(self, playlist: 'Playlist', playlist_entry: 'PlaylistEntry', video: 'Node', audio: 'Node', options: dict) -> ['Node', 'Node']:
+		import ffmpeg
+
+		prepared = self.prepared(playlist, playlist_entry, options)
+		kwargs = options['kwargs'] if 'kwargs' in options else {}
+		image = options['image']
+
+		if 'animated' in options and options['animated'] is True and playlist_entry is None:
+			# in the encoder the animation loops for the life of the channel
+			video = video.overlay(ffmpeg.input(image, stream_loop=-1), **kwargs)
+			return video, audio
+		elif 'animated' in options and options['animated'] is True:
 			kwargs['shortest'] = ''
-			overlay_image = ffmpeg.input(options['image'])
-		else:
-			overlay_image = ffmpeg.input(options['image'])
+		elif prepared is not None:
+			# a prepared still is decoded once and held by overlay, the original is the fallback
+			image, kwargs = prepared[0], dict(prepared[1])
+
+		overlay_image = ffmpeg.input(image)
 
 		video = video.overlay(overlay_image, **kwargs)
 
@@ -234,7 +508,33 @@ class VideoInformationFilter(Filter):
 
 		return True
 
-	def apply(self, playlist: 'Playlist',playlist_entry: 'PlaylistEntry', video: Node, audio: Node, options: dict) -> [Node, Node]:
+	def sample_options(self, directory: str) -> dict:
+		return {
+			'duration': 5.0, 'interval': 10, 'fallback_divisor': 2,
+			'title_position': {'x': 40, 'y': 40}, 'author_position': {'x': 40, 'y': 80},
+			'kwargs': {'fontsize': 32, 'fontcolor': 'white'}
+		}
+
+	def texts(self, entry: 'PlaylistEntry') -> dict:
+		return {
+			'title': 'Currently Watching: %s' % entry.title() if entry.title() not in (None, '') else None,
+			'author': 'By: %s' % entry.author() if entry.author() not in (None, '') else None
+		}
+
+	def preload(self, playlist: 'Playlist', entry: 'PlaylistEntry', options: dict):
+		kwargs = options['kwargs'] if 'kwargs' in options else {}
+		rendered = {}
+
+		for field, text in self.texts(entry).items():
+			if text is not None:
+				position = options[field + '_position']
+				rendered[field] = self.render_text(text, dict(kwargs, x=position['x'], y=position['y']), options)
+
+		return rendered
+
+	def apply(self, playlist: 'Playlist',playlist_entry: 'PlaylistEntry', video: 'Node', audio: 'Node', options: dict) -> ['Node', 'Node']:
+		rendered = self.prepared(playlist, playlist_entry, options)
+		texts = self.texts(playlist_entry)
 		video_duration = playlist_entry.output_duration()
 		duration = int(options['duration'])
 		interval = int(options['interval'])
@@ -252,14 +552,14 @@ class VideoInformationFilter(Filter):
 
 		# draw title
 		if title not in (None, ''):
-			video = video.drawtext('Currently Watching: %s' % title if title not in (None, '') else 'Untitled', **kwargs)
+			video = self.draw_text(video, texts['title'], kwargs, rendered.get('title'))
 
 		# draw author
 		if author not in (None, ''):
 			kwargs['x'] = options['author_position']['x']
 			kwargs['y'] = options['author_position']['y']
 
-			video = video.drawtext('By: %s' % author, **kwargs)
+			video = self.draw_text(video, texts['author'], kwargs, rendered.get('author'))
 
 		return video, audio
 
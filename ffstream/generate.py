@@ -1,8 +1,12 @@
 import sys
-import json
+import time
+import itertools
 from pathlib import Path
 from .core import Application, Command, CommandArgumentParser
 from .loader import DirectoryPlaylistLoader, PlaylistLoaderError
+from .index import DirectoryIndex, DirectoryIndexError
+from .playlist import Playlist
+from .writer import JsonPlaylistWriter, PlaylistWriterError
 
 
 """
@@ -28,6 +32,11 @@ class GeneratePlaylistCommand(Command):
 		self.parser().add_argument('-f', '--force', help='Force overwrite of playlist', action='store_true', default=False)
 		self.parser().add_argument('-s', '--shuffle', help='Shuffle the resulting playlist entries', action='store_true', default=False)
 		self.parser().add_argument('-t', '--types', nargs='*', help='Types of video files to consider', default=['mp4', 'webm', 'mkv'])
+		self.parser().add_argument('-j', '--jobs', help='Number of files to probe in parallel', type=int, default=1)
+		self.parser().add_argument('--mount-jobs', help='Maximum number of parallel probes per mount point', type=int, default=None)
+		self.parser().add_argument('-i', '--index', help='Index file to keep probe results in, only new or changed files are probed', default=None)
+		self.parser().add_argument('-w', '--watch', help='Keep running and update the playlist as files change', action='store_true', default=False)
+		self.parser().add_argument('--interval', help='Seconds between directory scans when watching', type=float, default=30.0)
 
 		self.set_args(self.parser().parse_args(sys.argv[2:]))
 
@@ -40,20 +49,56 @@ class GeneratePlaylistCommand(Command):
 
 		loader = DirectoryPlaylistLoader(self.application())
 
-		try:
-			playlist = loader.load(self.args().directory, {
-				'recursive': self.args().recursive,
-				'types': self.args().types
-			})
+		index = None
 
-		except PlaylistLoaderError as e:
-			self.logger().error(str(e))
-			return Command.COMMAND_ERROR
+		if self.args().index is not None or self.args().watch is True:
+			try:
+				index = DirectoryIndex(str(path), self.args().index, self.args().types, self.args().recursive)
+			except DirectoryIndexError as e:
+				self.logger().error(e.message())
+				return Command.COMMAND_ERROR
 
-		if self.args().shuffle is True:
-			if self.args().verbose is True:
-				self.logger().info('Shuffling playlist entries')
-			playlist.shuffle()
+		options = {
+			'recursive': self.args().recursive,
+			'types': self.args().types,
+			'jobs': self.args().jobs,
+			'mount_jobs': self.args().mount_jobs
+		}
+
+		if index is not None:
+			options['index'] = index
+
+		written = False
+
+		while True:
+			entries = loader.entries(self.args().directory, options)
+
+			try:
+				# with an index the first entry only comes once the index is up to date
+				first = next(entries, None)
+
+				# when watching the playlist is only rewritten once the library changes
+				if not written or index.has_changes():
+					self._write_playlist(itertools.chain([first] if first is not None else [], entries))
+					written = True
+				else:
+					entries.close()
+			except (PlaylistLoaderError, PlaylistWriterError) as e:
+				self.logger().error(e.message())
+				return Command.COMMAND_ERROR
+
+			if index is not None and self.args().verbose is True:
+				self.logger().info('%d changed and %d removed files' % index.changes())
+
+			if self.args().watch is not True:
+				break
+
+			time.sleep(self.args().interval)
+
+		return Command.COMMAND_SUCCESS
+
+	def _write_playlist(self, entries):
+		playlist = Playlist()
 
 		playlist.set_name('My Playlist')
 		playlist.set_should_loop(False)
@@ -63,10 +108,15 @@ class GeneratePlaylistCommand(Command):
 		playlist.output().set_destination('rmtp://server.com/application/key')
 		playlist.output().resolution().parse_str('1280x720')
 
-		with open(self.args().output, 'w') as output:
-			output.write(json.dumps(playlist.serialize(), indent=4, sort_keys=False))
-			output.close()
+		# a shuffle needs every entry, otherwise entries are written as they are probed
+		if self.args().shuffle is True:
+			for entry in entries:
+				playlist.add_entry(entry)
+			if self.args().verbose is True:
+				self.logger().info('Shuffling playlist entries')
+			playlist.shuffle()
+			entries = None
 
-		self.logger().notice('Wrote playlist to %s' % self.args().output)
+		count = JsonPlaylistWriter().write(playlist, self.args().output, entries)
 
-		return Command.COMMAND_SUCCESS
\ No newline at end of file
+		self.logger().notice('Wrote %d entries to %s' % (count, self.args().output))
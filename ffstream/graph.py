@@ -0,0 +1,414 @@
+import copy
+import ffmpeg
+from collections import OrderedDict
+from ffmpeg.nodes import FilterNode, InputNode
+from .playlist import Playlist, PlaylistEntry, PlaylistFilterEntry
+from .ffmpeg import ArgumentContainer, CompiledProfile, ProfileError
+from .assets import AssetCache
+
+
+"""
+DecoderGraph - Builds the decoder ffmpeg graph for a playlist entry
+
+Shared by playout and playlist validation, so what is checked is what plays.
+
+Unless disabled the graph is optimized while it is built. Trims seek the input instead
+of decoding from the start, the scaled size is worked out from the probed resolution so
+a source already at the output resolution is not scaled and only letterboxed sources
+are padded. Scale and pad stay separate nodes, ffmpeg's software scale can not pad, so
+the only pad left out is one that would not add any border. Consecutive still image
+overlays with the same timing that sit close together are composited into one image.
+What was left out is listed by removed().
+"""
+
+
+class DecoderGraph:
+	# bump when composited overlays change so older cached ones are not reused
+	RENDER_VERSION = 1
+
+	# overlay options a composited overlay can carry over, anything else stays as is
+	FUSIBLE_OVERLAY_KWARGS = ('x', 'y', 'enable', 'eof_action')
+
+	# overlay blends every pixel of its input, images far apart are cheaper left separate
+	FUSE_MAX_AREA_RATIO = 1.5
+
+	def __init__(self, playlist: Playlist, entry: PlaylistEntry, optimize: bool = True):
+		self._playlist = playlist
+		self._entry = entry
+		self._optimize = optimize is True
+		self._removed = []
+
+	def playlist(self) -> Playlist:
+		return self._playlist
+
+	def entry(self) -> PlaylistEntry:
+		return self._entry
+
+	def is_optimized(self) -> bool:
+		return self._optimize
+
+	def removed(self) -> list:
+		"""
+		Nodes the optimizer left out of the last build
+
+		:return: list of str
+		"""
+
+		return self._removed
+
+	def decoder_args(self) -> CompiledProfile:
+		"""
+		The entry's decoder profile merged over the playlist's and the defaults
+
+		:return: CompiledProfile
+		:raises ProfileError:
+		"""
+
+		return self._playlist.profile_compiler().decoder(self._playlist, self._entry)
+
+	@staticmethod
+	def scaled_size(source: (int, int), output: (int, int)) -> (int, int):
+		"""
+		The size scale with force_original_aspect_ratio=decrease gives, rounded to even
+
+		:param source: (int, int)
+		:param output: (int, int)
+		:return: (int, int)
+		"""
+
+		width = output[0]
+		height = source[1] * output[0] / source[0]
+
+		if height > output[1]:
+			width = source[0] * output[1] / source[1]
+			height = output[1]
+
+		return min(output[0], max(2, int(round(width / 2)) * 2)), min(output[1], max(2, int(round(height / 2)) * 2))
+
+	def build(self, output: str = 'pipe:', output_args: dict = None):
+		"""
+		Build the decoder graph, the entry's media has to be probed
+
+		:param output: str
+		:param output_args: dict|None merged over the profile's output args
+		:return: ffmpeg OutputStream
+		:raises DecoderGraphError:
+		"""
+
+		entry = self._entry
+		playlist = self._playlist
+		self._removed = []
+
+		try:
+			decoder_args = self.decoder_args()
+		except ProfileError as e:
+			raise DecoderGraphError('Invalid decoder profile for %s - %s' % (entry.source(), e.message()), e)
+
+		probed_video_stream = entry.media_info().video_stream()
+
+		if probed_video_stream is None:
+			raise DecoderGraphError('No video stream in %s' % entry.source())
+
+		start = float(entry.start())
+		end = float(entry.end())
+		duration = float(entry.duration())
+
+		if (start > 0 or (end != duration and end < duration)) and self._optimize:
+			# input seeking is frame accurate when decoding and skips what is cut anyway
+			input_args = OrderedDict(decoder_args.input_args())
+
+			if start > 0:
+				input_args['ss'] = start
+			input_args['t'] = end - start
+
+			decoder_builder = ffmpeg.input(entry.source(), **input_args)
+			video = decoder_builder.video.setpts('PTS-STARTPTS')
+			audio = decoder_builder.audio.filter('asetpts', 'PTS-STARTPTS')
+			self._removed += ['trim', 'atrim', 'concat']
+		elif start > 0 or (end != duration and end < duration):
+			decoder_builder = ffmpeg.input(entry.source(), **decoder_args.input_args())
+			video = decoder_builder.video.trim(start=start, end=end).setpts('PTS-STARTPTS')
+
+			audio = decoder_builder.audio.filter('atrim', start=start, end=end).filter('asetpts', 'PTS-STARTPTS')
+			joined = ffmpeg.concat(video, audio, v=1, a=1).node
+
+			video = joined[0]
+			audio = joined[1]
+		else:
+			decoder_builder = ffmpeg.input(entry.source(), **decoder_args.input_args())
+			video = decoder_builder.video
+			audio = decoder_builder.audio
+
+		resolution = playlist.output().resolution()
+		source = (int(probed_video_stream.resolution().x() or 0), int(probed_video_stream.resolution().y() or 0))
+		target = (int(resolution.x()), int(resolution.y()))
+
+		if self._optimize and source[0] > 0 and source[1] > 0:
+			size = DecoderGraph.scaled_size(source, target)
+
+			if size == source:
+				self._removed.append('scale')
+			else:
+				video = video.filter('scale', size[0], size[1])
+
+			# scale can not pad, a border is only added by a pad node of its own
+			if size != target:
+				video = video.filter('pad', target[0], target[1], '(ow-iw)/2', '(oh-ih)/2')
+			elif source[0] < target[0]:
+				self._removed.append('pad')
+		else:
+			video = video.filter('scale', resolution.x(), resolution.y(), force_original_aspect_ratio='1')
+
+			if probed_video_stream.resolution().x() < resolution.x():
+				video = video.filter('pad', resolution.x(), resolution.y(), '(ow-iw)/2', '(oh-ih)/2')
+
+		# global filters not left to the encoder first, then the entry's own. handlers get
+		# a copy of their options as some fill in kwargs while applying
+		filters = playlist.decoder_filters() + (entry.filters() if entry.has_filters() else [])
+		scaled = video
+
+		for f in filters:  # type: PlaylistFilterEntry
+			try:
+				video, audio = f.handler().apply(playlist, entry, video, audio, copy.deepcopy(f.options()))
+			except Exception as e:
+				raise DecoderGraphError('Filter %s failed for %s - %s' % (f.handler().name(), entry.source(), e), e)
+
+		if self._optimize:
+			video = self._fuse_overlays(scaled, video, audio)
+
+		args = dict(decoder_args.output_args())
+
+		if isinstance(output_args, dict):
+			args.update(output_args)
+
+		decoder_builder = ffmpeg.output(video, audio, output, **args)
+		return decoder_builder.global_args(*decoder_args.global_args())
+
+	@staticmethod
+	def _still_overlay(node) -> (str, None):
+		# an overlay of a single png at a fixed position, the png path if it is one
+		if not isinstance(node, FilterNode) or node.name != 'overlay' or len(node.args) or set(node.incoming_edge_map) != {0, 1}:
+			return None
+		if any(k not in DecoderGraph.FUSIBLE_OVERLAY_KWARGS for k in node.kwargs) or node.kwargs.get('eof_action', 'repeat') != 'repeat':
+			return None
+		if any(isinstance(node.kwargs.get(k, 0), bool) or not isinstance(node.kwargs.get(k, 0), int) for k in ('x', 'y')):
+			return None
+
+		upstream = node.incoming_edge_map[1][0]
+
+		if not isinstance(upstream, InputNode) or set(upstream.kwargs) != {'filename'}:
+			return None
+		if not isinstance(upstream.kwargs['filename'], str) or not upstream.kwargs['filename'].lower().endswith('.png'):
+			return None
+
+		return upstream.kwargs['filename']
+
+	@staticmethod
+	def _references(streams) -> dict:
+		# how many edges lead out of each node reachable from the streams
+		references = {}
+		visited = set()
+		pending = [stream.node for stream in streams]
+
+		while len(pending):
+			node = pending.pop()
+			if node in visited:
+				continue
+			visited.add(node)
+			for upstream, _, _ in node.incoming_edge_map.values():
+				references[upstream] = references.get(upstream, 0) + 1
+				pending.append(upstream)
+
+		return references
+
+	def _fuse_overlays(self, base, video, audio):
+		"""
+		Composite runs of still overlays with the same timing into a single overlay
+
+		:param base: the video stream filters were applied to
+		:param video: the video stream after the filters
+		:param audio: the audio stream after the filters
+		:return: the optimized video stream, video itself when there is nothing to fuse
+		"""
+
+		chain = []
+		node = video.node
+		references = DecoderGraph._references([video, audio])
+
+		# only a plain chain of filters is rebuilt, anything branching is left alone
+		while node is not base.node:
+			if not isinstance(node, FilterNode) or 0 not in node.incoming_edge_map or references.get(node, 0) > 1:
+				return video
+			for label, (upstream, _, _) in node.incoming_edge_map.items():
+				if label != 0 and not isinstance(upstream, InputNode):
+					return video
+			chain.append(node)
+			node = node.incoming_edge_map[0][0]
+
+		chain.reverse()
+		runs = []
+
+		for node in chain:
+			image = DecoderGraph._still_overlay(node)
+			if image is not None and len(runs) and runs[-1][0] is not None and runs[-1][0][-1].kwargs.get('enable') == node.kwargs.get('enable'):
+				runs[-1][0].append(node)
+			else:
+				runs.append(([node] if image is not None else None, node))
+
+		if all(run is None or len(run) < 2 for run, _ in runs):
+			return video
+
+		stream = base
+
+		for run, node in runs:
+			fused = self._composite(run) if run is not None and len(run) > 1 else None
+
+			if fused is not None:
+				path, x, y = fused
+				kwargs = {'x': x, 'y': y}
+				if 'enable' in run[0].kwargs:
+					kwargs['enable'] = run[0].kwargs['enable']
+				stream = stream.overlay(ffmpeg.input(path), **kwargs)
+				self._removed += ['overlay'] * (len(run) - 1)
+				continue
+
+			for n in (run if run is not None else [node]):
+				inputs = [stream] + [upstream.stream(upstream_label, selector) for label, (upstream, upstream_label, selector) in sorted(n.incoming_edge_map.items()) if label != 0]
+				stream = ffmpeg.filter(inputs, n.name, *n.args, **n.kwargs)
+
+		return stream
+
+	def _composite(self, run: list) -> (tuple, None):
+		from PIL import Image
+
+		cache = AssetCache.default()
+		layers = [(DecoderGraph._still_overlay(n), n.kwargs.get('x', 0), n.kwargs.get('y', 0)) for n in run]
+
+		try:
+			key = cache.key('overlay', DecoderGraph.RENDER_VERSION, [(cache.file_hash(path), x, y) for path, x, y in layers])
+			images = []
+
+			for path, x, y in layers:
+				with Image.open(path) as im:
+					images.append((x, y, im.size))
+
+			left = min(x for x, y, size in images)
+			top = min(y for x, y, size in images)
+			right = max(x + size[0] for x, y, size in images)
+			bottom = max(y + size[1] for x, y, size in images)
+
+			if (right - left) * (bottom - top) > DecoderGraph.FUSE_MAX_AREA_RATIO * sum(size[0] * size[1] for x, y, size in images):
+				return None
+
+			def render(tmp: str):
+				canvas = Image.new('RGBA', (right - left, bottom - top), (0, 0, 0, 0))
+				for path, x, y in layers:
+					with Image.open(path) as im:
+						canvas.alpha_composite(im.convert('RGBA'), (x - left, y - top))
+				canvas.save(tmp, 'PNG')
+
+			return cache.get(key, 'png', render), left, top
+		except (OSError, ValueError):
+			return None
+
+
+"""
+EncoderGraph - Builds the long lived encoder ffmpeg graph of a playlist
+
+Global filters marked for the encoder are applied here once, their inputs stay open for
+as long as the channel runs instead of being opened again by every entry's decoder.
+"""
+
+
+class EncoderGraph:
+	def __init__(self, playlist: Playlist, overrides: ArgumentContainer = None):
+		self._playlist = playlist
+		self._overrides = overrides
+
+	def playlist(self) -> Playlist:
+		return self._playlist
+
+	def overrides(self) -> (ArgumentContainer, None):
+		"""
+		Profile layer merged over the playlist's encoder profile
+
+		:return: ArgumentContainer|None
+		"""
+
+		return self._overrides
+
+	def encoder_args(self) -> CompiledProfile:
+		"""
+		The playlist's encoder profile merged over the defaults
+
+		:return: CompiledProfile
+		:raises ProfileError:
+		"""
+
+		layers = (self._overrides,) if self._overrides is not None else ()
+		return self._playlist.profile_compiler().encoder(self._playlist, *layers)
+
+	def copies_video(self) -> bool:
+		args = self.encoder_args().output_args()
+		return any(args.get(k) == 'copy' for k in ('c:v', 'codec:v', 'vcodec', 'c', 'codec'))
+
+	def build(self, output_args: dict = None, source: str = 'pipe:', destination: str = None):
+		"""
+		:param output_args: dict|None merged over the profile's output args
+		:param source: str what the encoder reads, the decoders' pipe by default
+		:param destination: str|None defaults to the playlist's output destination
+		:return: ffmpeg OutputStream
+		:raises DecoderGraphError: when a filter fails or would need the video copied
+		"""
+
+		playlist = self._playlist
+		filters = playlist.encoder_filters()
+
+		try:
+			encoder_args = self.encoder_args()
+		except ProfileError as e:
+			raise DecoderGraphError('Invalid encoder profile - %s' % e.message(), e)
+
+		args = dict(encoder_args.output_args())
+
+		if isinstance(output_args, dict):
+			args.update(output_args)
+
+		destination = destination if destination is not None else playlist.output().destination()
+		encoder_builder = ffmpeg.input(source, **encoder_args.input_args())
+
+		if not len(filters):
+			encoder_builder = encoder_builder.output(destination, **args)
+			return encoder_builder.overwrite_output().global_args(*encoder_args.global_args())
+
+		if self.copies_video():
+			raise DecoderGraphError('Encoder filters need the video to be encoded, the encoder profile copies it')
+
+		video = encoder_builder.video
+		audio = encoder_builder.audio
+
+		for f in filters:  # type: PlaylistFilterEntry
+			try:
+				video, audio = f.handler().apply(playlist, None, video, audio, copy.deepcopy(f.options()))
+			except Exception as e:
+				raise DecoderGraphError('Encoder filter %s failed - %s' % (f.handler().name(), e), e)
+
+		encoder_builder = ffmpeg.output(video, audio, destination, **args)
+		return encoder_builder.overwrite_output().global_args(*encoder_args.global_args())
+
+
+"""
+DecoderGraphError
+"""
+
+
+class DecoderGraphError(Exception):
+	def __init__(self, message: str = '', other: Exception = None):
+		self._message = message
+		self._other = other
+
+	def message(self) -> str:
+		return self._message
+
+	def other(self) -> Exception:
+		return self._other
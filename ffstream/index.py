@@ -0,0 +1,247 @@
+import os
+import re
+import json
+from concurrent.futures import ThreadPoolExecutor
+from .util import MediaInfo, MediaInfoError
+from .probe import ProbePool
+from .verify import MediaVerifier
+
+
+"""
+DirectoryIndex - Persistent record of the media files in a directory and their probe results
+
+Each file is stored with its size and mtime, a file is only probed again when either
+changes. The index is kept as json and written atomically.
+"""
+
+
+class DirectoryIndex:
+	VERSION = 1
+
+	def __init__(self, directory: str, path: str = None, types: list = None, recursive: bool = False):
+		# without a directory the one recorded in the index file is used
+		self._directory = os.path.abspath(directory) if directory is not None else None
+		self._path = path
+		self._types = types if isinstance(types, list) and len(types) else ['mp4', 'webm', 'mkv']
+		self._recursive = recursive is True
+		self._pattern = re.compile('\\.(%s)$' % '|'.join(re.escape(t) for t in self._types))
+		self._files = {}
+		self._changes = (0, 0)
+
+		if isinstance(path, str) and os.path.isfile(path):
+			self.read()
+
+	def directory(self) -> str:
+		return self._directory
+
+	def path(self) -> (str, None):
+		return self._path
+
+	def files(self) -> dict:
+		return self._files
+
+	def changes(self) -> (int, int):
+		"""
+		Changed and removed file count from the last update
+
+		:return: (int, int)
+		"""
+
+		return self._changes
+
+	def has_changes(self) -> bool:
+		return self._changes != (0, 0)
+
+	def read(self) -> 'DirectoryIndex':
+		try:
+			with open(self._path, 'r') as fp:
+				data = json.load(fp)
+		except (OSError, ValueError) as e:
+			raise DirectoryIndexError('Unable to read index %s' % self._path, e)
+
+		if self._directory is None:
+			self._directory = data.get('directory')
+
+		# an index for another directory or layout is ignored and rebuilt
+		if data.get('version') == DirectoryIndex.VERSION and data.get('directory') == self._directory:
+			self._files = data.get('files', {})
+
+		return self
+
+	def write(self) -> 'DirectoryIndex':
+		if not isinstance(self._path, str):
+			return self
+
+		tmp = self._path + '.tmp'
+
+		try:
+			with open(tmp, 'w') as fp:
+				json.dump({
+					'version': DirectoryIndex.VERSION,
+					'directory': self._directory,
+					'files': self._files
+				}, fp)
+
+			os.replace(tmp, self._path)
+		except OSError as e:
+			raise DirectoryIndexError('Unable to write index %s' % self._path, e)
+
+		return self
+
+	def _scan(self, directory: str, files: list, subdirectories: list):
+		try:
+			with os.scandir(directory) as it:
+				for item in it:
+					if item.is_dir(follow_symlinks=False):
+						subdirectories.append(item.path)
+					elif item.is_file() and self._pattern.search(item.name):
+						stat = item.stat()
+						files.append((item.path, stat.st_size, stat.st_mtime_ns))
+		except OSError:
+			pass
+
+	def _walk_subtree(self, directory: str) -> list:
+		files = []
+		pending = [directory]
+
+		while len(pending):
+			subdirectories = []
+			self._scan(pending.pop(), files, subdirectories)
+			pending.extend(subdirectories)
+
+		return files
+
+	def walk(self, jobs: int = 1) -> list:
+		"""
+		List (path, size, mtime) of every matching file, walking each top level
+		subdirectory on its own thread when recursive
+
+		:param jobs: int
+		:return: list sorted by path
+		"""
+
+		files = []
+		subdirectories = []
+
+		self._scan(self._directory, files, subdirectories)
+
+		if self._recursive and len(subdirectories):
+			with ThreadPoolExecutor(max_workers=max(jobs, 1), thread_name_prefix='scandir') as executor:
+				for subtree in executor.map(self._walk_subtree, subdirectories):
+					files.extend(subtree)
+
+		files.sort()
+		return files
+
+	def update(self, pool: ProbePool = None) -> (int, int):
+		"""
+		Walk the directory, probe new or changed files and forget removed ones
+
+		:param pool: ProbePool|None
+		:return: (int, int) changed and removed file count
+		"""
+
+		pool = pool if isinstance(pool, ProbePool) else ProbePool()
+		found = self.walk(pool.jobs())
+		changed = []
+
+		for path, size, mtime in found:
+			record = self._files.get(path)
+			if record is None or record['size'] != size or record['mtime'] != mtime:
+				changed.append((path, size, mtime))
+
+		for (path, size, mtime), (source, info) in zip(changed, pool.map(p for p, s, m in changed)):
+			record = {'size': size, 'mtime': mtime}
+			if isinstance(info, MediaInfoError):
+				record['error'] = info.message()
+			else:
+				record['probe'] = info.serialize()
+			self._files[path] = record
+
+		current = set(path for path, size, mtime in found)
+		removed = [path for path in self._files if path not in current]
+
+		for path in removed:
+			del self._files[path]
+
+		self._changes = (len(changed), len(removed))
+		return self._changes
+
+	def unverified(self) -> list:
+		"""
+		Indexed files which probed but have not been decoded by a verification pass yet
+
+		:return: list of str
+		"""
+
+		return [path for path in sorted(self._files) if 'probe' in self._files[path] and 'verify' not in self._files[path]]
+
+	def set_verification(self, path: str, result: dict) -> bool:
+		"""
+		Record a verification result for an indexed file and quarantine it if needed
+
+		:param path: str
+		:param result: dict from verify_media
+		:return: bool whether the file was quarantined
+		"""
+
+		record = self._files.get(path)
+
+		if record is None:
+			return False
+
+		duration = None
+
+		if 'probe' in record:
+			try:
+				info = MediaInfo.from_probe_data(path, record['probe'])
+				stream = info.video_stream() if info.video_stream() is not None else info.audio_stream()
+				duration = stream.duration()
+			except MediaInfoError:
+				pass
+
+		record['verify'] = dict(result, quarantined=MediaVerifier.is_quarantined(result, duration))
+		return record['verify']['quarantined']
+
+	def is_quarantined(self, path: str) -> bool:
+		record = self._files.get(os.path.abspath(path))
+		return record is not None and 'verify' in record and record['verify']['quarantined'] is True
+
+	def quarantined(self) -> list:
+		return [path for path in sorted(self._files) if self.is_quarantined(path)]
+
+	def media(self, include_quarantined: bool = False):
+		"""
+		Iterate the indexed files which probed successfully
+
+		:param include_quarantined: bool also yield files a verification pass quarantined
+		:return: generator of MediaInfo
+		"""
+
+		for path in sorted(self._files):
+			record = self._files[path]
+			if 'probe' not in record:
+				continue
+			if not include_quarantined and self.is_quarantined(path):
+				continue
+			try:
+				yield MediaInfo.from_probe_data(path, record['probe'])
+			except MediaInfoError:
+				continue
+
+
+"""
+DirectoryIndexError
+"""
+
+
+class DirectoryIndexError(Exception):
+	def __init__(self, message: str = '', other: Exception = None):
+		self._message = message
+		self._other = other
+
+	def message(self) -> str:
+		return self._message
+
+	def other(self) -> Exception:
+		return self._other
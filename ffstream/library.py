@@ -0,0 +1,126 @@
+import sys
+from .core import Application, Command, CommandArgumentParser
+from .loader import JsonPlaylistLoader, PlaylistLoaderError
+from .index import DirectoryIndex, DirectoryIndexError
+from .playlist import Playlist, PlaylistEntry
+from .store import PlaylistStore, PlaylistStoreError
+
+
+"""
+LibraryImportCommand
+"""
+
+
+class LibraryImportCommand(Command):
+	def __init__(self, application: Application, parser: CommandArgumentParser = None):
+		super().__init__(application, parser)
+
+	def name(self):
+		return "library:import"
+
+	def description(self):
+		return "Imports playlist entries or indexed media into a playlist library"
+
+	def init(self):
+		self.parser().add_argument('-s', '--store', help='Library database to import into', type=str, required=True)
+		self.parser().add_argument('-p', '--playlist', help='Json playlist to import the entries of', type=str, default=None)
+		self.parser().add_argument('-i', '--index', help='Directory index to import the probed media of', type=str, default=None)
+		self.parser().add_argument('-t', '--tags', nargs='*', help='Tags to give every imported entry', default=None)
+		self.parser().add_argument('-j', '--jobs', help='Number of files to probe in parallel', type=int, default=1)
+		self.set_args(self.parser().parse_args(sys.argv[2:]))
+
+	def run(self):
+		if self.args().playlist is None and self.args().index is None:
+			self.logger().error('Expected a playlist or an index to import')
+			return Command.COMMAND_ERROR
+
+		try:
+			with PlaylistStore(self.args().store) as store:
+				count = 0
+
+				if self.args().playlist is not None:
+					playlist = JsonPlaylistLoader(self.application()).load(self.args().playlist, {
+						'jobs': self.args().jobs
+					})
+					count += store.add_entries(playlist.entries(), self.args().tags)
+
+				if self.args().index is not None:
+					index = DirectoryIndex(None, self.args().index)
+					count += store.add_entries((PlaylistEntry(info) for info in index.media()), self.args().tags)
+
+		except (PlaylistLoaderError, PlaylistStoreError, DirectoryIndexError) as e:
+			self.logger().error(e.message())
+			return Command.COMMAND_ERROR
+
+		self.logger().notice('Imported %d entries into %s' % (count, self.args().store))
+
+		return Command.COMMAND_SUCCESS
+
+
+"""
+LibraryPlaylistCommand
+"""
+
+
+class LibraryPlaylistCommand(Command):
+	def __init__(self, application: Application, parser: CommandArgumentParser = None):
+		super().__init__(application, parser)
+
+	def name(self):
+		return "library:playlist"
+
+	def description(self):
+		return "Defines a playlist in a library by the query selecting its entries"
+
+	def init(self):
+		self.parser().add_argument('-s', '--store', help='Library database to define the playlist in', type=str, required=True)
+		self.parser().add_argument('-n', '--name', help='Name of the playlist, lists the defined playlists when omitted', type=str, default=None)
+		self.parser().add_argument('-p', '--playlist', help='Json playlist to take the output, profile and filters from', type=str, default=None)
+		self.parser().add_argument('--author', nargs='*', help='Only entries by these authors', default=None)
+		self.parser().add_argument('--title', help='Only entries with titles containing this', type=str, default=None)
+		self.parser().add_argument('--tags', nargs='*', help='Only entries with all of these tags', default=None)
+		self.parser().add_argument('--any-tags', nargs='*', help='Only entries with any of these tags', default=None)
+		self.parser().add_argument('--min-duration', help='Minimum entry duration in seconds', type=float, default=None)
+		self.parser().add_argument('--max-duration', help='Maximum entry duration in seconds', type=float, default=None)
+		self.parser().add_argument('--not-aired-within', help='Skip entries aired within this many seconds', type=float, default=None)
+		self.parser().add_argument('--order', help='Entry order', choices=list(PlaylistStore.ORDERS), default='source')
+		self.parser().add_argument('--limit', help='Maximum number of entries', type=int, default=None)
+		self.parser().add_argument('--loop', help='Loop the playlist, the query is evaluated again each loop', action='store_true', default=False)
+		self.set_args(self.parser().parse_args(sys.argv[2:]))
+
+	def query(self) -> dict:
+		query = {'order': self.args().order}
+
+		for key in ('author', 'title', 'tags', 'any_tags', 'min_duration', 'max_duration', 'not_aired_within', 'limit'):
+			value = getattr(self.args(), key)
+			if value is not None:
+				query[key] = value
+
+		return query
+
+	def run(self):
+		try:
+			with PlaylistStore(self.args().store) as store:
+				if self.args().name is None:
+					for name in store.playlists():
+						self.logger().info(name)
+					return Command.COMMAND_SUCCESS
+
+				if self.args().playlist is not None:
+					playlist = JsonPlaylistLoader(self.application()).load_header(self.args().playlist)
+				else:
+					playlist = Playlist(self.args().store)
+					playlist.set_name(self.args().name)
+
+				playlist.set_should_loop(self.args().loop)
+
+				store.save_playlist(self.args().name, playlist, self.query())
+
+		except (PlaylistLoaderError, PlaylistStoreError) as e:
+			self.logger().error(e.message())
+			return Command.COMMAND_ERROR
+
+		self.logger().notice('Defined playlist %s in %s' % (self.args().name, self.args().store))
+
+		return Command.COMMAND_SUCCESS
+
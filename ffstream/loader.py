@@ -2,12 +2,17 @@ import os
 import re
 import json
 from pathlib import Path
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from .core import Application
-from .util import MediaInfo, MediaInfoError
-from .playlist import Playlist, PlaylistEntry, PlaylistFilterEntry, PlaylistProfile, PlaylistEntryProfile
+from .util import MediaInfo, LazyMediaInfo, MediaInfoError
+from .probe import ProbePool
+from .index import DirectoryIndex, DirectoryIndexError
+from .compiled import CompiledPlaylist, CompiledPlaylistError
+from .store import PlaylistStore, PlaylistStoreError
+from .playlist import Playlist, PlaylistEntry, PlaylistFilterEntry, PlaylistProfile, PlaylistEntryProfile, PlaylistSegments, PlaylistError
 from .filter import FilterValidationException
-from .ffmpeg import ArgumentContainer as FfmpegArgContainer
+from .registry import FilterManagerError
+from .ffmpeg import ArgumentContainer as FfmpegArgContainer, ProfileCompiler, ProfileError
 """
 PlaylistLoader
 """
@@ -18,6 +23,7 @@ class PlaylistLoader:
 		if not isinstance(application, Application):
 			raise PlaylistLoaderError('Expected instance of Application')
 		self._application = application
+		self._profiles = {}
 
 	def application(self) -> Application:
 		return self._application
@@ -25,6 +31,38 @@ class PlaylistLoader:
 	def load(self, path: str, options: dict = None) -> Playlist:
 		raise Exception('Must be implemented by inherited class')
 
+	def probe_pool(self, options: dict = None) -> ProbePool:
+		"""
+		Create the ProbePool used to probe playlist sources
+
+		:param options: dict with optional jobs, mount_jobs and deep_probe
+		:return: ProbePool
+		"""
+
+		options = options if isinstance(options, dict) else {}
+		jobs = options['jobs'] if 'jobs' in options and isinstance(options['jobs'], int) else ProbePool.DEFAULT_JOBS
+		mount_jobs = options['mount_jobs'] if 'mount_jobs' in options and isinstance(options['mount_jobs'], int) else None
+		deep = options['deep_probe'] if 'deep_probe' in options and isinstance(options['deep_probe'], bool) else False
+
+		return ProbePool(jobs, mount_jobs, deep)
+
+	def _index(self, options: dict = None) -> (DirectoryIndex, None):
+		options = options if isinstance(options, dict) else {}
+		index = options['index'] if 'index' in options and isinstance(options['index'], (DirectoryIndex, str)) else None
+
+		if isinstance(index, str):
+			try:
+				index = DirectoryIndex(None, index)
+			except DirectoryIndexError as e:
+				raise PlaylistLoaderError(e.message(), e)
+
+		return index
+
+	def _flag_quarantined(self, entry: PlaylistEntry, index: DirectoryIndex = None):
+		if index is not None and index.is_quarantined(entry.source()):
+			entry.set_quarantined(True)
+			self.application().logger().warning('Quarantined %s' % entry.source())
+
 
 """
 DirectoryPlaylistLoader
@@ -35,6 +73,26 @@ class DirectoryPlaylistLoader(PlaylistLoader):
 	DEFAULT_LOAD_TYPES = ['mp4', 'webm', 'mkv']
 
 	def load(self, directory: str, options: dict = None) -> Playlist:
+		playlist = Playlist()
+
+		for entry in self.entries(directory, options):
+			playlist.add_entry(entry)
+
+		return playlist
+
+	def entries(self, directory: str, options: dict = None):
+		"""
+		Yield a PlaylistEntry for every media file in directory as it is probed, in path order
+
+		With an index the index is brought up to date and written before the first entry.
+
+		:param directory: str
+		:param options: dict
+		:return: generator of PlaylistEntry
+		:raises PlaylistLoaderError:
+		"""
+
+		options = options if isinstance(options, dict) else {}
 		recursive = options['recursive'] if 'recursive' in options and isinstance(options['recursive'], bool) else False
 		types = options['types'] if 'types' in options and isinstance(options['types'], list) else DirectoryPlaylistLoader.DEFAULT_LOAD_TYPES
 
@@ -43,20 +101,40 @@ class DirectoryPlaylistLoader(PlaylistLoader):
 		if not path.is_dir():
 			raise PlaylistLoaderError('Playlist path %s is not a file' % path)
 
+		if 'index' in options and isinstance(options['index'], (DirectoryIndex, str)):
+			index = options['index']
+
+			try:
+				if not isinstance(index, DirectoryIndex):
+					index = DirectoryIndex(directory, index, types, recursive)
+
+				with self.probe_pool(options) as pool:
+					index.update(pool)
+
+				index.write()
+			except DirectoryIndexError as e:
+				raise PlaylistLoaderError(e.message(), e)
+
+			for info in index.media():
+				yield PlaylistEntry(info)
+			return
+
 		pattern = '**/*' if recursive is True else '*'
 
-		playlist = Playlist()
+		files = []
 
 		for file in path.glob(pattern):
 			if file.is_file():
-				if re.search('\.(%s)$' % '|'.join(types), file.name):
-					try:
-						info = MediaInfo(str(file))
-					except MediaInfoError:
-						continue
-					entry = PlaylistEntry(info)
-					playlist.add_entry(entry)
-		return playlist
+				if re.search('\\.(%s)$' % '|'.join(types), file.name):
+					files.append(str(file))
+
+		files.sort()
+
+		with self.probe_pool(options) as pool:
+			for source, info in pool.map(files):
+				if isinstance(info, MediaInfoError):
+					continue
+				yield PlaylistEntry(info)
 
 
 """
@@ -79,15 +157,67 @@ class JsonPlaylistLoader(PlaylistLoader):
 
 		playlist = Playlist(path)
 
-		if 'output' not in json_root or not isinstance(json_root['output'], dict):
-			raise PlaylistLoaderError('Expected a dict for output but got %s' % json_root['output'].__class__)
+		self._load_header(playlist, json_root)
+
+		if 'entries' in json_root and isinstance(json_root['entries'], list):
+			for entry in self._load_entries(playlist, json_root['entries'], options):
+				pass
+
+		return playlist
+
+	def load_header(self, path: str) -> Playlist:
+		"""
+		Load only the playlist level members, the entries are skipped over unparsed into entries
+
+		:param path: str
+		:return: Playlist without entries
+		:raises PlaylistLoaderError:
+		"""
+
+		try:
+			with open(path, 'r') as fp:
+				members = OrderedDict(m for m in JsonMemberReader(fp).read() if m[0] != 'entries')
+		except OSError as e:
+			raise PlaylistLoaderError('Unable to read playlist %s' % path, e)
+
+		playlist = Playlist(path)
+		self._load_header(playlist, members)
+		return playlist
 
-		playlist.set_name(json_root['name'])
-		playlist.output().set_destination(json_root['output']['destination'])
-		playlist.output().resolution().parse_str(json_root['output']['resolution'])
-		playlist.set_should_shuffle(json_root['shuffle'] if 'shuffle' in json_root else False)
-		playlist.set_should_loop(json_root['loop'] if 'loop' in json_root else False)
-		playlist.set_should_shuffle(json_root['loop_shuffle'] if 'loop_shuffle' in json_root else False)
+	def _load_header(self, playlist: Playlist, json_root: dict, require_output: bool = True):
+		"""
+		Apply every playlist level member present in json_root
+
+		:param playlist: Playlist
+		:param json_root: dict
+		:param require_output: bool
+		:raises PlaylistLoaderError:
+		"""
+
+		if 'output' in json_root or require_output:
+			if 'output' not in json_root or not isinstance(json_root['output'], dict):
+				raise PlaylistLoaderError('Expected a dict for output but got %s' % json_root.get('output').__class__)
+
+			playlist.output().set_destination(json_root['output']['destination'])
+			playlist.output().resolution().parse_str(json_root['output']['resolution'])
+
+			if 'segments' in json_root['output']:
+				try:
+					playlist.output().set_segments(PlaylistSegments(json_root['output']['segments']))
+				except PlaylistError as e:
+					raise PlaylistLoaderError(e.message(), e)
+
+		if 'name' in json_root:
+			playlist.set_name(json_root['name'])
+
+		if 'shuffle' in json_root:
+			playlist.set_should_shuffle(json_root['shuffle'])
+
+		if 'loop' in json_root:
+			playlist.set_should_loop(json_root['loop'])
+
+		if 'loop_shuffle' in json_root:
+			playlist.set_should_loop_shuffle(json_root['loop_shuffle'])
 
 		if 'filters' in json_root and isinstance(json_root['filters'], list):
 			for f in json_root['filters']:
@@ -97,94 +227,537 @@ class JsonPlaylistLoader(PlaylistLoader):
 				if 'type' not in f or not isinstance(f['type'], str):
 					raise PlaylistLoaderError('Expected string for filter type')
 
-				handler = self.application().filter_manager().get(f['type'])
+				try:
+					handler = self.application().filter_manager().get(f['type'])
+				except FilterManagerError as e:
+					raise PlaylistLoaderError(e.message(), e)
 
 				if handler is None:
 					raise PlaylistLoaderError('Filter handler %s not found' % f['type'])
 
-				options = {}
+				filter_options = {}
 
 				if 'options' in f and isinstance(f['options'], dict):
-					options.update(f['options'])
+					filter_options.update(f['options'])
 
 				try:
-					handler.validate(options)
+					handler.validate(filter_options)
 				except FilterValidationException as e:
 					raise PlaylistLoaderError('Filter handler reported invalid option: %s' % e.message())
 
-				playlist.add_filter(PlaylistFilterEntry(handler, options))
+				if 'encoder' in f and not isinstance(f['encoder'], bool):
+					raise PlaylistLoaderError('Expected boolean for filter encoder')
 
-		if 'entries' in json_root and isinstance(json_root['entries'], list):
-			for i, e in enumerate(json_root['entries'], 0):
-				self.application().logger().info('Processing Entry %d - %s' % (i, e['source']))
+				if f.get('encoder') is True and not handler.supports_encoder():
+					raise PlaylistLoaderError('Filter %s depends on the entry and can not be applied in the encoder' % f['type'])
+
+				playlist.add_filter(PlaylistFilterEntry(handler, filter_options, f.get('encoder') is True))
+
+		if 'profile' in json_root and isinstance(json_root['profile'], dict):
+			profile = PlaylistProfile(json_root['profile'])
+
+			try:
+				ProfileCompiler.validate(profile.encoder_args())
+				ProfileCompiler.validate(profile.decoder_args())
+			except ProfileError as e:
+				raise PlaylistLoaderError('Invalid playlist profile - %s' % e.message(), e)
+
+			playlist.set_profile(profile)
+
+		if 'separation' in json_root and isinstance(json_root['separation'], dict):
+			try:
+				playlist.set_separation(json_root['separation'])
+			except PlaylistError as e:
+				raise PlaylistLoaderError(e.message(), e)
+
+	def _load_entries(self, playlist: Playlist, entries, options: dict = None):
+		"""
+		Build, add and yield a PlaylistEntry for every raw entry, in order
+
+		:param playlist: Playlist
+		:param entries: iterable of dict
+		:param options: dict
+		:return: generator of PlaylistEntry
+		:raises PlaylistLoaderError:
+		"""
+
+		options = options if isinstance(options, dict) else {}
+		lazy = options['lazy'] if 'lazy' in options and isinstance(options['lazy'], bool) else False
+		deep = options['deep_probe'] if 'deep_probe' in options and isinstance(options['deep_probe'], bool) else False
+		index = self._index(options)
+
+		if lazy is True:
+			media = {}
+
+			for e in entries:
+				if e['source'] not in media:
+					media[e['source']] = LazyMediaInfo(e['source'], deep=deep)
 				try:
-					info = MediaInfo(e['source'])
+					entry = self._load_entry(e, media[e['source']])
 				except MediaInfoError as ex:
-					raise PlaylistLoaderError(ex.message(), e)
+					raise PlaylistLoaderError(ex.message(), ex)
+
+				self._flag_quarantined(entry, index)
+				playlist.add_entry(entry)
+				yield entry
+			return
+
+		# raw entries are queued as the pool pulls their sources, and taken back in the same order
+		pending = deque()
+
+		def sources():
+			for e in entries:
+				pending.append(e)
+				yield e['source']
+
+		with self.probe_pool(options) as pool:
+			for i, (source, info) in enumerate(pool.map(sources()), 0):
+				e = pending.popleft()
+
+				self.application().logger().info('Processing Entry %d - %s' % (i, source))
+
+				if isinstance(info, MediaInfoError):
+					raise PlaylistLoaderError(info.message(), info)
+
+				entry = self._load_entry(e, info)
+				self._flag_quarantined(entry, index)
+				playlist.add_entry(entry)
+				yield entry
+
+	def _load_entry(self, e: dict, info: MediaInfo) -> PlaylistEntry:
+		# lazy media only needs probing up front when the playlist has no usable duration
+		if isinstance(info, LazyMediaInfo) and ('duration' not in e or e['duration'] in ('', None, 0.00)):
+			info.resolve()
+
+		entry = PlaylistEntry(info)
+
+		if 'start' in e:
+			entry.set_start(float(e['start']))
+
+		if 'duration' in e:
+			if e['duration'] in ('', None, 0.00):
+				duration = float(info.video_stream().duration())
+				self.application().logger().info('Corrected Duration to %f from probed info' % duration)
+			else:
+				duration = float(e['duration'])
+			if info.was_probed() and info.video_stream_count() > 0:
+				check = info.video_stream().duration()
+				if check not in (0.00, None) and check != duration:
+					duration = check
+			entry.set_duration(duration)
+
+		if 'end' in e:
+			entry.set_end(float(e['end']))
+		else:
+			entry.set_end(entry.duration())
+
+		if 'title' in e:
+			entry.set_title(e['title'])
+
+		if 'author' in e:
+			entry.set_author(e['author'])
+
+		if 'weight' in e and isinstance(e['weight'], (int, float)):
+			entry.set_weight(e['weight'])
+
+		if 'filters' in e and isinstance(e['filters'], list):
+			for f in e['filters']:
+				if not isinstance(f, dict):
+					raise PlaylistLoaderError('Expected dictionary for filter entry')
+
+				if 'type' not in f or not isinstance(f['type'], str):
+					raise PlaylistLoaderError('Expected string for filter type')
+
+				try:
+					handler = self.application().filter_manager().get(f['type'])
+				except FilterManagerError as e:
+					raise PlaylistLoaderError(e.message(), e)
+
+				if handler is None:
+					raise PlaylistLoaderError('Filter handler %s not found' % f['type'])
 
-				entry = PlaylistEntry(info)
+				options = {}
+
+				if 'options' in f and isinstance(f['options'], dict):
+					options.update(f['options'])
+
+				try:
+					handler.validate(options)
+				except FilterValidationException as e:
+					raise PlaylistLoaderError('Filter handler reported invalid options for %s - %s' % (handler.name(), e.message()))
+
+				entry.add_filter(PlaylistFilterEntry(handler, options))
+
+		if 'profile' in e and isinstance(e['profile'], dict):
+			entry.set_profile(self._entry_profile(e['profile']))
 
-				if 'start' in e:
-					entry.set_start(float(e['start']))
+		return entry
 
-				if 'duration' in e:
-					if e['duration'] in ('', None, 0.00):
-						duration = float(info.video_stream().duration())
-						self.application().logger().info('Corrected Duration to %f from probed info' % duration)
+	def _entry_profile(self, data: dict) -> PlaylistEntryProfile:
+		# entries with the same profile share the instance, it is validated and compiled once
+		key = json.dumps(data)
+
+		if key not in self._profiles:
+			profile = PlaylistEntryProfile(data)
+
+			try:
+				ProfileCompiler.validate(profile.decoder_args())
+			except ProfileError as e:
+				raise PlaylistLoaderError('Invalid entry profile - %s' % e.message(), e)
+
+			self._profiles[key] = profile
+
+		return self._profiles[key]
+
+
+"""
+JsonMemberReader - Incrementally reads the top level members of a json playlist
+
+Values are decoded one at a time from a buffered file, so the items of the entries
+array are produced one by one and never held as a whole document.
+"""
+
+
+class JsonMemberReader:
+	CHUNK_SIZE = 64 * 1024
+
+	WHITESPACE = ' \t\r\n'
+
+	def __init__(self, fp, stream_key: str = 'entries'):
+		self._fp = fp
+		self._stream_key = stream_key
+		self._buffer = ''
+		self._pos = 0
+		self._eof = False
+		self._decoder = json.JSONDecoder(object_pairs_hook=OrderedDict)
+
+	def _fill(self) -> bool:
+		if self._eof:
+			return False
+
+		# grow reads with the pending data so values spanning many chunks stay linear
+		chunk = self._fp.read(max(JsonMemberReader.CHUNK_SIZE, len(self._buffer) - self._pos))
+
+		if not len(chunk):
+			self._eof = True
+			return False
+
+		self._buffer = self._buffer[self._pos:] + chunk
+		self._pos = 0
+		return True
+
+	def _peek(self) -> str:
+		while True:
+			while self._pos < len(self._buffer) and self._buffer[self._pos] in JsonMemberReader.WHITESPACE:
+				self._pos += 1
+			if self._pos < len(self._buffer) or not self._fill():
+				break
+		return self._buffer[self._pos] if self._pos < len(self._buffer) else ''
+
+	def _expect(self, expected: str) -> str:
+		c = self._peek()
+		if c not in expected or not len(c):
+			raise PlaylistLoaderError('Unable to load json file, expected %s at offset %d' % (' or '.join(expected), self._pos))
+		self._pos += 1
+		return c
+
+	def _value(self):
+		self._peek()
+
+		while True:
+			try:
+				value, end = self._decoder.raw_decode(self._buffer, self._pos)
+				# a number running into the end of the buffer may continue in the next chunk
+				if end < len(self._buffer) or self._eof:
+					self._pos = end
+					return value
+			except ValueError as e:
+				if self._eof:
+					raise PlaylistLoaderError('Unable to load json file', e)
+			self._fill()
+
+	def read(self):
+		"""
+		Yield (key, value) for each top level member. The items of the streamed array are
+		yielded one at a time as (key, item), a streamed key which is not an array is skipped.
+
+		:return: generator of (str, object)
+		:raises PlaylistLoaderError:
+		"""
+
+		self._expect('{')
+
+		if self._peek() == '}':
+			return
+
+		while True:
+			key = self._value()
+			self._expect(':')
+
+			if key == self._stream_key:
+				if self._peek() == '[':
+					self._pos += 1
+					if self._peek() == ']':
+						self._pos += 1
 					else:
-						duration = float(e['duration'])
-					if info.video_stream_count() > 0:
-						check = info.video_stream().duration()
-						if check not in (0.00, None) and check != duration:
-							duration = check
-					entry.set_duration(duration)
-
-				if 'end' in e:
-					entry.set_end(float(e['end']))
+						while True:
+							yield key, self._value()
+							if self._expect(',]') == ']':
+								break
 				else:
-					entry.set_end(entry.duration())
+					self._value()
+			else:
+				yield key, self._value()
+
+			if self._expect(',}') == '}':
+				return
+
+
+"""
+StreamingJsonPlaylistLoader - Builds playlist entries while the json file is still being read
+"""
+
+
+class StreamingJsonPlaylistLoader(JsonPlaylistLoader):
+	def load(self, path: str, options: dict = None) -> Playlist:
+		playlist = Playlist(path)
 
-				if 'title' in e:
-					entry.set_title(e['title'])
+		for entry in self.stream(playlist, options):
+			pass
 
-				if 'author' in e:
-					entry.set_author(e['author'])
+		return playlist
 
-				if 'filters' in e and isinstance(e['filters'], list):
-					for f in e['filters']:
-						if not isinstance(f, dict):
-							raise PlaylistLoaderError('Expected dictionary for filter entry')
+	def stream(self, playlist: Playlist, options: dict = None):
+		"""
+		Read the playlist at playlist.path() incrementally, yielding each PlaylistEntry once it
+		is built and added. Members written before the entries, output included, are applied
+		before the first entry is yielded, members after them once the file is read.
 
-						if 'type' not in f or not isinstance(f['type'], str):
-							raise PlaylistLoaderError('Expected string for filter type')
+		:param playlist: Playlist
+		:param options: dict
+		:return: generator of PlaylistEntry
+		:raises PlaylistLoaderError:
+		"""
 
-						handler = self.application().filter_manager().get(f['type'])
+		path = playlist.path()
 
-						if handler is None:
-							raise PlaylistLoaderError('Filter handler %s not found' % f['type'])
+		if not isinstance(path, str) or not os.path.isfile(path):
+			raise PlaylistLoaderError('Playlist path %s is not a file' % path)
 
-						options = {}
+		try:
+			fp = open(path, 'r')
+		except OSError as e:
+			raise PlaylistLoaderError('Unable to load json file', e)
+
+		with fp:
+			header = OrderedDict()
+			reader = JsonMemberReader(fp)
+			applied = False
+
+			def entries():
+				nonlocal applied
+				for key, value in reader.read():
+					if key != 'entries':
+						header[key] = value
+						continue
+					if not applied:
+						self._load_header(playlist, header)
+						header.clear()
+						applied = True
+					yield value
 
-						if 'options' in f and isinstance(f['options'], dict):
-							options.update(f['options'])
+			for entry in self._load_entries(playlist, entries(), options):
+				yield entry
 
-						try:
-							handler.validate(options)
-						except FilterValidationException as e:
-							raise PlaylistLoaderError('Filter handler reported invalid options for %s - %s' % (handler.name(), e.message()))
+			# members written after the entries, or the whole header when there were none
+			self._load_header(playlist, header, require_output=not applied)
 
-						entry.add_filter(PlaylistFilterEntry(handler, options))
 
-				if 'profile' in e and isinstance(e['profile'], dict):
-					entry.set_profile(PlaylistEntryProfile(e['profile']))
+"""
+CompiledPlaylistLoader - Loads playlists written by playlist:compile
+"""
 
+
+class CompiledPlaylistLoader(PlaylistLoader):
+	def load(self, path: str, options: dict = None) -> Playlist:
+		playlist = Playlist(path)
+
+		for entry in self.stream(playlist, options):
+			pass
+
+		return playlist
+
+	def stream(self, playlist: Playlist, options: dict = None):
+		"""
+		Open the compiled playlist at playlist.path(), apply its members and yield each entry
+		as it is materialized and added. Unless lazy, every entry is probed, a few ahead on the
+		ProbePool.
+
+		:param playlist: Playlist
+		:param options: dict
+		:return: generator of PlaylistEntry
+		:raises PlaylistLoaderError:
+		"""
+
+		with self.open(playlist.path(), playlist) as compiled:
+			for entry in self.entries(compiled, options):
 				playlist.add_entry(entry)
+				yield entry
 
-		if 'profile' in json_root and isinstance(json_root['profile'], dict):
-			playlist.set_profile(PlaylistProfile(json_root['profile']))
+	def open(self, path: str, playlist: Playlist = None) -> CompiledPlaylist:
+		"""
+		Open a compiled playlist, applying its members to playlist when given
+
+		:param path: str
+		:param playlist: Playlist|None
+		:return: CompiledPlaylist, closed by the caller
+		:raises PlaylistLoaderError:
+		"""
+
+		try:
+			compiled = CompiledPlaylist(path, self.application().filter_manager())
+		except CompiledPlaylistError as e:
+			raise PlaylistLoaderError(e.message(), e)
+
+		try:
+			if playlist is not None:
+				compiled.playlist(playlist)
+		except CompiledPlaylistError as e:
+			compiled.close()
+			raise PlaylistLoaderError(e.message(), e)
+
+		return compiled
+
+	def entries(self, compiled: CompiledPlaylist, options: dict = None, rows=None):
+		"""
+		Materialize entries as they are asked for, without adding them to a playlist, so
+		playing a compiled playlist never holds more than the entries ahead of playout.
+		Unless lazy, every entry is probed, a few ahead on the ProbePool.
+
+		:param compiled: CompiledPlaylist
+		:param options: dict
+		:param rows: iterable of int entry indices to yield in order, every entry by default
+		:return: generator of PlaylistEntry
+		:raises PlaylistLoaderError:
+		"""
+
+		options = options if isinstance(options, dict) else {}
+		lazy = options['lazy'] if 'lazy' in options and isinstance(options['lazy'], bool) else False
+		index = self._index(options)
+		rows = rows if rows is not None else range(len(compiled))
+
+		with self.probe_pool(options) as pool:
+			window = deque()
+
+			try:
+				for row in rows:
+					entry = compiled.entry(row)
+					if not lazy:
+						pool.prefetch(entry.media_info())
+					window.append(entry)
+
+					if len(window) >= pool.jobs() * 2:
+						yield self._entry(window.popleft(), lazy, index)
+			except CompiledPlaylistError as e:
+				raise PlaylistLoaderError(e.message(), e)
+
+			while len(window):
+				yield self._entry(window.popleft(), lazy, index)
+
+	def _entry(self, entry: PlaylistEntry, lazy: bool, index: DirectoryIndex = None) -> PlaylistEntry:
+		if not lazy:
+			try:
+				entry.media_info().resolve()
+			except MediaInfoError as e:
+				raise PlaylistLoaderError(e.message(), e)
+
+		self._flag_quarantined(entry, index)
+		return entry
+
+
+"""
+StorePlaylistLoader - Loads query defined playlists from a PlaylistStore
+"""
+
+
+class StorePlaylistLoader(JsonPlaylistLoader):
+	def load(self, path: str, options: dict = None) -> Playlist:
+		playlist = Playlist(path)
+
+		for entry in self.stream(playlist, options):
+			pass
 
 		return playlist
 
+	def stream(self, playlist: Playlist, options: dict = None):
+		"""
+		Evaluate a stored playlist, or a query given in options, yielding entries as the
+		query's rows are read. Media stored with its probe result is never probed again,
+		anything else is probed unless lazy and the result kept in the store.
+
+		:param playlist: Playlist whose path is the store
+		:param options: dict with playlist (name) or query (dict), and optionally an open store
+		:return: generator of PlaylistEntry
+		:raises PlaylistLoaderError:
+		"""
+
+		options = options if isinstance(options, dict) else {}
+		lazy = options['lazy'] if 'lazy' in options and isinstance(options['lazy'], bool) else False
+		deep = options['deep_probe'] if 'deep_probe' in options and isinstance(options['deep_probe'], bool) else False
+		index = self._index(options)
+		store = options['store'] if 'store' in options and isinstance(options['store'], PlaylistStore) else None
+
+		try:
+			if store is None:
+				store = PlaylistStore(playlist.path())
+
+			if 'query' in options and isinstance(options['query'], dict):
+				header, query = {}, options['query']
+			elif 'playlist' in options and isinstance(options['playlist'], str):
+				header, query = store.playlist(options['playlist'])
+			else:
+				raise PlaylistLoaderError('Expected a playlist name or query to load from %s' % playlist.path())
+
+			self._load_header(playlist, header, require_output=False)
+
+			for row in store.select(query):
+				e = {
+					'source': row['source'],
+					'title': row['title'],
+					'author': row['author'],
+					'duration': row['duration'],
+					'filters': json.loads(row['filters']) if row['filters'] is not None else [],
+				}
+
+				if row['start_time'] is not None:
+					e['start'] = row['start_time']
+				if row['end_time'] is not None:
+					e['end'] = row['end_time']
+				if row['profile'] is not None:
+					e['profile'] = json.loads(row['profile'])
+
+				try:
+					if row['probe'] is not None:
+						info = MediaInfo.from_probe_data(row['source'], json.loads(row['probe']))
+					else:
+						info = LazyMediaInfo(row['source'], deep=deep)
+						if not lazy:
+							info.resolve()
+							store.set_probe(row['source'], info.serialize())
+
+					entry = self._load_entry(e, info)
+				except MediaInfoError as ex:
+					raise PlaylistLoaderError(ex.message(), ex)
+
+				self._flag_quarantined(entry, index)
+				playlist.add_entry(entry)
+				yield entry
+		except PlaylistStoreError as e:
+			raise PlaylistLoaderError(e.message(), e)
+		finally:
+			if store is not None and store is not options.get('store'):
+				store.close()
+
 
 """
 PlaylistLoaderError
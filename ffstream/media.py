@@ -1,10 +1,19 @@
 import os
 import sys
+import time
 import ffmpeg
 from pathlib import Path
 from .core import Application, Command, CommandArgumentParser
 from .loader import DirectoryPlaylistLoader, PlaylistLoaderError
 from .playlist import PlaylistEntry
+from .index import DirectoryIndex, DirectoryIndexError
+from .probe import ProbePool
+from .verify import MediaVerifier
+
+
+"""
+FixMediaMetaCommand
+"""
 
 
 class FixMediaMetaCommand(Command):
@@ -21,6 +30,8 @@ class FixMediaMetaCommand(Command):
 		self.parser().add_argument('-d', '--directory', help='Directory to scan for video files', required=True)
 		self.parser().add_argument('-r', '--recursive', help='Scan directory recursively', action='store_true', default=False)
 		self.parser().add_argument('-t', '--types', nargs='*', help='Types of video files to consider', default=['mp4', 'webm', 'mkv'])
+		self.parser().add_argument('-j', '--jobs', help='Number of files to probe in parallel', type=int, default=1)
+		self.parser().add_argument('--mount-jobs', help='Maximum number of parallel probes per mount point', type=int, default=None)
 
 		self.set_args(self.parser().parse_args(sys.argv[2:]))
 
@@ -36,7 +47,9 @@ class FixMediaMetaCommand(Command):
 		try:
 			playlist = loader.load(self.args().directory, {
 				'recursive': self.args().recursive,
-				'types': self.args().types
+				'types': self.args().types,
+				'jobs': self.args().jobs,
+				'mount_jobs': self.args().mount_jobs
 			})
 
 		except PlaylistLoaderError as e:
@@ -62,4 +75,91 @@ class FixMediaMetaCommand(Command):
 				else:
 					self.logger().error('No copy routine implemented for %s' % entry.source())
 
-		return Command.COMMAND_SUCCESS
\ No newline at end of file
+		return Command.COMMAND_SUCCESS
+
+"""
+VerifyMediaCommand
+"""
+
+
+class VerifyMediaCommand(Command):
+	def __init__(self, application: Application, parser: CommandArgumentParser = None):
+		super().__init__(application, parser)
+
+	def name(self):
+		return "media:verify"
+
+	def description(self):
+		return "Fully decode media files in directory, quarantining truncated or corrupt files."
+
+	def init(self):
+		self.parser().add_argument('-d', '--directory', help='Directory to scan for video files', required=True)
+		self.parser().add_argument('-i', '--index', help='Index file to record probe and verification results in', required=True)
+		self.parser().add_argument('-r', '--recursive', help='Scan directory recursively', action='store_true', default=False)
+		self.parser().add_argument('-t', '--types', nargs='*', help='Types of video files to consider', default=['mp4', 'webm', 'mkv'])
+		self.parser().add_argument('-j', '--jobs', help='Number of files to decode in parallel', type=int, default=1)
+		self.parser().add_argument('-n', '--nice', help='CPU niceness of the decoding processes', type=int, default=10)
+		self.parser().add_argument('--no-idle-io', help='Do not run the decoders in the idle IO class', action='store_true', default=False)
+		self.parser().add_argument('-a', '--all', help='Verify every file again, not only new or changed ones', action='store_true', default=False)
+		self.parser().add_argument('-b', '--background', help='Keep running and verify files as they land in the directory', action='store_true', default=False)
+		self.parser().add_argument('--interval', help='Seconds between directory scans in background mode', type=float, default=300.0)
+
+		self.set_args(self.parser().parse_args(sys.argv[2:]))
+
+	def run(self):
+		path = Path(self.args().directory).resolve()
+
+		if not path.is_dir():
+			self.logger().error('Directory specified is not a directory')
+			return Command.COMMAND_ERROR
+
+		try:
+			index = DirectoryIndex(str(path), self.args().index, self.args().types, self.args().recursive)
+		except DirectoryIndexError as e:
+			self.logger().error(e.message())
+			return Command.COMMAND_ERROR
+
+		if self.args().all is True:
+			for record in index.files().values():
+				record.pop('verify', None)
+
+		with ProbePool(self.args().jobs) as pool, MediaVerifier(self.args().jobs, self.args().nice, not self.args().no_idle_io) as verifier:
+			while True:
+				index.update(pool)
+
+				pending = index.unverified()
+
+				if len(pending):
+					self.logger().info('Verifying %d files' % len(pending))
+
+				for i, (source, result) in enumerate(verifier.map(pending), 1):
+					if index.set_verification(source, result):
+						self.logger().error('Quarantined %s' % source)
+						for error in result['errors'][:5]:
+							self.logger().error('\t%s' % error)
+					elif self.args().verbose:
+						self.logger().notice('Verified %s' % source)
+
+					# keep progress if a long pass gets interrupted, the write after the pass reports failure
+					if i % 50 == 0:
+						try:
+							index.write()
+						except DirectoryIndexError as e:
+							self.logger().warning(e.message())
+
+				try:
+					index.write()
+				except DirectoryIndexError as e:
+					self.logger().error(e.message())
+					return Command.COMMAND_ERROR
+
+				if self.args().background is not True:
+					break
+
+				time.sleep(self.args().interval)
+
+		quarantined = index.quarantined()
+
+		self.logger().info('%d files indexed, %d quarantined' % (len(index.files()), len(quarantined)))
+
+		return Command.COMMAND_SUCCESS if not len(quarantined) else Command.COMMAND_ERROR
@@ -1,9 +1,11 @@
-import random
+import sys
 from .filter import Filter
 from .util import MediaInfo, VideoResolution, Serializable
-from .ffmpeg import ArgumentContainer as FfmpegArgContainer
+from .ffmpeg import ArgumentContainer as FfmpegArgContainer, ProfileCompiler
+from .rotation import Rotation
 from collections import deque
 import urllib.parse
+import random
 
 """
 PlaylistEntry
@@ -11,6 +13,8 @@ PlaylistEntry
 
 
 class PlaylistEntry(Serializable):
+	__slots__ = ('_media_info', '_title', '_author', '_start', '_end', '_duration', '_filters', '_profile', '_quarantined', '_weight')
+
 	def __init__(self, media_info: MediaInfo):
 		self._media_info = media_info
 		self._title = ''
@@ -18,13 +22,16 @@ class PlaylistEntry(Serializable):
 		self._start = 0.00
 		self._end = 0.00
 		self._duration = 0.00
-		self._filters = []
-		self._profile = PlaylistEntryProfile()
+		self._filters = None  # allocated on first add_filter
+		self._profile = None  # None shares PlaylistEntryProfile.EMPTY
+		self._quarantined = False
+		self._weight = 1.00
 
 		if not isinstance(media_info, MediaInfo):
 			raise TypeError
 
-		if media_info.video_stream() is not None:
+		# lazy media is left unprobed, the loader fills in the timing from the playlist
+		if media_info.was_probed() and media_info.video_stream() is not None:
 			self._start = media_info.video_stream().start()
 			self._end = media_info.video_stream().duration()
 			self._duration = media_info.video_stream().duration()
@@ -42,7 +49,7 @@ class PlaylistEntry(Serializable):
 	def set_title(self, title: str) -> 'PlaylistEntry':
 		if not isinstance(title, str):
 			raise ValueError
-		self._title = title
+		self._title = sys.intern(title)
 		return self
 
 	def author(self) -> str:
@@ -51,7 +58,7 @@ class PlaylistEntry(Serializable):
 	def set_author(self, author: str) -> 'PlaylistEntry':
 		if not isinstance(author, str):
 			raise ValueError
-		self._author = author
+		self._author = sys.intern(author)
 		return self
 
 	def source(self) -> str:
@@ -79,7 +86,7 @@ class PlaylistEntry(Serializable):
 		return self._duration
 
 	def filters(self) -> list:
-		return self._filters
+		return self._filters if self._filters is not None else []
 
 	def output_duration(self) -> float:
 		if self.start() in (0, None):
@@ -88,6 +95,8 @@ class PlaylistEntry(Serializable):
 
 	def add_filter(self, f: 'PlaylistFilterEntry') -> 'PlaylistEntry':
 		if isinstance(f, PlaylistFilterEntry):
+			if self._filters is None:
+				self._filters = []
 			self._filters.append(f)
 		else:
 			raise PlaylistError('Expected an instance of PlaylistFilterEntry')
@@ -103,14 +112,14 @@ class PlaylistEntry(Serializable):
 		return self
 
 	def has_filters(self) -> bool:
-		return len(self._filters) > 0
+		return self._filters is not None and len(self._filters) > 0
 
 	def clear_filters(self) -> 'PlaylistEntry':
-		self._filters.clear()
+		self._filters = None
 		return self
 
 	def profile(self) -> 'PlaylistEntryProfile':
-		return self._profile
+		return self._profile if self._profile is not None else PlaylistEntryProfile.EMPTY
 
 	def set_profile(self, profile: 'PlaylistEntryProfile') -> 'PlaylistEntry':
 		if not isinstance(profile, PlaylistEntryProfile):
@@ -118,6 +127,20 @@ class PlaylistEntry(Serializable):
 		self._profile = profile
 		return self
 
+	def is_quarantined(self) -> bool:
+		return self._quarantined
+
+	def set_quarantined(self, quarantined: bool) -> 'PlaylistEntry':
+		self._quarantined = quarantined is True
+		return self
+
+	def weight(self) -> float:
+		return self._weight
+
+	def set_weight(self, weight: float) -> 'PlaylistEntry':
+		self._weight = weight if isinstance(weight, float) else float(weight)
+		return self
+
 	def serialize(self) -> dict:
 		result = {
 			'title': self.title(),
@@ -130,9 +153,13 @@ class PlaylistEntry(Serializable):
 			'profile': self.profile().serialize()
 		}
 
-		for f in self._filters:
+		for f in self.filters():
 			result['filters'].append(f.serialize())
 
+		# only written when set, so existing playlists serialize as before
+		if self.weight() != 1.00:
+			result['weight'] = self.weight()
+
 		return result
 
 
@@ -142,9 +169,12 @@ PlaylistFilterEntry
 
 
 class PlaylistFilterEntry(Serializable):
-	def __init__(self, handler: Filter, options: dict = None):
+	__slots__ = ('_handler', '_options', '_encoder')
+
+	def __init__(self, handler: Filter, options: dict = None, encoder: bool = False):
 		self._handler = handler
 		self._options = {}
+		self._encoder = encoder is True
 		if isinstance(options, dict):
 			self._options.update(options)
 
@@ -154,12 +184,98 @@ class PlaylistFilterEntry(Serializable):
 	def options(self) -> dict:
 		return self._options
 
+	def is_encoder(self) -> bool:
+		"""
+		Whether the filter is applied once in the encoder graph instead of to every entry
+
+		:return: bool
+		"""
+
+		return self._encoder
+
+	def set_encoder(self, encoder: bool) -> 'PlaylistFilterEntry':
+		self._encoder = encoder is True
+		return self
+
 	def serialize(self) -> dict:
-		return {
+		result = {
 			'type': self._handler.name(),
 			'options': self.options()
 		}
 
+		if self._encoder:
+			result['encoder'] = True
+
+		return result
+
+
+"""
+PlaylistSegments - Segmented output, destination names the hls playlist or dash manifest
+"""
+
+
+class PlaylistSegments(Serializable):
+	FORMATS = ('hls', 'dash')
+
+	DEFAULT_SECONDS = 6.0
+	DEFAULT_WINDOW = 6
+
+	def __init__(self, data: dict = None):
+		data = data if isinstance(data, dict) else {}
+
+		self._format = data.get('format', 'hls')
+		self._seconds = data.get('seconds', PlaylistSegments.DEFAULT_SECONDS)
+		self._window = data.get('window', PlaylistSegments.DEFAULT_WINDOW)
+		self._staging = data.get('staging')
+
+		if self._format not in PlaylistSegments.FORMATS:
+			raise PlaylistError('Expected one of %s for the segment format' % ', '.join(PlaylistSegments.FORMATS))
+		if isinstance(self._seconds, bool) or not isinstance(self._seconds, (int, float)) or self._seconds <= 0:
+			raise PlaylistError('Expected a positive number for segment seconds')
+		if isinstance(self._window, bool) or not isinstance(self._window, int) or self._window < 1:
+			raise PlaylistError('Expected a positive integer for the segment window')
+		if self._staging is not None and not isinstance(self._staging, str):
+			raise PlaylistError('Expected a directory for segment staging')
+
+	def format(self) -> str:
+		return self._format
+
+	def seconds(self) -> float:
+		"""
+		Wanted segment length, segments are cut at the encoder's keyframes so this is rounded
+		to a whole number of GOPs
+
+		:return: float
+		"""
+
+		return float(self._seconds)
+
+	def window(self) -> int:
+		"""
+		:return: int segments listed, older ones are deleted
+		"""
+
+		return self._window
+
+	def staging(self) -> (str, None):
+		"""
+		:return: str|None directory, tmpfs usually, segments are written to and flushed from
+		"""
+
+		return self._staging
+
+	def serialize(self) -> dict:
+		result = {
+			'format': self._format,
+			'seconds': self._seconds,
+			'window': self._window
+		}
+
+		if self._staging is not None:
+			result['staging'] = self._staging
+
+		return result
+
 
 """
 PlaylistOutput
@@ -170,6 +286,7 @@ class PlaylistOutput(Serializable):
 	def __init__(self, data: dict = None):
 		self._destination = ''
 		self._resolution = VideoResolution()
+		self._segments = None
 
 		self._data = {}
 		if isinstance(data, dict):
@@ -178,6 +295,8 @@ class PlaylistOutput(Serializable):
 		self.set_destination(self._data['destination'] if 'destination' in self._data else '')
 		if 'resolution' in self._data:
 			self.set_resolution(self._data['resolution'])
+		if 'segments' in self._data:
+			self.set_segments(PlaylistSegments(self._data['segments']))
 
 	def resolution(self) -> VideoResolution:
 		return self._resolution
@@ -197,12 +316,29 @@ class PlaylistOutput(Serializable):
 		elif isinstance(resolution, str):
 			self._resolution.parse_str(resolution)
 
+	def segments(self) -> ('PlaylistSegments', None):
+		return self._segments
+
+	def set_segments(self, segments: (PlaylistSegments, None)) -> 'PlaylistOutput':
+		if segments is not None and not isinstance(segments, PlaylistSegments):
+			raise PlaylistError('Expected instance of PlaylistSegments')
+		self._segments = segments
+		return self
+
+	def is_segmented(self) -> bool:
+		return self._segments is not None
+
 	def serialize(self) -> dict:
-		return {
+		result = {
 			'destination': self.destination(),
 			'resolution': '%dx%d' % (int(self.resolution().x()), int(self.resolution().y()))
 		}
 
+		if self._segments is not None:
+			result['segments'] = self._segments.serialize()
+
+		return result
+
 
 """
 PlaylistProfile
@@ -251,6 +387,11 @@ PlaylistEntryProfile
 
 
 class PlaylistEntryProfile(Serializable):
+	__slots__ = ('_decoder_args',)
+
+	# shared by every entry without a profile of its own, treat as read only
+	EMPTY = None
+
 	def __init__(self, data: dict = None):
 		self._decoder_args = FfmpegArgContainer()
 
@@ -273,6 +414,9 @@ class PlaylistEntryProfile(Serializable):
 		}
 
 
+PlaylistEntryProfile.EMPTY = PlaylistEntryProfile()
+
+
 """
 Playlist
 """
@@ -286,9 +430,11 @@ class Playlist(Serializable):
 		self._filters = []
 		self._output = PlaylistOutput()
 		self._profile = PlaylistProfile()
+		self._profile_compiler = None
 		self._shuffle = False
 		self._loop = False
 		self._loop_shuffle = False
+		self._separation = {}
 
 	def name(self) -> str:
 		return self._name
@@ -317,7 +463,44 @@ class Playlist(Serializable):
 		return len(self.entries())
 
 	def shuffle(self):
-		random.shuffle(self._entries)
+		"""
+		Reorder the entries by weight, keeping entries that share a separated member apart,
+		the current tail is taken as just played so repeats are kept apart across loops too
+		"""
+
+		self._entries = list(self.rotation())
+
+	def rotation(self, seed: int = None, history: list = None):
+		"""
+		The entries in the order shuffle() would put them, yielded as they are picked so
+		playout never waits for a large playlist to be ordered. The same seed and history
+		give the same order
+
+		:param seed: int|None
+		:param history: list of PlaylistEntry played last, the current tail by default
+		:return: generator of PlaylistEntry
+		"""
+
+		rotation = Rotation(self._separation, random.Random(seed) if seed is not None else None)
+
+		if history is None:
+			history = self._entries[-rotation.window():] if rotation.window() > 0 else []
+
+		return rotation.order(self._entries, history)
+
+	def separation(self) -> dict:
+		return self._separation
+
+	def set_separation(self, separation: dict) -> 'Playlist':
+		if not isinstance(separation, dict):
+			raise PlaylistError('Expected a dict for separation')
+
+		for key in separation:
+			if key not in Rotation.KEYS:
+				raise PlaylistError('Unknown separation key %s' % key)
+
+		self._separation = separation
+		return self
 
 	def filters(self) -> list:
 		return self._filters
@@ -331,6 +514,24 @@ class Playlist(Serializable):
 	def has_filters(self) -> bool:
 		return len(self._filters) > 0
 
+	def decoder_filters(self) -> list:
+		"""
+		Filters applied to every entry's decoder graph
+
+		:return: list of PlaylistFilterEntry
+		"""
+
+		return [f for f in self._filters if not f.is_encoder()]
+
+	def encoder_filters(self) -> list:
+		"""
+		Filters applied once in the encoder graph, for the life of the channel
+
+		:return: list of PlaylistFilterEntry
+		"""
+
+		return [f for f in self._filters if f.is_encoder()]
+
 	def output(self) -> PlaylistOutput:
 		return self._output
 
@@ -349,6 +550,24 @@ class Playlist(Serializable):
 		self._profile = profile
 		return self
 
+	def profile_compiler(self) -> ProfileCompiler:
+		"""
+		Resolves the encoder and decoder arguments, with the default profiles below this
+		playlist's and its entries'
+
+		:return: ProfileCompiler
+		"""
+
+		if self._profile_compiler is None:
+			self._profile_compiler = ProfileCompiler()
+		return self._profile_compiler
+
+	def set_profile_compiler(self, compiler: ProfileCompiler) -> 'Playlist':
+		if not isinstance(compiler, ProfileCompiler):
+			raise PlaylistError('Expected instance of ProfileCompiler')
+		self._profile_compiler = compiler
+		return self
+
 	def should_shuffle(self) -> bool:
 		return self._shuffle
 
@@ -370,7 +589,12 @@ class Playlist(Serializable):
 		self._loop_shuffle = loop_shuffle if isinstance(loop_shuffle, bool) else False
 		return self
 
-	def serialize(self) -> dict:
+	def serialize(self, entries: bool = True) -> dict:
+		"""
+		:param entries: bool False leaves out the entries member
+		:return: dict
+		"""
+
 		result = {
 			'name': self.name(),
 			'shuffle': self.should_shuffle(),
@@ -385,6 +609,13 @@ class Playlist(Serializable):
 		for f in self.filters():
 			result['filters'].append(f.serialize())
 
+		if len(self.separation()):
+			result['separation'] = self.separation()
+
+		if not entries:
+			del result['entries']
+			return result
+
 		for e in self.entries():
 			result['entries'].append(e.serialize())
 
@@ -452,11 +683,21 @@ class PlaylistQueue:
 
 		self._current = None
 
-		if len(self._queue):
-			self._current = self._queue.popleft()
-		elif len(self._complete_queue) > 0 and self._playlist.should_loop():
-			self.reload_complete()
-			self._current = self._queue.popleft()
+		# quarantined entries are passed over but kept, so they play again once cleared
+		for i in range(self.total()):
+			if len(self._queue):
+				entry = self._queue.popleft()
+			elif len(self._complete_queue) > 0 and self._playlist.should_loop():
+				self.reload_complete()
+				entry = self._queue.popleft()
+			else:
+				break
+
+			if not entry.is_quarantined():
+				self._current = entry
+				break
+
+			self.push_back_complete(entry)
 
 		return self._current
 
@@ -472,7 +713,10 @@ class PlaylistQueue:
 	def reload_complete(self):
 		if len(self._complete_queue):
 			if self._playlist.should_loop() and self._playlist.should_loop_shuffle():
-				random.shuffle(self._complete_queue)
+				# the complete queue is most recent first, the recently played are kept apart from the start
+				rotation = Rotation(self._playlist.separation())
+				history = reversed(list(self._complete_queue)[:rotation.window()])
+				self._complete_queue = deque(reversed(list(rotation.order(self._complete_queue, history))))
 			e = self._complete_queue.popleft()
 			while e is not None:
 				self.push_back(e)
@@ -0,0 +1,89 @@
+import copy
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from .playlist import Playlist, PlaylistEntry
+from .affinity import CpuScheduler
+
+
+"""
+FilterPreloader - Prepares filter assets for upcoming entries on a worker pool
+
+Every global and entry filter of an upcoming entry is preloaded in the background, the
+result is kept by the filter so building the entry's decoder graph only picks it up.
+Failures are not kept, apply runs preload again and reports the error itself.
+"""
+
+
+class FilterPreloader:
+	DEFAULT_JOBS = 1
+
+	def __init__(self, jobs: int = None, nice: int = 0):
+		self._jobs = jobs if isinstance(jobs, int) and jobs > 0 else FilterPreloader.DEFAULT_JOBS
+		self._nice = nice if isinstance(nice, int) and nice > 0 else 0
+		self._executor = None
+		self._pending = {}
+		self._lock = Lock()
+
+	def jobs(self) -> int:
+		return self._jobs
+
+	def nice(self) -> int:
+		return self._nice
+
+	def _executor_instance(self) -> ThreadPoolExecutor:
+		if self._executor is None:
+			# workers run at a lower priority than playout, as do the processes they start
+			self._executor = ThreadPoolExecutor(max_workers=self._jobs, thread_name_prefix='preload', initializer=CpuScheduler.lower_priority, initargs=(self._nice,))
+		return self._executor
+
+	def _run(self, key: tuple, playlist: Playlist, entry: PlaylistEntry, filters: list):
+		try:
+			for handler, options in filters:
+				try:
+					handler.prepared(playlist, entry, options)
+				except Exception:
+					pass
+		finally:
+			with self._lock:
+				self._pending.pop(key, None)
+
+	def prefetch(self, playlist: Playlist, entry: PlaylistEntry):
+		"""
+		Queue preloading the entry's filters, already prepared or queued entries are ignored
+
+		:param playlist: Playlist
+		:param entry: PlaylistEntry
+		:return: Future, None if nothing was queued
+		"""
+
+		if entry.is_quarantined():
+			return None
+
+		filters = playlist.decoder_filters() + (entry.filters() if entry.has_filters() else [])
+
+		# the graph hands filters a copy of their options, the same copy is preloaded
+		filters = [(f.handler(), copy.deepcopy(f.options())) for f in filters]
+		filters = [(handler, options) for handler, options in filters if not handler.is_prepared(entry, options)]
+
+		if not len(filters):
+			return None
+
+		key = id(entry)
+
+		with self._lock:
+			if key in self._pending:
+				return None
+			self._pending[key] = entry
+
+		return self._executor_instance().submit(self._run, key, playlist, entry, filters)
+
+	def shutdown(self):
+		if self._executor is not None:
+			self._executor.shutdown(wait=True, cancel_futures=True)
+			self._executor = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.shutdown()
@@ -0,0 +1,214 @@
+import os
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, BoundedSemaphore
+from .util import MediaInfo, LazyMediaInfo, MediaInfoError
+from .affinity import CpuScheduler
+
+
+"""
+ProbePool - Probes media files across a bounded pool of threads
+
+ffprobe runs as a subprocess so threads are enough to fan out the work. Results
+are always handed back in submission order, regardless of which probe finishes
+first, so loaders built on top of the pool stay deterministic.
+"""
+
+
+class ProbePool:
+	DEFAULT_JOBS = 1
+	# sources map() remembers to share the result of, least recently listed are forgotten first
+	INTERN_SIZE = 4096
+
+	def __init__(self, jobs: int = None, mount_jobs: int = None, deep: bool = False, nice: int = 0):
+		self._jobs = jobs if isinstance(jobs, int) and jobs > 0 else ProbePool.DEFAULT_JOBS
+		self._nice = nice if isinstance(nice, int) and nice > 0 else 0
+		self._mount_jobs = mount_jobs if isinstance(mount_jobs, int) and mount_jobs > 0 else None
+		self._deep = deep is True
+		self._mount_points = {}
+		self._mount_semaphores = {}
+		self._lock = Lock()
+		self._executor = None
+		self._pending = {}
+
+	def jobs(self) -> int:
+		return self._jobs
+
+	def nice(self) -> int:
+		return self._nice
+
+	def mount_jobs(self) -> (int, None):
+		return self._mount_jobs
+
+	def is_deep(self) -> bool:
+		return self._deep
+
+	def is_parallel(self) -> bool:
+		return self._jobs > 1
+
+	def mount_point(self, file_path: str) -> str:
+		"""
+		Resolve the mount point a file lives on, caching the result per directory
+
+		:param file_path: str
+		:return: str
+		"""
+
+		directory = os.path.dirname(os.path.abspath(file_path))
+
+		with self._lock:
+			if directory in self._mount_points:
+				return self._mount_points[directory]
+
+		path = directory
+		while not os.path.ismount(path):
+			parent = os.path.dirname(path)
+			if parent == path:
+				break
+			path = parent
+
+		with self._lock:
+			self._mount_points[directory] = path
+
+		return path
+
+	def _mount_semaphore(self, file_path: str) -> (BoundedSemaphore, None):
+		if self._mount_jobs is None:
+			return None
+
+		mount = self.mount_point(file_path)
+
+		with self._lock:
+			if mount not in self._mount_semaphores:
+				self._mount_semaphores[mount] = BoundedSemaphore(self._mount_jobs)
+			return self._mount_semaphores[mount]
+
+	def probe(self, file_path: str) -> MediaInfo:
+		"""
+		Probe a single file, honoring the per mount concurrency limit
+
+		:param file_path: str
+		:return: MediaInfo
+		:raises MediaInfoError:
+		"""
+
+		semaphore = self._mount_semaphore(file_path)
+
+		if semaphore is None:
+			return MediaInfo(file_path, deep=self._deep)
+
+		with semaphore:
+			return MediaInfo(file_path, deep=self._deep)
+
+	def _try_probe(self, file_path: str) -> (MediaInfo, MediaInfoError):
+		try:
+			return self.probe(file_path)
+		except MediaInfoError as e:
+			return e
+
+	def _try_resolve(self, media_info: LazyMediaInfo) -> (LazyMediaInfo, MediaInfoError):
+		semaphore = self._mount_semaphore(media_info.source())
+
+		try:
+			if semaphore is None:
+				return media_info.resolve()
+			with semaphore:
+				return media_info.resolve()
+		except MediaInfoError as e:
+			return e
+		finally:
+			with self._lock:
+				self._pending.pop(id(media_info), None)
+
+	def _executor_instance(self) -> ThreadPoolExecutor:
+		if self._executor is None:
+			# workers run at a lower priority than playout, as do the processes they start
+			self._executor = ThreadPoolExecutor(max_workers=self._jobs, thread_name_prefix='ffprobe', initializer=CpuScheduler.lower_priority, initargs=(self._nice,))
+		return self._executor
+
+	def submit(self, file_path: str):
+		"""
+		Queue a probe on the pool
+
+		:param file_path: str
+		:return: Future resolving to MediaInfo or MediaInfoError
+		"""
+
+		return self._executor_instance().submit(self._try_probe, file_path)
+
+	def prefetch(self, media_info: MediaInfo):
+		"""
+		Resolve a LazyMediaInfo in the background before playout reads it. Already probed
+		or already queued media is ignored.
+
+		:param media_info: MediaInfo
+		:return: Future resolving to LazyMediaInfo or MediaInfoError, None if nothing was queued
+		"""
+
+		if not isinstance(media_info, LazyMediaInfo) or media_info.was_probed():
+			return None
+
+		with self._lock:
+			if id(media_info) in self._pending:
+				return None
+			self._pending[id(media_info)] = media_info
+
+		return self._executor_instance().submit(self._try_resolve, media_info)
+
+	def map(self, sources):
+		"""
+		Probe every source, yielding (source, result) pairs in the order given. The result
+		is either a MediaInfo or the MediaInfoError raised while probing. A source listed
+		again within the last INTERN_SIZE sources is probed once and shares the same
+		MediaInfo. At most a couple of probes per worker are in flight and only the recent
+		sources are remembered, so huge lists are never fully buffered.
+
+		:param sources: iterable of str
+		:return: generator of (str, MediaInfo|MediaInfoError)
+		"""
+
+		probed = OrderedDict()
+
+		if not self.is_parallel():
+			for source in sources:
+				yield source, self._intern(probed, source, self._try_probe)
+			return
+
+		window = deque()
+		sources = iter(sources)
+
+		try:
+			for source in sources:
+				window.append((source, self._intern(probed, source, self.submit)))
+				if len(window) >= self._jobs * 2:
+					source, future = window.popleft()
+					yield source, future.result()
+
+			while len(window):
+				source, future = window.popleft()
+				yield source, future.result()
+		finally:
+			for source, future in window:
+				future.cancel()
+
+	def _intern(self, probed: OrderedDict, source: str, probe):
+		if source in probed:
+			probed.move_to_end(source)
+			return probed[source]
+
+		probed[source] = probe(source)
+
+		if len(probed) > self.INTERN_SIZE:
+			probed.popitem(last=False)
+		return probed[source]
+
+	def shutdown(self):
+		if self._executor is not None:
+			self._executor.shutdown(wait=True, cancel_futures=True)
+			self._executor = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.shutdown()
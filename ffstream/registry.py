@@ -0,0 +1,151 @@
+import importlib
+from threading import RLock
+
+
+"""
+FilterManager - Filters by name, imported the first time a playlist uses them
+
+Filters are either added as instances or registered as a "module:Class" reference,
+referenced filters are imported and instantiated on first use. Third party packages
+provide filters through the ffstream.filters entry point group, looked up once a
+name is not otherwise known.
+"""
+
+
+class FilterManager:
+	ENTRY_POINT_GROUP = 'ffstream.filters'
+
+	def __init__(self, discover: bool = True):
+		self._filters = {}
+		self._references = {}
+		self._discover = discover is True
+		self._discovered = False
+		self._lock = RLock()
+
+	def filters(self) -> list:
+		"""
+		Every filter, importing those not used yet
+
+		:return: list of Filter
+		:raises FilterManagerError:
+		"""
+
+		return [self.get(name) for name in self.names()]
+
+	def names(self) -> list:
+		with self._lock:
+			self._discover_entry_points()
+			return sorted(set(self._filters) | set(self._references))
+
+	def add(self, f: 'Filter') -> 'FilterManager':
+		from .filter import Filter
+
+		if isinstance(f, Filter):
+			with self._lock:
+				self._filters[f.name()] = f
+				self._references.pop(f.name(), None)
+		return self
+
+	def register(self, name: str, reference) -> 'FilterManager':
+		"""
+		Register a filter to import on first use
+
+		:param name: str the name playlists use, has to match the filter's name()
+		:param reference: str "module:Class" or an entry point
+		:return: FilterManager
+		"""
+
+		with self._lock:
+			if name not in self._filters:
+				self._references[name] = reference
+		return self
+
+	def has(self, name: str) -> bool:
+		with self._lock:
+			if name in self._filters or name in self._references:
+				return True
+			self._discover_entry_points()
+			return name in self._references
+
+	def get(self, name: str) -> ('Filter', None):
+		"""
+		:param name: str
+		:return: Filter|None when no filter has the name
+		:raises FilterManagerError: when the filter can not be imported
+		"""
+
+		f = self._filters.get(name)
+
+		if f is not None:
+			return f
+
+		with self._lock:
+			if name in self._filters:
+				return self._filters[name]
+
+			if name not in self._references:
+				self._discover_entry_points()
+				if name not in self._references:
+					return None
+
+			f = self._load(name, self._references[name])
+			self._filters[name] = f
+			del self._references[name]
+
+		return f
+
+	def _load(self, name: str, reference) -> 'Filter':
+		from .filter import Filter
+
+		try:
+			if isinstance(reference, str):
+				module, _, attribute = reference.partition(':')
+				cls = getattr(importlib.import_module(module), attribute)
+			else:
+				cls = reference.load()
+			f = cls()
+		except Exception as e:
+			raise FilterManagerError('Unable to load filter %s - %s' % (name, e), e)
+
+		if not isinstance(f, Filter):
+			raise FilterManagerError('Filter %s does not extend Filter' % name)
+		if f.name() != name:
+			raise FilterManagerError('Filter %s is registered as %s' % (f.name(), name))
+
+		return f
+
+	def _discover_entry_points(self):
+		if not self._discover or self._discovered:
+			return
+
+		self._discovered = True
+
+		from importlib.metadata import entry_points
+
+		try:
+			found = entry_points(group=FilterManager.ENTRY_POINT_GROUP)
+		except TypeError:
+			# before python 3.10 entry_points() takes no group and returns every group in a dict
+			found = entry_points().get(FilterManager.ENTRY_POINT_GROUP, [])
+
+		for entry_point in found:
+			# filters of the application itself win over plugins of the same name
+			if entry_point.name not in self._filters and entry_point.name not in self._references:
+				self._references[entry_point.name] = entry_point
+
+
+"""
+FilterManagerError
+"""
+
+
+class FilterManagerError(Exception):
+	def __init__(self, message: str = '', other: Exception = None):
+		self._message = message
+		self._other = other
+
+	def message(self) -> str:
+		return self._message
+
+	def other(self) -> Exception:
+		return self._other
@@ -0,0 +1,191 @@
+import random
+from array import array
+from collections import deque
+
+
+"""
+AliasTable - Weighted random selection in constant time (Vose's alias method)
+"""
+
+
+class AliasTable:
+	__slots__ = ('_probability', '_alias', '_size')
+
+	def __init__(self, weights):
+		weights = list(weights)
+		total = float(sum(weights))
+		size = len(weights)
+
+		if not size or total <= 0:
+			raise ValueError('Expected at least one positive weight')
+
+		factor = size / total
+		scaled = [w * factor for w in weights]
+		probability = [1.0] * size
+		alias = list(range(size))
+		small = [i for i in alias if scaled[i] < 1.0]
+		large = [i for i in alias if scaled[i] >= 1.0]
+		pop_small = small.pop
+		pop_large = large.pop
+
+		while small and large:
+			s = pop_small()
+			l = pop_large()
+			probability[s] = scaled[s]
+			alias[s] = l
+			scaled[l] += scaled[s] - 1.0
+			(small if scaled[l] < 1.0 else large).append(l)
+
+		# whatever is left stays at 1.0, give or take rounding
+		self._probability = array('d', probability)
+		self._alias = array('l', alias)
+		self._size = size
+
+	def __len__(self) -> int:
+		return self._size
+
+	def pick(self, rng: random.Random = None) -> int:
+		rng = rng if rng is not None else random
+		i = int(rng.random() * self._size)
+		return i if rng.random() < self._probability[i] else self._alias[i]
+
+
+"""
+Rotation - Orders playlist entries by weight while keeping repeats apart
+
+Separation maps an entry member (source, author or title) to a window, an entry is not
+picked while another with the same value is among that many previously picked entries.
+Picks are drawn from an alias table over the unpicked entries, the table is rebuilt
+from its own unpicked entries once most of its weight has been picked, so each pick
+stays constant time on average. Entries are yielded as they are picked, a consumer only
+pays for the entries it takes.
+When no candidate within MAX_ATTEMPTS satisfies every window the table is rebuilt and
+drawn from again, only when a fresh table fails too is the first unpicked entry it drew
+taken, separation is best effort and never stalls playout.
+"""
+
+
+class Rotation:
+	KEYS = {
+		'source': lambda e: e.source(),
+		'author': lambda e: e.author(),
+		'title': lambda e: e.title()
+	}
+
+	MAX_ATTEMPTS = 32
+
+	# share of a table's weight picked before it is rebuilt from the unpicked entries
+	REBUILD_AT = 0.75
+
+	def __init__(self, separation: dict = None, rng: random.Random = None):
+		separation = separation if isinstance(separation, dict) else {}
+
+		for key in separation:
+			if key not in Rotation.KEYS:
+				raise ValueError('Unknown separation key %s' % key)
+
+		self._separation = dict((k, int(w)) for k, w in separation.items() if int(w) > 0)
+		self._rng = rng if rng is not None else random.Random()
+
+	def separation(self) -> dict:
+		return self._separation
+
+	def window(self) -> int:
+		return max(self._separation.values()) if len(self._separation) else 0
+
+	def order(self, entries, history=()):
+		"""
+		Yield every entry once, in weighted random order
+
+		:param entries: list of PlaylistEntry
+		:param history: iterable of PlaylistEntry played before, oldest first
+		:return: generator of PlaylistEntry
+		"""
+
+		entries = list(entries)
+		recent = dict((key, (deque(), {})) for key in self._separation)
+
+		for entry in history:
+			self._remember(recent, entry)
+
+		# weightless entries are played last, in plain random order
+		unweighted = []
+		weighted = []
+		weights = []
+
+		for entry in entries:
+			weight = entry.weight()
+			if weight > 0:
+				weighted.append(entry)
+				weights.append(weight)
+			else:
+				unweighted.append(entry)
+
+		picked = bytearray(len(weighted))
+		remaining = len(weighted)
+		indices = range(len(weighted))
+		table = None
+		fresh = False
+		separated = len(recent) > 0
+
+		while remaining:
+			if table is None or table_picked > table_weight * Rotation.REBUILD_AT:
+				# only unpicked entries go in, the share of draws that hit one stays bounded, and
+				# only the last table's entries are scanned, the cost shrinks with the table
+				indices = [i for i in indices if not picked[i]]
+				table = AliasTable([weights[i] for i in indices])
+				table_weight = sum(weights[i] for i in indices)
+				table_picked = 0.00
+				fresh = True
+
+			chosen = None
+			allowed = False
+
+			for attempt in range(Rotation.MAX_ATTEMPTS):
+				i = indices[table.pick(self._rng)]
+				if picked[i]:
+					continue
+				if chosen is None:
+					chosen = i
+				if not separated or self._allowed(recent, weighted[i]):
+					chosen = i
+					allowed = True
+					break
+
+			if chosen is None or (not allowed and not fresh):
+				# the draws were spent on picked entries, a table of only unpicked ones finds an
+				# allowed entry if there is one to find, before separation gives way
+				table = None
+				continue
+
+			picked[chosen] = 1
+			remaining -= 1
+			table_picked += weights[chosen]
+			fresh = False
+
+			if separated:
+				self._remember(recent, weighted[chosen])
+
+			yield weighted[chosen]
+
+		self._rng.shuffle(unweighted)
+
+		for entry in unweighted:
+			yield entry
+
+	def _allowed(self, recent: dict, entry) -> bool:
+		for key, (window, counts) in recent.items():
+			value = Rotation.KEYS[key](entry)
+			if value not in (None, '') and counts.get(value, 0) > 0:
+				return False
+		return True
+
+	def _remember(self, recent: dict, entry):
+		for key, (window, counts) in recent.items():
+			value = Rotation.KEYS[key](entry)
+			window.append(value)
+			counts[value] = counts.get(value, 0) + 1
+
+			if len(window) > self._separation[key]:
+				value = window.popleft()
+				counts[value] -= 1
@@ -0,0 +1,305 @@
+import os
+import time
+import shutil
+from collections import OrderedDict
+from threading import Thread, Event, Lock
+from .playlist import PlaylistSegments
+from .ffmpeg import ArgumentContainer, CompiledProfile
+
+
+"""
+SegmentedOutput - Encoder settings for hls or dash output to the filesystem
+
+ffmpeg's muxers cut the segments, keep the rolling window and delete what falls out of
+it. Segments are cut at keyframes, so their length is rounded to a whole number of the
+encoder's GOPs, or keyframes are forced at segment boundaries when the GOP is unknown.
+The hls playlist is written to a temporary file and renamed, as is the dash manifest.
+"""
+
+
+class SegmentedOutput:
+	# segments past the window kept a little longer, players may still be fetching them
+	EXTRA_WINDOW = 1
+
+	def __init__(self, segments: PlaylistSegments, destination: str):
+		self._segments = segments
+		self._destination = destination
+
+	def segments(self) -> PlaylistSegments:
+		return self._segments
+
+	def destination(self) -> str:
+		return self._destination
+
+	def manifest(self) -> str:
+		"""
+		Path ffmpeg writes the playlist or manifest to, inside staging when there is one
+
+		:return: str
+		"""
+
+		if self._segments.staging() is None:
+			return self._destination
+		return os.path.join(self._segments.staging(), os.path.basename(self._destination))
+
+	@staticmethod
+	def rate(value) -> (float, None):
+		"""
+		:param value: str|int|float a frame rate like 25 or 30000/1001
+		:return: float|None
+		"""
+
+		try:
+			numerator, _, denominator = str(value).partition('/')
+			rate = float(numerator) / float(denominator or 1)
+		except (ValueError, ZeroDivisionError):
+			return None
+		return rate if rate > 0 else None
+
+	@staticmethod
+	def gop_frames(encoder_args: CompiledProfile) -> (int, None):
+		"""
+		Frames per GOP the encoder profile sets, with g or keyint in x264/x265 params
+
+		:param encoder_args: CompiledProfile
+		:return: int|None
+		"""
+
+		args = encoder_args.output_args()
+
+		for key in ('x264-params', 'x265-params'):
+			for param in str(args.get(key) or '').split(':'):
+				name, _, value = param.partition('=')
+				if name == 'keyint' and value.isdigit():
+					return int(value)
+
+		value = str(args.get('g', ''))
+		return int(value) if value.isdigit() and int(value) > 0 else None
+
+	def segment_seconds(self, gop: float = None) -> float:
+		"""
+		:param gop: float|None seconds per GOP
+		:return: float the wanted length rounded to whole GOPs
+		"""
+
+		if gop is None or gop <= 0:
+			return self._segments.seconds()
+		return max(1, round(self._segments.seconds() / gop)) * gop
+
+	def layer(self, encoder_args: CompiledProfile, rate: float = None) -> ArgumentContainer:
+		"""
+		Profile layer turning the encoder's output into segments
+
+		:param encoder_args: CompiledProfile the encoder profile without this layer
+		:param rate: float|None frame rate the encoder is fed, if its profile does not set one
+		:return: ArgumentContainer
+		"""
+
+		rate = SegmentedOutput.rate(encoder_args.output_args().get('r', rate))
+		frames = SegmentedOutput.gop_frames(encoder_args)
+		gop = frames / rate if frames is not None and rate is not None else None
+		seconds = self.segment_seconds(gop)
+		directory = os.path.dirname(self.manifest())
+		stem = os.path.splitext(os.path.basename(self._destination))[0]
+		output = OrderedDict()
+
+		if gop is None:
+			output['force_key_frames'] = 'expr:gte(t,n_forced*%g)' % seconds
+
+		if self._segments.format() == 'hls':
+			# every segment carries its own codec headers, a global header would leave them out
+			output['flags'] = False
+			output['f'] = 'hls'
+			output['hls_time'] = '%g' % seconds
+			output['hls_list_size'] = str(self._segments.window())
+			output['hls_delete_threshold'] = str(SegmentedOutput.EXTRA_WINDOW)
+			output['hls_flags'] = 'delete_segments+temp_file+independent_segments'
+			output['hls_segment_filename'] = os.path.join(directory, stem + '_%06d.ts')
+		else:
+			output['f'] = 'dash'
+			output['seg_duration'] = '%g' % seconds
+			output['window_size'] = str(self._segments.window())
+			output['extra_window_size'] = str(SegmentedOutput.EXTRA_WINDOW)
+			output['use_template'] = '1'
+			output['use_timeline'] = '1'
+			output['init_seg_name'] = stem + '_init_$RepresentationID$.m4s'
+			output['media_seg_name'] = stem + '_$RepresentationID$_$Number%06d$.m4s'
+
+		return ArgumentContainer({'global': [], 'input': OrderedDict(), 'output': output})
+
+	def prepare(self):
+		"""
+		Create the destination directory and staging
+
+		:raises OSError:
+		"""
+
+		os.makedirs(os.path.dirname(os.path.abspath(self._destination)), exist_ok=True)
+
+		if self._segments.staging() is not None:
+			os.makedirs(self._segments.staging(), exist_ok=True)
+
+
+"""
+SegmentPublisher - Flushes staged segments to the destination and measures every segment
+
+A segment is complete once the playlist or manifest is written after it. With staging,
+complete segments are copied to the destination and renamed into place, then the
+manifest, so it never lists a segment that is not there yet, and segments ffmpeg
+deleted from staging are deleted from the destination. Without staging ffmpeg writes to
+the destination itself and segments are only measured.
+
+Latency is the time from a segment being complete to being listed at the destination.
+"""
+
+
+class SegmentPublisher(Thread):
+	INTERVAL = 0.25
+
+	def __init__(self, output: SegmentedOutput, interval: float = None):
+		super().__init__(name='segments', daemon=True)
+		self._output = output
+		self._interval = interval if interval is not None else SegmentPublisher.INTERVAL
+		self._source = os.path.dirname(os.path.abspath(output.manifest()))
+		self._target = os.path.dirname(os.path.abspath(output.destination()))
+		self._manifest = os.path.basename(output.manifest())
+		self._prefix = os.path.splitext(self._manifest)[0] + '_'
+		self._staged = output.segments().staging() is not None
+		self._known = {}
+		self._manifest_mtime = None
+		self._stop = Event()
+		self._lock = Lock()
+		self._stats = {
+			'segments': 0,
+			'bytes': 0,
+			'deleted': 0,
+			'errors': 0,
+			'last_size': None,
+			'last_latency': None,
+			'max_latency': None,
+			'mean_latency': None
+		}
+
+	def run(self):
+		while not self._stop.wait(self._interval):
+			self.publish()
+
+		# what was finished before stopping still goes out
+		self.publish()
+
+	def stop(self, timeout: float = None):
+		self._stop.set()
+		if self.is_alive():
+			self.join(timeout)
+
+	def publish(self) -> int:
+		"""
+		Publish what ffmpeg finished since the last call
+
+		:return: int segments published
+		"""
+
+		try:
+			manifest_mtime = os.stat(os.path.join(self._source, self._manifest)).st_mtime
+		except OSError:
+			return 0
+
+		if manifest_mtime == self._manifest_mtime:
+			return 0
+
+		try:
+			# the directory may be shared, only this output's segments are named after its manifest
+			names = [n for n in os.listdir(self._source) if n.startswith(self._prefix) and not n.endswith('.tmp')]
+		except OSError:
+			return 0
+
+		published = 0
+
+		for name in names:
+			path = os.path.join(self._source, name)
+
+			try:
+				stat = os.stat(path)
+			except OSError:
+				continue
+
+			# written after the manifest, the segment ffmpeg is still writing
+			if stat.st_mtime > manifest_mtime or self._known.get(name) == (stat.st_size, stat.st_mtime):
+				continue
+
+			try:
+				if self._staged:
+					self._copy(path, os.path.join(self._target, name))
+					latency = time.time() - stat.st_mtime
+				else:
+					latency = manifest_mtime - stat.st_mtime
+			except OSError:
+				self._count('errors')
+				continue
+
+			self._known[name] = (stat.st_size, stat.st_mtime)
+			self._record(stat.st_size, max(0.00, latency))
+			published += 1
+
+		if self._staged:
+			try:
+				self._copy(os.path.join(self._source, self._manifest), os.path.join(self._target, self._manifest))
+			except OSError:
+				self._count('errors')
+				return published
+
+		self._expire(set(names))
+		self._manifest_mtime = manifest_mtime
+		return published
+
+	def _expire(self, names: set):
+		# ffmpeg keeps the window, what it deleted from staging goes at the destination too
+		for name in [n for n in self._known if n not in names]:
+			if self._staged:
+				try:
+					os.remove(os.path.join(self._target, name))
+				except FileNotFoundError:
+					pass
+				except OSError:
+					self._count('errors')
+					continue
+
+			self._count('deleted')
+			del self._known[name]
+
+	@staticmethod
+	def _copy(source: str, target: str):
+		tmp = target + '.tmp'
+
+		try:
+			shutil.copyfile(source, tmp)
+			os.replace(tmp, target)
+		finally:
+			if os.path.exists(tmp):
+				os.remove(tmp)
+
+	def _count(self, key: str):
+		with self._lock:
+			self._stats[key] += 1
+
+	def _record(self, size: int, latency: float):
+		with self._lock:
+			stats = self._stats
+			stats['segments'] += 1
+			stats['bytes'] += size
+			stats['last_size'] = size
+			stats['last_latency'] = latency
+			stats['max_latency'] = max(latency, stats['max_latency'] or 0.00)
+			stats['mean_latency'] = ((stats['mean_latency'] or 0.00) * (stats['segments'] - 1) + latency) / stats['segments']
+
+	def stats(self) -> dict:
+		"""
+		:return: dict with segments, bytes, deleted and errors counted, the last segment's
+		         size in bytes, and the last, max and mean latency in seconds
+		"""
+
+		with self._lock:
+			result = dict(self._stats)
+
+		result['mean_size'] = result['bytes'] / result['segments'] if result['segments'] else None
+		return result
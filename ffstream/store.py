@@ -0,0 +1,344 @@
+import json
+import time
+import random
+import sqlite3
+import threading
+from collections import OrderedDict
+from .playlist import Playlist, PlaylistEntry
+
+
+"""
+PlaylistStore - SQLite backed media library and query defined playlists
+
+Media rows keep the playlist entry members next to the probe result, so entries are
+rebuilt without probing. Playlists are stored as a header plus a query, the query is
+only evaluated when the playlist is loaded.
+"""
+
+
+class PlaylistStore:
+	VERSION = 1
+	MAGIC = b'SQLite format 3\0'
+
+	SCHEMA = (
+		'CREATE TABLE IF NOT EXISTS media ('
+		'id INTEGER PRIMARY KEY, '
+		'source TEXT NOT NULL UNIQUE, '
+		'title TEXT NOT NULL DEFAULT \'\', '
+		'author TEXT NOT NULL DEFAULT \'\', '
+		'duration REAL NOT NULL DEFAULT 0, '
+		'start_time REAL, '
+		'end_time REAL, '
+		'filters TEXT, '
+		'profile TEXT, '
+		'probe TEXT, '
+		'last_aired INTEGER)',
+		'CREATE INDEX IF NOT EXISTS media_author ON media (author, duration)',
+		'CREATE INDEX IF NOT EXISTS media_title ON media (title)',
+		'CREATE INDEX IF NOT EXISTS media_duration ON media (duration)',
+		'CREATE INDEX IF NOT EXISTS media_last_aired ON media (last_aired)',
+		'CREATE TABLE IF NOT EXISTS media_tags ('
+		'tag TEXT NOT NULL, '
+		'media_id INTEGER NOT NULL REFERENCES media (id) ON DELETE CASCADE, '
+		'PRIMARY KEY (tag, media_id)) WITHOUT ROWID',
+		'CREATE INDEX IF NOT EXISTS media_tags_media ON media_tags (media_id)',
+		'CREATE TABLE IF NOT EXISTS playlists ('
+		'name TEXT PRIMARY KEY, '
+		'header TEXT NOT NULL, '
+		'query TEXT NOT NULL)'
+	)
+
+	ORDERS = {
+		'source': 'source',
+		'title': 'title',
+		'author': 'author, title',
+		'duration': 'duration',
+		'aired': 'last_aired',
+		'random': None
+	}
+
+	QUERY_KEYS = ('author', 'title', 'tags', 'any_tags', 'min_duration', 'max_duration', 'not_aired_within', 'order', 'limit')
+
+	# rows are turned into entries this many at a time
+	BATCH_SIZE = 256
+
+	def __init__(self, path: str):
+		self._path = path
+		self._lock = threading.RLock()
+
+		try:
+			# the playout feed reads from its own thread, access is serialized by the lock
+			self._db = sqlite3.connect(path, check_same_thread=False)
+			self._db.row_factory = sqlite3.Row
+			self._db.execute('PRAGMA foreign_keys = ON')
+			self._db.execute('PRAGMA journal_mode = WAL')
+
+			with self._db:
+				for statement in PlaylistStore.SCHEMA:
+					self._db.execute(statement)
+				self._db.execute('PRAGMA user_version = %d' % PlaylistStore.VERSION)
+		except sqlite3.Error as e:
+			raise PlaylistStoreError('Unable to open playlist store %s' % path, e)
+
+	@staticmethod
+	def is_store(path: str) -> bool:
+		try:
+			with open(path, 'rb') as fp:
+				return fp.read(len(PlaylistStore.MAGIC)) == PlaylistStore.MAGIC
+		except OSError:
+			return False
+
+	def path(self) -> str:
+		return self._path
+
+	def _execute(self, sql: str, parameters=()) -> list:
+		with self._lock:
+			try:
+				return self._db.execute(sql, parameters).fetchall()
+			except sqlite3.Error as e:
+				raise PlaylistStoreError('Playlist store query failed: %s' % e, e)
+
+	def add_entry(self, entry: PlaylistEntry, tags: list = None, commit: bool = True) -> int:
+		"""
+		Insert or update the media row for an entry, keeping its last aired time
+
+		:param entry: PlaylistEntry
+		:param tags: list of str|None replaces the tags of the media when given
+		:param commit: bool
+		:return: int media id
+		:raises PlaylistStoreError:
+		"""
+
+		info = entry.media_info()
+		filters = [f.serialize() for f in entry.filters()]
+		profile = entry.profile().serialize() if entry.profile().decoder_args().has_args() else None
+
+		with self._lock:
+			try:
+				self._db.execute(
+					'INSERT INTO media (source, title, author, duration, start_time, end_time, filters, profile, probe) '
+					'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+					'ON CONFLICT (source) DO UPDATE SET title = excluded.title, author = excluded.author, '
+					'duration = excluded.duration, start_time = excluded.start_time, end_time = excluded.end_time, '
+					'filters = excluded.filters, profile = excluded.profile, probe = COALESCE(excluded.probe, media.probe)',
+					(
+						entry.source(), entry.title(), entry.author(), entry.duration(), entry.start(), entry.end(),
+						json.dumps(filters) if len(filters) else None,
+						json.dumps(profile) if profile is not None else None,
+						json.dumps(info.serialize()) if info.was_probed() else None
+					)
+				)
+
+				media_id = self._db.execute('SELECT id FROM media WHERE source = ?', (entry.source(),)).fetchone()[0]
+
+				if isinstance(tags, list):
+					self._db.execute('DELETE FROM media_tags WHERE media_id = ?', (media_id,))
+					self._db.executemany('INSERT OR IGNORE INTO media_tags (tag, media_id) VALUES (?, ?)', [(t, media_id) for t in tags])
+
+				if commit:
+					self._db.commit()
+			except sqlite3.Error as e:
+				self._db.rollback()
+				raise PlaylistStoreError('Unable to store %s' % entry.source(), e)
+
+		return media_id
+
+	def add_entries(self, entries, tags: list = None) -> int:
+		"""
+		Store many entries in a single transaction
+
+		:param entries: iterable of PlaylistEntry
+		:param tags: list of str|None
+		:return: int number of entries stored
+		:raises PlaylistStoreError:
+		"""
+
+		count = 0
+
+		with self._lock:
+			for entry in entries:
+				self.add_entry(entry, tags, commit=False)
+				count += 1
+
+			try:
+				self._db.commit()
+			except sqlite3.Error as e:
+				raise PlaylistStoreError('Unable to commit playlist store', e)
+
+		return count
+
+	def set_probe(self, source: str, probe_data: dict):
+		self._execute('UPDATE media SET probe = ? WHERE source = ?', (json.dumps(probe_data), source))
+		self._commit()
+
+	def mark_aired(self, source: str, aired: int = None):
+		self._execute('UPDATE media SET last_aired = ? WHERE source = ?', (int(aired if aired is not None else time.time()), source))
+		self._commit()
+
+	def _commit(self):
+		with self._lock:
+			try:
+				self._db.commit()
+			except sqlite3.Error as e:
+				raise PlaylistStoreError('Unable to commit playlist store', e)
+
+	def tags(self, source: str) -> list:
+		rows = self._execute('SELECT t.tag FROM media_tags t JOIN media m ON m.id = t.media_id WHERE m.source = ? ORDER BY t.tag', (source,))
+		return [r[0] for r in rows]
+
+	def count(self) -> int:
+		return self._execute('SELECT COUNT(*) FROM media')[0][0]
+
+	def save_playlist(self, name: str, playlist: Playlist, query: dict):
+		"""
+		Store a query defined playlist, the playlist's own entries are not kept
+
+		:param name: str
+		:param playlist: Playlist for the header members
+		:param query: dict
+		:raises PlaylistStoreError:
+		"""
+
+		self._where(query)
+
+		header = playlist.serialize(entries=False)
+
+		self._execute('INSERT OR REPLACE INTO playlists (name, header, query) VALUES (?, ?, ?)', (name, json.dumps(header), json.dumps(query)))
+		self._commit()
+
+	def playlists(self) -> list:
+		return [r[0] for r in self._execute('SELECT name FROM playlists ORDER BY name')]
+
+	def playlist(self, name: str) -> (dict, dict):
+		"""
+		Header and query of a stored playlist
+
+		:param name: str
+		:return: (dict, dict)
+		:raises PlaylistStoreError:
+		"""
+
+		rows = self._execute('SELECT header, query FROM playlists WHERE name = ?', (name,))
+
+		if not len(rows):
+			raise PlaylistStoreError('Playlist %s not found in %s' % (name, self._path))
+
+		return json.loads(rows[0]['header'], object_pairs_hook=OrderedDict), json.loads(rows[0]['query'])
+
+	def _where(self, query: dict) -> (str, list):
+		"""
+		Build the where clause for a query
+
+		:param query: dict with any of author, title (substring), tags (all of), any_tags,
+		              min_duration, max_duration, not_aired_within (seconds), order and limit
+		:return: (str, list)
+		:raises PlaylistStoreError:
+		"""
+
+		if not isinstance(query, dict):
+			raise PlaylistStoreError('Expected a dict for the playlist query')
+
+		for key in query:
+			if key not in PlaylistStore.QUERY_KEYS:
+				raise PlaylistStoreError('Unknown query member %s' % key)
+
+		if 'order' in query and query['order'] not in PlaylistStore.ORDERS:
+			raise PlaylistStoreError('Unknown query order %s' % query['order'])
+
+		clauses = []
+		parameters = []
+
+		if 'author' in query:
+			authors = query['author'] if isinstance(query['author'], list) else [query['author']]
+			clauses.append('author IN (%s)' % ', '.join('?' * len(authors)))
+			parameters.extend(authors)
+
+		if 'title' in query:
+			clauses.append('title LIKE ? ESCAPE \'\\\'')
+			parameters.append('%%%s%%' % query['title'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+
+		if 'min_duration' in query:
+			clauses.append('duration >= ?')
+			parameters.append(float(query['min_duration']))
+
+		if 'max_duration' in query:
+			clauses.append('duration <= ?')
+			parameters.append(float(query['max_duration']))
+
+		if 'not_aired_within' in query:
+			clauses.append('(last_aired IS NULL OR last_aired < ?)')
+			parameters.append(int(time.time() - float(query['not_aired_within'])))
+
+		for tag in query.get('tags', []):
+			clauses.append('id IN (SELECT media_id FROM media_tags WHERE tag = ?)')
+			parameters.append(tag)
+
+		if len(query.get('any_tags', [])):
+			clauses.append('id IN (SELECT media_id FROM media_tags WHERE tag IN (%s))' % ', '.join('?' * len(query['any_tags'])))
+			parameters.extend(query['any_tags'])
+
+		return ' AND '.join(clauses) if len(clauses) else '1', parameters
+
+	def select(self, query: dict):
+		"""
+		Evaluate a query, yielding matching media rows in batches as they are consumed
+
+		Only the matching ids are read up front, the rows themselves are fetched a batch
+		at a time so a long playlist is never held in memory before it is played.
+
+		:param query: dict
+		:return: generator of sqlite3.Row
+		:raises PlaylistStoreError:
+		"""
+
+		where, parameters = self._where(query)
+		order = PlaylistStore.ORDERS[query.get('order', 'source')]
+		sql = 'SELECT id FROM media WHERE %s' % where
+
+		if order is not None:
+			sql += ' ORDER BY %s, id' % order
+
+		ids = [r[0] for r in self._execute(sql, parameters)]
+
+		if order is None:
+			random.shuffle(ids)
+
+		if 'limit' in query and isinstance(query['limit'], int):
+			ids = ids[:query['limit']]
+
+		for i in range(0, len(ids), PlaylistStore.BATCH_SIZE):
+			batch = ids[i:i + PlaylistStore.BATCH_SIZE]
+			rows = self._execute('SELECT * FROM media WHERE id IN (%s)' % ', '.join('?' * len(batch)), batch)
+			rows = dict((r['id'], r) for r in rows)
+
+			for media_id in batch:
+				# a row removed since the ids were read is skipped
+				if media_id in rows:
+					yield rows[media_id]
+
+	def close(self):
+		with self._lock:
+			self._db.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.close()
+
+
+"""
+PlaylistStoreError
+"""
+
+
+class PlaylistStoreError(Exception):
+	def __init__(self, message: str = '', other: Exception = None):
+		self._message = message
+		self._other = other
+
+	def message(self) -> str:
+		return self._message
+
+	def other(self) -> Exception:
+		return self._other
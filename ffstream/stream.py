@@ -1,14 +1,25 @@
 import sys
-import ffmpeg
+import json
+import queue
+import random
 import datetime
 import threading
-from subprocess import Popen
-from io import BufferedReader
+from collections import OrderedDict, deque
 from .core import Application, Command, CommandArgumentParser
 from .playlist import  Playlist, PlaylistEntry, PlaylistError, PlaylistFilterEntry
-from .loader import JsonPlaylistLoader
+from .loader import JsonPlaylistLoader, StreamingJsonPlaylistLoader, CompiledPlaylistLoader, StorePlaylistLoader, PlaylistLoaderError
+from .compiled import CompiledPlaylist
+from .store import PlaylistStore, PlaylistStoreError
 from .filter import FilterValidationException
-from .ffmpeg import ArgumentContainer, Profile
+from .ffmpeg import Profile, ProfileCompiler, EncoderProcessThread, DecoderProcessThread
+from .probe import ProbePool
+from .preload import FilterPreloader
+from .util import MediaInfoError
+from .graph import DecoderGraph, EncoderGraph, DecoderGraphError
+from .validate import PlaylistValidator
+from .affinity import CpuScheduler, CpuAssignment
+from .segments import SegmentedOutput, SegmentPublisher
+from .rotation import Rotation
 
 
 """
@@ -17,15 +28,28 @@ StreamPlaylistCommand
 
 
 class StreamPlaylistCommand(Command):
+	FEED_SIZE = 64
+
 	def __init__(self, application: Application, parser: CommandArgumentParser = None):
 		super().__init__(application, parser)
 		self._playlist = None
 		self._encoder = None
 		self._decoder = None
-		self._encoder_error_buffer = []
-		self._encoder_error_thread = None
-		self._decoder_error_buffer = []
-		self._decoder_error_thread = None
+		self._probe_pool = None
+		self._preloader = None
+		self._publisher = None
+		self._feed = None
+		self._feed_stop = None
+		self._feed_thread = None
+		self._rotating = False
+		self._store = None
+		self._compiled = False
+		self._compiled_size = 0
+		self._seed = random.getrandbits(32)
+		self._played = deque(maxlen=0)
+		self._options = None
+		self._scheduler = None
+		self._assignment = None
 
 	def name(self):
 		return "stream:playlist"
@@ -34,281 +58,547 @@ class StreamPlaylistCommand(Command):
 		return "Start streaming from a json playlist"
 
 	def init(self):
-		self.parser().add_argument('-p', '--playlist', help='The playlist to play from', type=str, required=True, default=None)
+		self.parser().add_argument('-p', '--playlist', help='The playlist to play from, json, compiled or a library', type=str, required=True, default=None)
 		self.parser().add_argument('-c', '--check-playlist', help='Just load the playlist, checking for errors', action='store_true', default=False)
+		self.parser().add_argument('--validate', help='With --check-playlist, check trims, filter files and decoder graphs of every entry', action='store_true', default=False)
+		self.parser().add_argument('--dry-run', help='With --check-playlist, also decode a second of every entry into the null muxer', action='store_true', default=False)
+		self.parser().add_argument('--report', help='With --check-playlist, write a json report of the validation to this file', type=str, default=None)
+		self.parser().add_argument('-j', '--jobs', help='Number of files to probe in parallel', type=int, default=1)
+		self.parser().add_argument('--mount-jobs', help='Maximum number of parallel probes per mount point', type=int, default=None)
+		self.parser().add_argument('-l', '--lazy', help='Start playing before every entry is probed, probing ahead of playback', action='store_true', default=False)
+		self.parser().add_argument('--lookahead', help='Number of upcoming entries to probe, when lazy, and prepare filters for ahead of playback', type=int, default=3)
+		self.parser().add_argument('-i', '--index', help='Directory index with verification results, quarantined entries are skipped', default=None)
+		self.parser().add_argument('-n', '--name', help='Stored playlist to play when the playlist is a library', type=str, default=None)
+		self.parser().add_argument('--no-optimize', help='Build decoder graphs as given, without seeking trims, skipping no-op scales or compositing overlays', action='store_true', default=False)
+		self.parser().add_argument('--encoder-restarts', help='Times to restart the encoder when it exits with an error', type=int, default=0)
+		self.parser().add_argument('--cpu-scheduler', help='Pin the encoder and decoder to cores shared out between the channels on this host, sizing their threads to match', action='store_true', default=False)
+		self.parser().add_argument('--cpu-state', help='File the channels on this host share their cores through', type=str, default=None)
+		self.parser().add_argument('--encoder-cores', help='Number of cores to pin the encoder to', type=int, default=CpuScheduler.DEFAULT_ENCODER_CORES)
+		self.parser().add_argument('--decoder-cores', help='Number of cores to pin the decoder to', type=int, default=CpuScheduler.DEFAULT_DECODER_CORES)
+		self.parser().add_argument('--nice-background', help='Niceness to run probing and filter preloading at', type=int, default=0)
+		self.parser().add_argument('-s', '--streaming', help='Start playing while the rest of the playlist file is still being read', action='store_true', default=False)
 		self.set_args(self.parser().parse_args(sys.argv[2:]))
 
-	def encoder(self) -> Popen:
+	def encoder(self) -> EncoderProcessThread:
 		return self._encoder
 
-	def decoder(self) -> Popen:
+	def decoder(self) -> DecoderProcessThread:
 		return self._decoder
 
 	def playlist(self) -> Playlist:
 		return self._playlist
 
 	def run(self):
-		loader = JsonPlaylistLoader(self.application())
+		try:
+			return self._stream()
+		finally:
+			# checking a playlist, or failing to start, returns before playout, the library is closed either way
+			if self._store is not None:
+				self._store.close()
+				self._store = None
+
+	def _stream(self) -> int:
+		validate = self.args().check_playlist and (self.args().validate or self.args().dry_run or self.args().report is not None)
+
+		options = {
+			'verbose': self.args().verbose,
+			'jobs': self.args().jobs,
+			'mount_jobs': self.args().mount_jobs,
+			# validation probes entries itself, so one broken file does not stop the check
+			'lazy': validate or (self.args().lazy and not self.args().check_playlist),
+			'index': self.args().index,
+			'playlist': self.args().name
+		}
+
+		# compiled playlists open in constant time and library queries are read as playout
+		# needs entries, both are always streamed
+		compiled = CompiledPlaylist.is_compiled(self.args().playlist)
+		library = PlaylistStore.is_store(self.args().playlist)
+		first = None
+
+		self._options = options
+		self._compiled = compiled and not self.args().check_playlist
 
 		try:
-			self._playlist = loader.load(self.args().playlist, {
-				'verbose': self.args().verbose
-			})
+			if library:
+				self._store = PlaylistStore(self.args().playlist)
+				options['store'] = self._store
+
+			if (self.args().streaming is True or compiled or library) and not self.args().check_playlist:
+				self._playlist = Playlist(self.args().playlist)
+
+				if compiled:
+					stream = self._compiled_pass(apply=True)
+				else:
+					stream = self._loader(False, library, True).stream(self._playlist, options)
+
+				first = next(stream, None)
+
+				# a shuffled playlist needs every entry before the first one can be picked, a
+				# compiled playlist is shuffled by its rows instead
+				if self._playlist.should_shuffle() and not compiled:
+					for entry in stream:
+						pass
+				else:
+					self._start_feed(stream)
+			else:
+				self._playlist = self._loader(compiled, library, False).load(self.args().playlist, options)
 
-		except PlaylistError as e:
+		except (PlaylistError, PlaylistLoaderError, PlaylistStoreError) as e:
 			self.logger().error(e.message())
 			return Command.COMMAND_ERROR
 
-		entries = self._playlist.entries().copy()
+		shuffle = self.playlist().should_shuffle() is True and not self._compiled
 
-		# TODO: solve this in Playlist/PlaylistLoader or use another type
-		entries.reverse()
+		if shuffle:
+			self.logger().info('Shuffling Playlist')
+
+		if shuffle and not self.args().check_playlist:
+			# the rotation is picked on the feed thread, playout starts with its first pick
+			entries = self._start_rotation(self._seed)
+		elif self._feed is not None:
+			# the feed hands over every entry read after the first, the playlist already holds
+			# some of them, so only what the feed delivers is taken as the play order
+			entries = [first] if first is not None else []
+		else:
+			# a checked playlist is listed in the order it would play
+			if shuffle:
+				self.playlist().shuffle()
+
+			entries = self._playlist.entries().copy()
+
+			# TODO: solve this in Playlist/PlaylistLoader or use another type
+			entries.reverse()
 
 		if not len(entries):
 			self.logger().error('Nothing in playlist')
 			return Command.COMMAND_ERROR
 
-		self.logger().info('Loaded Playlist: %s [%d Entries]' % (self._playlist.path(), self._playlist.entry_count()))
-
-		if self.playlist().should_shuffle() is True:
-			self.logger().info('Shuffling Playlist')
-			self.playlist().shuffle()
+		self.logger().info('Loaded Playlist: %s [%d Entries]' % (self._playlist.path(), self._compiled_size if self._compiled else self._playlist.entry_count()))
 
 		if self.args().verbose:
 			for i, e in enumerate(entries, 1):
 				self.logger().info('\t%d) %s [%s - %s | %s]' % (i, e.source(), e.start(), e.end(), e.duration()))
 
+		if validate:
+			return self._validate()
+
 		if self.args().check_playlist is True:
 			return Command.COMMAND_SUCCESS
 
-		playlist_profile = self.playlist().profile()
-		encoder_args = Profile.ffplayout_encoder()
-		encoder_args = Profile.ffplayout_encoder()
+		# played entries are the history a reshuffle keeps repeats apart from
+		self._played = deque(maxlen=Rotation(self.playlist().separation()).window())
 
-		if playlist_profile.encoder_args().has_args():
-			encoder_args = playlist_profile.encoder_args()
+		if self.args().cpu_scheduler:
+			self._allocate_cpus()
 
-		resolved_global_args = encoder_args.global_args()
-		resolved_input_args = encoder_args.input_args()
-		resolved_output_args = encoder_args.output_args()
+		if self._assignment is not None:
+			# the thread budget sits right above the defaults, thread counts a profile sets win
+			self.playlist().set_profile_compiler(ProfileCompiler(
+				[Profile.ffplayout_encoder(), CpuAssignment.budget(self._assignment.encoder())],
+				[Profile.ffplayout_decoder(), CpuAssignment.budget(self._assignment.decoder())]
+			))
+
+		segmented = None
+		overrides = None
+
+		if self.playlist().output().is_segmented():
+			segmented = SegmentedOutput(self.playlist().output().segments(), self.playlist().output().destination())
+
+			try:
+				segmented.prepare()
+			except OSError as e:
+				self.logger().error('Unable to create the output directories - %s' % e)
+				self._release_cpus()
+				return Command.COMMAND_ERROR
+
+			# the GOP is counted in frames of what the decoders feed the encoder
+			decoded = self.playlist().profile_compiler().decoder(self.playlist()).output_args()
+			overrides = segmented.layer(EncoderGraph(self.playlist()).encoder_args(), decoded.get('r', decoded.get('framerate')))
+
+		encoder_graph = EncoderGraph(self.playlist(), overrides)
+		encoder_args = encoder_graph.encoder_args()
 
 		if self.args().very_verbose:
-			self.logger().info('Encoder Global Args: {}'.format(resolved_global_args))
-			self.logger().info('Encoder Input Args: {}'.format(resolved_input_args))
-			self.logger().info('Encoder Output Args: {}'.format(resolved_output_args))
-
-		resolved_output_args['metadata:g:0'] = 'service_name=%s' % self.playlist().name()
-		resolved_output_args['metadata:g:1'] = 'service_provider=%s/%s' % (self.application().name(), self.application().version())
-		resolved_output_args['metadata:g:2'] = 'year=%d' % datetime.datetime.now().year
-
-		for entry in self.playlist().entries():
-			decoder_args = Profile.default_decoder()
-			entry_profile = entry.profile()
-
-			if entry_profile.decoder_args().has_args():
-				decoder_args = entry_profile.decoder_args()
-			elif self.playlist().profile().decoder_args().has_args():
-				decoder_args = self.playlist().profile().decoder_args()
-
-		encoder_builder = (
-			ffmpeg
-			.input('pipe:', **resolved_input_args)
-			.output(self.playlist().output().destination(), **resolved_output_args)
-			.overwrite_output()
-			.global_args(*resolved_global_args)
-		)
+			self.logger().info('Encoder Global Args: {}'.format(' '.join(encoder_args.global_args())))
+			self.logger().info('Encoder Input Args: {}'.format(' '.join(encoder_args.input_argv())))
+			self.logger().info('Encoder Output Args: {}'.format(' '.join(encoder_args.output_argv())))
+
+		metadata = OrderedDict()
+		metadata['metadata:g:0'] = 'service_name=%s' % self.playlist().name()
+		metadata['metadata:g:1'] = 'service_provider=%s/%s' % (self.application().name(), self.application().version())
+		metadata['metadata:g:2'] = 'year=%d' % datetime.datetime.now().year
+
+		if len(self.playlist().encoder_filters()) and encoder_graph.copies_video():
+			# copied video can not be filtered, every entry's decoder applies them instead
+			self.logger().warning('Encoder profile copies the video, applying encoder filters per entry')
+			for f in self.playlist().encoder_filters():
+				f.set_encoder(False)
+
+		try:
+			encoder_builder = encoder_graph.build(metadata, destination=segmented.manifest() if segmented is not None else None)
+		except DecoderGraphError as e:
+			self.logger().error(e.message())
+			self._release_cpus()
+			return Command.COMMAND_ERROR
 
 		if self.args().verbose:
 			self.logger().info('Encoder Args: {}'.format(' '.join(encoder_builder.compile())))
 
-		self._encoder = encoder_builder.run_async(pipe_stdin=True, pipe_stderr=False)
+		affinity = self._assignment.encoder() if self._assignment is not None else None
+		self._encoder = EncoderProcessThread(encoder_args, encoder_builder.compile(), restarts=self.args().encoder_restarts, affinity=affinity)
 
-		if self._encoder.stderr is not None:
-			self._encoder_error_thread = threading.Thread(target=self._error_thread, args=(self._encoder.stderr, self._encoder_error_buffer))
-			self._encoder_error_thread.daemon = True
-			self._encoder_error_thread.start()
+		try:
+			self._encoder.run()
+		except OSError as e:
+			self.logger().error('Unable to start the encoder - %s' % e)
+			self._release_cpus()
+			return Command.COMMAND_ERROR
 
-		while True:
-			if not self._is_encoder_valid():
-				error = self._get_encoder_error()
-				if error is not None and len(error):
-					self.logger().error('Encoder Error: %s' % error)
-				else:
-					self.logger().error('Encoder Error')
-				break
+		if segmented is not None:
+			self._publisher = SegmentPublisher(segmented)
+			self._publisher.start()
 
-			try:
-				entry = entries.pop()
-			except IndexError:
-				break
+		self._probe_pool = ProbePool(self.args().jobs, self.args().mount_jobs, nice=self.args().nice_background)
+		self._preloader = FilterPreloader(self.args().jobs, nice=self.args().nice_background)
 
-			if not self._play_entry(entry):
-				if self.playlist().should_loop() is True:
-					if self.playlist().should_loop_shuffle() is True:
-						self.playlist().shuffle()
-					entries = self.playlist().entries().copy()
-				else:
-					break
-			self.encoder().stdin.flush()
+		try:
+			while True:
+				if not self._encoder.is_running():
+					self._log_errors('Encoder', self._encoder.errors())
 
-		self.encoder().stdin.close()
-		self.encoder().terminate()
+					if not self._encoder.should_restart():
+						self.logger().error('Encoder exited with code %s' % self._encoder.returncode())
+						break
 
-		return Command.COMMAND_ERROR
+					self.logger().warning('Encoder exited with code %s, restarting (%d of %d)' % (self._encoder.returncode(), self._encoder.restarts() + 1, self.args().encoder_restarts))
 
-	def _play_entry(self, entry: PlaylistEntry):
-		self.logger().info('Playing %s' % entry.source())
+					try:
+						self._encoder.restart()
+					except OSError as e:
+						self.logger().error('Unable to restart the encoder - %s' % e)
+						break
 
-		if not self._is_encoder_valid():
-			self.logger().error('Encoder not valid')
-			return False
+				self._drain_feed(entries, block=not len(entries))
 
-		probed_video_stream = entry.media_info().video_stream()
-		probed_audio_stream = entry.media_info().audio_stream()
+				try:
+					entry = entries.pop()
+				except IndexError:
+					break
 
-		if not probed_video_stream and not probed_audio_stream:
-			self.logger().error('No video or audio streams in playlist entry')
-			self.encoder().stdin.close()
-			self.encoder().wait()
-			return False
+				for upcoming in reversed(entries[-self.args().lookahead:] if self.args().lookahead > 0 else []):
+					self._probe_pool.prefetch(upcoming.media_info())
+					self._preloader.prefetch(self.playlist(), upcoming)
+
+				played = self._play_entry(entry)
+				self._played.append(entry)
+
+				if not played:
+					if self.playlist().should_loop() is True:
+						entries = self._loop()
+					else:
+						break
+				elif self._store is not None and not entry.is_quarantined():
+					self._mark_aired(entry)
+
+					# a library playlist is queried again for the next loop, so aired rules apply
+					if not len(entries) and self._feed is None and self.playlist().should_loop() is True:
+						entries = self._reload_library()
+				self._encoder.flush()
+				self._log_errors('Encoder', self._encoder.errors())
+		finally:
+			self._probe_pool.shutdown()
+			self._preloader.shutdown()
+			if self._decoder is not None:
+				self._decoder.stop(0)
+			self._encoder.stop()
+			self._release_cpus()
+
+			if self._publisher is not None:
+				self._publisher.stop()
+
+			if self.args().verbose:
+				self.logger().info('Encoder Stats: {}'.format(self._encoder.stats()))
+				if self._publisher is not None:
+					self.logger().info('Segment Stats: {}'.format(self._publisher.stats()))
 
-		if not probed_audio_stream:
-			self.logger().error('No audio stream in file %s' % entry.source())
-			return False
+		return Command.COMMAND_ERROR
 
-		decoder_args = Profile.ffplayout_decoder()
-		entry_profile = entry.profile()
+	def _validate(self) -> int:
+		validator = PlaylistValidator(self.args().jobs, self.args().dry_run, optimize=not self.args().no_optimize)
+		report = validator.validate(self.playlist())
 
-		if entry_profile.decoder_args().has_args():
-			decoder_args = entry_profile.decoder_args()
-		elif self.playlist().profile().decoder_args().has_args():
-			decoder_args = self.playlist().profile().decoder_args()
+		for failure in report['failures']:
+			for error in failure['errors']:
+				self.logger().error('%d) %s [%s] %s' % (failure['index'] + 1, failure['source'], error['check'], error['message']))
 
-		decoder_global_args = decoder_args.global_args()
-		decoder_input_args = decoder_args.input_args()
-		decoder_output_args = decoder_args.output_args()
+		self.logger().info('Validated %d entries in %.2fs, %d failed' % (report['validated'], report['elapsed'], report['failed']))
 
-		if self.args().very_verbose:
-			self.logger().info('Decoder Global Args: {}'.format(decoder_global_args))
-			self.logger().info('Decoder Input Args: {}'.format(decoder_input_args))
-			self.logger().info('Decoder Output Args: {}'.format(decoder_output_args))
+		if self.args().report is not None:
+			try:
+				with open(self.args().report, 'w') as fp:
+					json.dump(report, fp, indent=4)
+			except OSError as e:
+				self.logger().error('Unable to write report %s - %s' % (self.args().report, e))
+				return Command.COMMAND_ERROR
+
+		return Command.COMMAND_SUCCESS if not report['failed'] else Command.COMMAND_ERROR
+
+	def _loader(self, compiled: bool, library: bool, streaming: bool):
+		if library:
+			return StorePlaylistLoader(self.application())
+		if compiled:
+			return CompiledPlaylistLoader(self.application())
+		if streaming:
+			return StreamingJsonPlaylistLoader(self.application())
+		return JsonPlaylistLoader(self.application())
+
+	def _mark_aired(self, entry: PlaylistEntry):
+		try:
+			self._store.mark_aired(entry.source())
+		except PlaylistStoreError as e:
+			self.logger().warning('Unable to record %s as aired - %s' % (entry.source(), e.message()))
+
+	def _reload_library(self) -> list:
+		self.playlist().entries().clear()
+		self._start_feed(StorePlaylistLoader(self.application()).stream(self.playlist(), self._options))
+		return self._drain_feed([], block=True)
+
+	def _loop(self) -> list:
+		"""
+		Start the next pass over the playlist
+
+		:return: list of pending (reversed) entries
+		"""
+
+		if self._compiled:
+			# a compiled playlist is never held in memory, every pass reads the file again
+			self._stop_feed()
+			self._start_feed(self._compiled_pass(reshuffle=self.playlist().should_loop_shuffle(), history=list(self._played)))
+			return self._drain_feed([], block=True)
+
+		if self._rotating:
+			# the rest of an interrupted rotation is never played, so it is not picked either
+			self._stop_feed()
+			self._rotating = False
+		else:
+			self._finish_feed()
 
-		decoder_builder = ffmpeg.input(entry.source(), **decoder_input_args)
+		if self.playlist().should_loop_shuffle() is True:
+			return self._start_rotation(random.getrandbits(32), list(self._played))
 
-		start = float(entry.start())
-		end = float(entry.end())
-		duration = float(entry.duration())
+		if self.playlist().should_shuffle() is True:
+			# the same seed picks the same order, the first pass repeats
+			return self._start_rotation(self._seed)
 
-		video = None
-		audio = None
+		entries = self.playlist().entries().copy()
+		entries.reverse()
+		return entries
 
-		if start > 0 or (end != duration and end < duration):
-			video = decoder_builder.video.trim(start=start, end=end).setpts('PTS-STARTPTS')
+	def _start_rotation(self, seed: int, history: list = None) -> list:
+		"""
+		Order the playlist on the feed thread, the whole rotation is never built before playout
 
-			audio = decoder_builder.audio.filter('atrim', start=start, end=end).filter('asetpts', 'PTS-STARTPTS')
-			joined = ffmpeg.concat(video, audio, v=1, a=1).node
+		:param seed: int
+		:param history: list of PlaylistEntry played last, the playlist tail by default
+		:return: list of pending (reversed) entries
+		"""
 
-			video = joined[0]
-			audio = joined[1]
-		else:
-			video = decoder_builder.video
-			audio = decoder_builder.audio
+		self._rotating = True
+		self._start_feed(self.playlist().rotation(seed, history))
+		return self._drain_feed([], block=True)
 
-		video = video.filter('scale', self.playlist().output().resolution().x(), self.playlist().output().resolution().y(), force_original_aspect_ratio='1')
+	def _compiled_pass(self, apply: bool = False, reshuffle: bool = False, history: list = None):
+		"""
+		Read one pass over a compiled playlist, entries are materialized from their rows only
+		as playout takes them and are not added to the playlist
 
-		if probed_video_stream.resolution().x() < self.playlist().output().resolution().x():
-			video = video.filter('pad', self.playlist().output().resolution().x(), self.playlist().output().resolution().y(), '(ow-iw)/2', '(oh-ih)/2')
+		:param apply: bool apply the playlist members, on the first pass
+		:param reshuffle: bool order by a new rotation, otherwise the order of the first pass
+		:param history: list of PlaylistEntry played last, kept apart from the first picks of a reshuffle
+		:return: generator of PlaylistEntry
+		:raises PlaylistLoaderError:
+		"""
 
-		# Apply global filters first
+		loader = CompiledPlaylistLoader(self.application())
 
-		if self.playlist().has_filters():
-			for f in self.playlist().filters():  # type: PlaylistFilterEntry
-				video, audio = f.handler().apply(self.playlist(), entry, video, audio, f.options())
+		with loader.open(self._playlist.path(), self._playlist if apply else None) as compiled:
+			self._compiled_size = len(compiled)
+			rows = None
 
-		# Apply entry level filters
+			if reshuffle or self._playlist.should_shuffle():
+				# the same seed orders the rows the same, so a pass that is not reshuffled repeats the first
+				rotation = Rotation(self._playlist.separation(), random.Random(random.getrandbits(32) if reshuffle else self._seed))
+				rows = (row.index() for row in rotation.order(compiled.rows(), history if reshuffle and history is not None else ()))
 
-		if entry.has_filters():
-			for f in entry.filters():  # type: PlaylistFilterEntry
-				video, audio = f.handler().apply(self.playlist(), entry, video, audio, f.options())
+			for entry in loader.entries(compiled, self._options, rows):
+				yield entry
 
-		# Finalize and output
+	def _start_feed(self, stream):
+		"""
+		Keep reading the playlist on a background thread, handing entries to playout as they are built
 
-		decoder_builder = ffmpeg.output(video, audio, 'pipe:', **decoder_output_args)
-		decoder_builder = decoder_builder.global_args(*decoder_global_args)
+		:param stream: generator of PlaylistEntry from a loader's stream() or a rotation
+		"""
 
-		if self.args().verbose:
-			self.logger().info('Decoder Args: {}'.format(' '.join(decoder_builder.compile())))
+		# bounded, so a lazily evaluated playlist is only read a little ahead of playout
+		self._feed = feed_queue = queue.Queue(maxsize=StreamPlaylistCommand.FEED_SIZE)
+		self._feed_stop = stop = threading.Event()
 
-		self._decoder = (
-			decoder_builder.run_async(pipe_stdout=True, pipe_stderr=False)
-		)
+		def feed():
+			try:
+				for entry in stream:
+					if stop.is_set():
+						break
+					feed_queue.put(entry)
+			except PlaylistLoaderError as e:
+				self.logger().error('Stopped reading playlist: %s' % e.message())
+			finally:
+				stream.close()
+				feed_queue.put(None)
+
+		self._feed_thread = threading.Thread(target=feed, name='playlist-feed')
+		self._feed_thread.daemon = True
+		self._feed_thread.start()
+
+	def _drain_feed(self, entries: list, block: bool = False) -> list:
+		"""
+		Move entries the feed has built since the last call in front of the pending (reversed) entries
+
+		:param entries: list
+		:param block: bool wait for at least one entry when nothing is pending
+		:return: list
+		"""
+
+		fed = []
+
+		while self._feed is not None:
+			try:
+				entry = self._feed.get(block=block and not len(fed))
+			except queue.Empty:
+				break
 
-		if self._decoder.stderr is not None:
-			self._decoder_error_thread = threading.Thread(target=self._error_thread, args=(self._decoder.stderr, self._decoder_error_buffer))
-			self._decoder_error_thread.daemon = True
-			self._decoder_error_thread.start()
+			if entry is None:
+				self._feed = None
+				break
 
-		while True:
-			# TODO see if we can somehow re-encode from here?
-			error = self._get_decoder_error()
+			fed.append(entry)
 
-			if error is not None and len(error):
-				print(len(error))
-				self.logger().error('Decoder Error: %s' % error)
+		if len(fed):
+			fed.reverse()
+			entries[:0] = fed
 
-			buf = self._decoder.stdout.read(16*1024)
-			if not buf:
-				break
-			self._encoder.stdin.write(buf)
+		return entries
 
-		self.decoder().wait()
+	def _finish_feed(self):
+		# entries still queued are already part of the playlist, they are only waited on
+		while self._feed is not None:
+			self._drain_feed([], block=True)
 
-		return True
+	def _stop_feed(self):
+		# entries still queued are dropped, the feed stops at the next entry it reads
+		if self._feed is not None:
+			self._feed_stop.set()
+			while self._feed.get() is not None:
+				pass
+			self._feed = None
 
-	def _is_encoder_valid(self):
-		if self._encoder is None:
-			return False
-		return self._is_process_valid(self._encoder)
-
-	def _get_encoder_error(self):
-		# TODO: mutex on buffer?
-		ret = None
-		if len(self._decoder_error_buffer):
-			ret = ''
-			for r in self._decoder_error_buffer:
-				ret = ret + r.decode('utf8')
-			self._decoder_error_buffer.clear()
-			return ret
-		return ret
-
-	def _stop_encoder(self):
-		pass
-
-	def _is_decoder_valid(self):
-		if self._decoder is None:
+	def _play_entry(self, entry: PlaylistEntry):
+		if entry.is_quarantined():
+			self.logger().warning('Skipping quarantined %s' % entry.source())
+			return True
+
+		self.logger().info('Playing %s' % entry.source())
+
+		if not self._encoder.is_running():
+			self.logger().error('Encoder not running')
 			return False
-		return self._is_process_valid(self._decoder)
-
-	def _get_decoder_error(self):
-		# TODO: mutex on buffer?
-		if len(self._decoder_error_buffer):
-			ret = ''
-			for r in self._decoder_error_buffer:
-				ret = ret + r.decode('utf8')
-			self._decoder_error_buffer.clear()
-			return ret
-		return None
-
-	def _stop_decoder(self):
-		pass
-
-	def _is_process_valid(self, process: Popen):
-		if not isinstance(process, Popen):
+
+		try:
+			probed_video_stream = entry.media_info().video_stream()
+			probed_audio_stream = entry.media_info().audio_stream()
+		except MediaInfoError as e:
+			self.logger().error('Skipping %s - %s' % (entry.source(), e.message()))
+			return True
+
+		if not probed_video_stream and not probed_audio_stream:
+			self.logger().error('No video or audio streams in playlist entry')
+			self._encoder.stop()
 			return False
-		if process.poll() is not None:
+
+		if not probed_audio_stream:
+			self.logger().error('No audio stream in file %s' % entry.source())
 			return False
+
+		graph = DecoderGraph(self.playlist(), entry, optimize=not self.args().no_optimize)
+		decoder_args = graph.decoder_args()
+
+		if self.args().very_verbose:
+			self.logger().info('Decoder Global Args: {}'.format(' '.join(decoder_args.global_args())))
+			self.logger().info('Decoder Input Args: {}'.format(' '.join(decoder_args.input_argv())))
+			self.logger().info('Decoder Output Args: {}'.format(' '.join(decoder_args.output_argv())))
+
+		try:
+			decoder_builder = graph.build()
+		except DecoderGraphError as e:
+			self.logger().error('Skipping %s - %s' % (entry.source(), e.message()))
+			return True
+
+		if len(graph.removed()):
+			self.logger().info('Optimized graph for %s, removed %s' % (entry.source(), ', '.join(graph.removed())))
+
+		if self.args().verbose:
+			self.logger().info('Decoder Args: {}'.format(' '.join(decoder_builder.compile())))
+
+		affinity = self._assignment.decoder() if self._assignment is not None else None
+		self._decoder = DecoderProcessThread(decoder_args, decoder_builder.compile(), affinity=affinity)
+
+		try:
+			self._decoder.run()
+		except OSError as e:
+			self.logger().error('Skipping %s - unable to start the decoder - %s' % (entry.source(), e))
+			return True
+
+		try:
+			self._decoder.pump(self._encoder, lambda lines: self._log_errors('Decoder', lines))
+		finally:
+			# a decoder the encoder stopped taking from is blocked writing, it is not waited on
+			self._decoder.stop(None if self._encoder.is_running() else 0)
+
+		self._log_errors('Decoder', self._decoder.errors())
+
+		if self.args().verbose:
+			self.logger().info('Decoder Stats: {}'.format(self._decoder.stats()))
+			if self._publisher is not None:
+				self.logger().info('Segment Stats: {}'.format(self._publisher.stats()))
+
 		return True
 
-	def _error_thread(self, fh: BufferedReader, buffer: list):  # TODO: move away from list, use a buffered data type
-		buffer.append(fh.read())
-		fh.flush()
+	def _allocate_cpus(self):
+		# the playlist names the channel, channels without one are told apart by their file
+		channel = self.playlist().name() or self.playlist().path()
+		self._scheduler = CpuScheduler(self.args().cpu_state)
+
+		try:
+			self._assignment = self._scheduler.allocate(channel, self.args().encoder_cores, self.args().decoder_cores)
+		except OSError as e:
+			self.logger().warning('Unable to assign cores, running unpinned - %s' % e)
+			self._scheduler = None
+			return
+
+		self.logger().info('CPU Assignment: {}'.format(self._assignment.serialize()))
+
+	def _release_cpus(self):
+		if self._scheduler is None or self._assignment is None:
+			return
+
+		try:
+			self._scheduler.release(self._assignment.channel())
+		except OSError as e:
+			self.logger().warning('Unable to release cores - %s' % e)
+
+		self._scheduler = None
+
+	def _log_errors(self, name: str, lines: list):
+		for line in lines:
+			self.logger().error('%s Error: %s' % (name, line))
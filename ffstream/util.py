@@ -1,5 +1,8 @@
-import ffmpeg
-import pprint
+import sys
+import json
+import subprocess
+from array import array
+from threading import RLock
 
 class IntVector2:
 	def __init__(self, value: str = None, x: int = None, y: int = None):
@@ -54,6 +57,8 @@ Serializable
 """
 
 class Serializable:
+	__slots__ = ()
+
 	def serialize(self) -> dict:
 		return dict()
 
@@ -72,20 +77,74 @@ MediaInfo
 """
 
 
-class MediaInfo:
-	def __init__(self, file_path: str = None):
+class MediaInfo(Serializable):
+	__slots__ = ('_video_streams', '_audio_streams', '_was_probed', '_source', '_deep')
+
+	# the only stream fields ffstream reads, requesting everything costs probe time and JSON parsing
+	PROBE_ENTRIES = 'stream=codec_type,codec_name,width,height,sample_rate,channels,duration:stream_tags=DURATION'
+
+	# adds what passthrough and trim indexing need, keyframes are queried separately
+	DEEP_PROBE_ENTRIES = 'stream=codec_type,codec_name,profile,width,height,r_frame_rate,sample_rate,channels,duration:stream_tags=DURATION'
+
+	KEYFRAME_ENTRIES = 'packet=pts_time,flags'
+
+	def __init__(self, file_path: str = None, deep: bool = False):
 		self._re_init_members()
 		if isinstance(file_path, str):
-			self.probe(file_path)
+			self.probe(file_path, deep=deep)
+
+	@classmethod
+	def from_probe_data(cls, file_path: str, probe_data: dict) -> 'MediaInfo':
+		"""
+		Build a MediaInfo from already available ffprobe output without running ffprobe
+
+		:param file_path: str
+		:param probe_data: dict
+		:return: MediaInfo
+		:raises MediaInfoError:
+		"""
+
+		ret = MediaInfo()
+		ret._was_probed = True
+		ret._source = file_path
+		ret._deep = 'keyframes' in probe_data
+		ret._parse(probe_data)
+		return ret
+
+	@staticmethod
+	def probe_args(file_path: str, entries: str, select_streams: str = None) -> list:
+		args = ['ffprobe', '-v', 'error', '-of', 'json', '-show_entries', entries]
+		if select_streams is not None:
+			args += ['-select_streams', select_streams]
+		return args + [file_path]
+
+	@staticmethod
+	def run_probe(file_path: str, entries: str, select_streams: str = None) -> dict:
+		"""
+		Run ffprobe for only the requested entries
+
+		:param file_path: str
+		:param entries: str in -show_entries syntax
+		:param select_streams: str|None stream specifier
+		:return: dict
+		:raises MediaInfoError:
+		"""
+
+		args = MediaInfo.probe_args(file_path, entries, select_streams)
+		p = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		out, err = p.communicate()
+		if p.returncode != 0:
+			raise MediaInfoError('ffprobe error: %s' % err.decode('utf8', 'replace').strip())
+		return json.loads(out.decode('utf-8'))
 
 	def _re_init_members(self):
-		self._video_streams = []
-		self._audio_streams = []
+		self._video_streams = ()
+		self._audio_streams = ()
 		self._was_probed = False
-		self._probe_data = False
 		self._source = None
+		self._deep = False
 
-	def probe(self, file_path: str, reprobe: bool = False):
+	def probe(self, file_path: str, reprobe: bool = False, deep: bool = False):
 		if self._was_probed:
 			if reprobe is not True:
 				raise MediaInfoError('Already probed, try specifying reprobe')
@@ -94,17 +153,57 @@ class MediaInfo:
 
 		self._was_probed = True
 		self._source = file_path
+		self._deep = deep
 
 		try:
-			self._probe_data = ffmpeg.probe(file_path)
-		except ffmpeg.Error as e:
-			raise MediaInfoError('Error probing %s' % file_path)
+			if deep is True:
+				probe_data = MediaInfo.run_probe(file_path, MediaInfo.DEEP_PROBE_ENTRIES)
+				packets = MediaInfo.run_probe(file_path, MediaInfo.KEYFRAME_ENTRIES, 'v:0')
+				probe_data['keyframes'] = [
+					float(packet['pts_time']) for packet in packets.get('packets', [])
+					if 'K' in packet.get('flags', '') and packet.get('pts_time') not in (None, 'N/A')
+				]
+			else:
+				probe_data = MediaInfo.run_probe(file_path, MediaInfo.PROBE_ENTRIES)
+		except MediaInfoError as e:
+			raise MediaInfoError('Error probing %s' % file_path, e)
+
+		self._parse(probe_data)
+
+	def is_deep(self) -> bool:
+		return self._deep
 
-		for stream in self._probe_data['streams']:
+	def serialize(self) -> dict:
+		"""
+		Serialize the parsed streams in ffprobe's layout, readable by from_probe_data
+
+		:return: dict
+		"""
+
+		result = {
+			'streams': [s.serialize() for s in self._video_streams + self._audio_streams]
+		}
+
+		if self._deep and len(self._video_streams) and self._video_streams[0].keyframes() is not None:
+			result['keyframes'] = list(self._video_streams[0].keyframes())
+
+		return result
+
+	def _parse(self, probe_data: dict):
+		# only the parsed stream fields are kept, the raw probe output is dropped
+		video_streams = []
+		audio_streams = []
+
+		for stream in probe_data.get('streams', []):
 			if stream['codec_type'] == 'video':
-				self._video_streams.append(VideoStreamInfo(stream))
+				if not len(video_streams) and 'keyframes' in probe_data:
+					stream = dict(stream, keyframes=probe_data['keyframes'])
+				video_streams.append(VideoStreamInfo(stream))
 			elif stream['codec_type'] == 'audio':
-				self._audio_streams.append(AudioStreamInfo(stream))
+				audio_streams.append(AudioStreamInfo(stream))
+
+		self._video_streams = tuple(video_streams)
+		self._audio_streams = tuple(audio_streams)
 
 		if not self.stream_count():
 			raise MediaInfoError('No streams in file %s' % self._source)
@@ -121,7 +220,7 @@ class MediaInfo:
 		except IndexError:
 			return None
 
-	def video_streams(self) -> list:
+	def video_streams(self) -> tuple:
 		return self._video_streams
 
 	def video_stream_count(self):
@@ -133,7 +232,7 @@ class MediaInfo:
 		except IndexError:
 			return None
 
-	def audio_streams(self) -> list:
+	def audio_streams(self) -> tuple:
 		return self._audio_streams
 
 	def audio_stream_count(self):
@@ -143,13 +242,84 @@ class MediaInfo:
 		return len(self.video_streams()) + len(self.audio_streams())
 
 
+"""
+LazyMediaInfo - MediaInfo which defers probing until the streams are first read
+"""
+
+
+class LazyMediaInfo(MediaInfo):
+	__slots__ = ('_error', '_lock')
+
+	def __init__(self, file_path: str, deep: bool = False):
+		if not isinstance(file_path, str):
+			raise ValueError
+		self._source = file_path
+		self._deep = deep
+		self._error = None
+		self._lock = RLock()
+		super().__init__()
+
+	def resolve(self) -> 'LazyMediaInfo':
+		"""
+		Probe the source if it has not been probed yet. Safe to call from several threads,
+		only the first caller runs ffprobe.
+
+		:return: LazyMediaInfo
+		:raises MediaInfoError:
+		"""
+
+		with self._lock:
+			if not self._was_probed:
+				try:
+					self.probe(self._source, deep=self._deep)
+				except MediaInfoError as e:
+					self._error = e
+
+		if self._error is not None:
+			raise self._error
+
+		return self
+
+	def _re_init_members(self):
+		source = getattr(self, '_source', None)
+		deep = getattr(self, '_deep', False)
+		super()._re_init_members()
+		self._source = source
+		self._deep = deep
+
+	def video_stream(self, index: int = 0) -> 'VideoStreamInfo':
+		self.resolve()
+		return super().video_stream(index)
+
+	def video_streams(self) -> tuple:
+		self.resolve()
+		return self._video_streams
+
+	def audio_stream(self, index: int = 0) -> 'AudioStreamInfo':
+		self.resolve()
+		return super().audio_stream(index)
+
+	def audio_streams(self) -> tuple:
+		self.resolve()
+		return self._audio_streams
+
+
 """
 MediaInfoError
 """
 
 
-class MediaInfoError(ffmpeg.Error):
-	pass
+class MediaInfoError(Exception):
+	def __init__(self, message: str = '', other: Exception = None):
+		super().__init__(message)
+		self._message = message
+		self._other = other
+
+	def message(self) -> str:
+		return self._message
+
+	def other(self) -> Exception:
+		return self._other
 
 
 """
@@ -158,31 +328,72 @@ StreamInfo
 
 
 class StreamInfo:
+	__slots__ = ('_codec_type', '_codec_name', '_start', '_duration')
+
+	# ffprobe field name to parsed member, for callers still asking by field name
+	FIELDS = {
+		'codec_type': '_codec_type',
+		'codec_name': '_codec_name',
+		'start': '_start',
+		'duration': '_duration',
+	}
+
 	def __init__(self, probed_data: dict):
 		if not isinstance(probed_data, dict):
 			raise ValueError
-		self._data = probed_data
+		self._codec_type = sys.intern(probed_data['codec_type']) if 'codec_type' in probed_data else None
+		self._codec_name = sys.intern(probed_data['codec_name']) if 'codec_name' in probed_data else None
+		self._start = float(probed_data['start']) if 'start' in probed_data else 0.00
+		self._duration = StreamInfo.parse_duration(probed_data)
+
+	@staticmethod
+	def parse_duration(probed_data: dict) -> (float, None):
+		if 'duration' in probed_data:
+			return float(probed_data['duration'])
+		if 'tags' in probed_data:
+			tags = probed_data['tags']
+			if 'DURATION' in tags and isinstance(tags['DURATION'], str):
+				h, m, s = tags['DURATION'].split(':')
+				return float(((int(h) * 60) * 60) + (int(m) * 60) + float(s))
+		return None
+
+	@staticmethod
+	def parse_rate(value) -> (float, None):
+		if isinstance(value, (int, float)):
+			return float(value)
+		if not isinstance(value, str) or not len(value):
+			return None
+		if '/' in value:
+			num, den = value.split('/', 1)
+			return float(num) / float(den) if float(den) != 0 else None
+		return float(value)
 
 	def has(self, field: str):
-		return field in self._data
+		return field in self.FIELDS and getattr(self, self.FIELDS[field]) is not None
 
 	def get(self, field: str, default=None):
-		if field in self._data:
-			return self._data[field]
+		if self.has(field):
+			return getattr(self, self.FIELDS[field])
 		return default
 
+	def serialize(self) -> dict:
+		result = {}
+		for field, member in self.FIELDS.items():
+			if getattr(self, member) is not None:
+				result[field] = getattr(self, member)
+		return result
+
+	def codec_type(self) -> str:
+		return self._codec_type
+
+	def codec_name(self) -> str:
+		return self._codec_name
+
 	def start(self) -> float:
-		return float(self.get('start', 0.00))
+		return self._start
 
 	def duration(self) -> float:
-		if self.has('duration'):
-			return float(self.get('duration', 0.00))
-		if self.has('tags'):
-			tags = self.get('tags', {})
-			if 'DURATION' in tags and isinstance(tags['DURATION'], str):
-				h, m, s = tags['DURATION'].split(':')
-				return float(((int(h) * 60) * 60) + (int(m) * 60) + float(s))
-		return None
+		return self._duration
 
 
 """
@@ -191,18 +402,65 @@ VideoStreamInfo
 
 
 class VideoStreamInfo(StreamInfo):
+	__slots__ = ('_width', '_height', '_frame_rate', '_profile', '_keyframes')
+
+	FIELDS = dict(StreamInfo.FIELDS, width='_width', height='_height', r_frame_rate='_frame_rate', profile='_profile')
+
+	def __init__(self, probed_data: dict):
+		super().__init__(probed_data)
+		self._width = int(probed_data['width']) if 'width' in probed_data else None
+		self._height = int(probed_data['height']) if 'height' in probed_data else None
+		self._frame_rate = StreamInfo.parse_rate(probed_data.get('r_frame_rate'))
+		self._profile = sys.intern(probed_data['profile']) if isinstance(probed_data.get('profile'), str) else None
+		self._keyframes = array('d', probed_data['keyframes']) if 'keyframes' in probed_data else None
+
+	def width(self) -> int:
+		return self._width
+
+	def height(self) -> int:
+		return self._height
+
+	def frame_rate(self) -> (float, None):
+		return self._frame_rate
+
+	def profile(self) -> (str, None):
+		return self._profile
+
+	def keyframes(self) -> (array, None):
+		"""
+		Keyframe timestamps in seconds, only available from a deep probe
+
+		:return: array of float|None
+		"""
+
+		return self._keyframes
+
 	def resolution(self) -> VideoResolution:
 		ret = VideoResolution()
-		ret.set(self.get('width'), self.get('height'))
+		ret.set(self._width, self._height)
 		return ret
 
+
 """
 AudioStreamInfo
 """
 
 
 class AudioStreamInfo(StreamInfo):
-	pass
+	__slots__ = ('_sample_rate', '_channels')
+
+	FIELDS = dict(StreamInfo.FIELDS, sample_rate='_sample_rate', channels='_channels')
+
+	def __init__(self, probed_data: dict):
+		super().__init__(probed_data)
+		self._sample_rate = int(probed_data['sample_rate']) if 'sample_rate' in probed_data else None
+		self._channels = int(probed_data['channels']) if 'channels' in probed_data else None
+
+	def sample_rate(self) -> (int, None):
+		return self._sample_rate
+
+	def channels(self) -> (int, None):
+		return self._channels
 
 
 """
@@ -233,7 +491,8 @@ class Logger(object):
 		raise Exception('Must Implement')
 
 	def pprint(self, data, indent: int = 4):
-		pprint.PrettyPrinter(indent=indent).pprint(data)
+		from pprint import PrettyPrinter
+		PrettyPrinter(indent=indent).pprint(data)
 
 
 class StdOutLogger(Logger):
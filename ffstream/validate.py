@@ -0,0 +1,162 @@
+import os
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from .playlist import Playlist, PlaylistEntry
+from .graph import DecoderGraph, DecoderGraphError
+from .util import MediaInfoError
+
+
+"""
+PlaylistValidator - Checks every entry of a playlist the way playout would use it
+
+Each entry is probed, its trim checked against the media duration, the files its filters
+read looked up and its decoder graph built. Optionally the graph is run for a second
+into the null muxer. Entries are checked in parallel, the report lists the failures and
+where the time went.
+"""
+
+
+class PlaylistValidator:
+	# a trim may end this far past the probed duration, containers often round it
+	DURATION_TOLERANCE = 0.5
+	DRY_RUN_TIMEOUT = 60
+
+	def __init__(self, jobs: int = 1, dry_run: bool = False, dry_run_seconds: float = 1.0, optimize: bool = True):
+		self._jobs = jobs if isinstance(jobs, int) and jobs > 0 else 1
+		self._dry_run = dry_run is True
+		self._dry_run_seconds = dry_run_seconds
+		self._optimize = optimize is True
+		self._assets = {}
+
+	def jobs(self) -> int:
+		return self._jobs
+
+	def _asset_exists(self, path: str) -> bool:
+		# global filters name the same files for every entry, look each up once
+		if path not in self._assets:
+			self._assets[path] = os.path.isfile(path)
+		return self._assets[path]
+
+	def validate_entry(self, playlist: Playlist, position: int, entry: PlaylistEntry) -> dict:
+		"""
+		:param playlist: Playlist
+		:param position: int
+		:param entry: PlaylistEntry
+		:return: dict with index, source, errors as {check, message} and timing in seconds per check
+		"""
+
+		result = {
+			'index': position,
+			'source': entry.source(),
+			'errors': [],
+			'timing': {}
+		}
+
+		def fail(check: str, message: str):
+			result['errors'].append({'check': check, 'message': message})
+
+		started = time.perf_counter()
+
+		try:
+			video = entry.media_info().video_stream()
+			audio = entry.media_info().audio_stream()
+		except MediaInfoError as e:
+			fail('probe', e.message())
+			return result
+		except OSError as e:
+			fail('probe', str(e))
+			return result
+		finally:
+			result['timing']['probe'] = time.perf_counter() - started
+
+		if video is None:
+			fail('streams', 'No video stream')
+		if audio is None:
+			fail('streams', 'No audio stream')
+
+		stream = video if video is not None else audio
+		duration = stream.duration() if stream is not None else None
+
+		if entry.start() < 0:
+			fail('trim', 'Start %f is negative' % entry.start())
+		if entry.end() <= entry.start():
+			fail('trim', 'End %f is not after start %f' % (entry.end(), entry.start()))
+		if duration not in (None, 0.00) and entry.end() > duration + PlaylistValidator.DURATION_TOLERANCE:
+			fail('trim', 'End %f is past the media duration %f' % (entry.end(), duration))
+
+		filters = (playlist.filters() if playlist.has_filters() else []) + (entry.filters() if entry.has_filters() else [])
+
+		for f in filters:
+			for path in f.handler().assets(f.options()):
+				if not self._asset_exists(path):
+					fail('assets', 'Filter %s is missing %s' % (f.handler().name(), path))
+
+		if video is None:
+			return result
+
+		started = time.perf_counter()
+
+		try:
+			DecoderGraph(playlist, entry, self._optimize).build().compile()
+		except DecoderGraphError as e:
+			fail('graph', e.message())
+			return result
+		except Exception as e:
+			fail('graph', str(e))
+			return result
+		finally:
+			result['timing']['graph'] = time.perf_counter() - started
+
+		if self._dry_run and not len(result['errors']):
+			self._run_dry(playlist, entry, result, fail)
+
+		return result
+
+	def _run_dry(self, playlist: Playlist, entry: PlaylistEntry, result: dict, fail):
+		started = time.perf_counter()
+
+		try:
+			args = DecoderGraph(playlist, entry, self._optimize).build('-', {'f': 'null', 't': self._dry_run_seconds}).compile()
+			p = subprocess.run(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=PlaylistValidator.DRY_RUN_TIMEOUT)
+			if p.returncode != 0:
+				lines = [line for line in p.stderr.decode('utf8', 'replace').splitlines() if len(line.strip())]
+				fail('dry_run', lines[-1] if len(lines) else 'ffmpeg exited with code %d' % p.returncode)
+		except subprocess.TimeoutExpired:
+			fail('dry_run', 'Timed out after %d seconds' % PlaylistValidator.DRY_RUN_TIMEOUT)
+		except (OSError, DecoderGraphError) as e:
+			fail('dry_run', e.message() if isinstance(e, DecoderGraphError) else str(e))
+		finally:
+			result['timing']['dry_run'] = time.perf_counter() - started
+
+	def validate(self, playlist: Playlist) -> dict:
+		"""
+		Validate every entry that is not quarantined
+
+		:param playlist: Playlist
+		:return: dict report
+		"""
+
+		started = time.perf_counter()
+		entries = [(i, e) for i, e in enumerate(playlist.entries()) if not e.is_quarantined()]
+		timing = {}
+		failures = []
+
+		with ThreadPoolExecutor(max_workers=self._jobs, thread_name_prefix='validate') as executor:
+			for result in executor.map(lambda item: self.validate_entry(playlist, item[0], item[1]), entries):
+				for check, seconds in result['timing'].items():
+					timing[check] = timing.get(check, 0.00) + seconds
+				if len(result['errors']):
+					failures.append(result)
+
+		return {
+			'playlist': playlist.path(),
+			'entries': playlist.entry_count(),
+			'validated': len(entries),
+			'failed': len(failures),
+			'dry_run': self._dry_run,
+			'jobs': self._jobs,
+			'elapsed': time.perf_counter() - started,
+			'timing': timing,
+			'failures': failures
+		}
@@ -0,0 +1,121 @@
+import os
+import time
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+
+"""
+verify_media - Fully decode a file into the null muxer and report what went wrong
+
+Runs in a worker process, the ffmpeg child inherits the worker's niceness.
+"""
+
+
+def verify_media(file_path: str, idle_io: bool = True) -> dict:
+	args = ['ffmpeg', '-v', 'error', '-nostats', '-progress', 'pipe:1', '-i', file_path, '-f', 'null', '-']
+
+	if idle_io and shutil.which('ionice') is not None:
+		args = ['ionice', '-c', '3'] + args
+
+	result = {
+		'errors': [],
+		'decoded_duration': None,
+		'verified': int(time.time())
+	}
+
+	try:
+		p = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		out, err = p.communicate()
+	except OSError as e:
+		result['errors'].append(str(e))
+		return result
+
+	for line in out.decode('utf8', 'replace').splitlines():
+		if line.startswith('out_time_us=') or line.startswith('out_time_ms='):
+			# both keys are in microseconds
+			value = line.split('=', 1)[1].strip()
+			if value.isdigit():
+				result['decoded_duration'] = int(value) / 1000000.0
+
+	result['errors'] = [line.strip() for line in err.decode('utf8', 'replace').splitlines() if len(line.strip())]
+
+	if p.returncode != 0 and not len(result['errors']):
+		result['errors'].append('ffmpeg exited with code %d' % p.returncode)
+
+	return result
+
+
+def _init_worker(nice: int):
+	if nice > 0:
+		os.nice(nice)
+
+
+"""
+MediaVerifier - Decodes files across a pool of low priority worker processes
+"""
+
+
+class MediaVerifier:
+	# decoding may fall this far short of the probed duration before a file counts as truncated
+	DURATION_TOLERANCE = 1.0
+
+	def __init__(self, jobs: int = 1, nice: int = 10, idle_io: bool = True):
+		self._jobs = jobs if isinstance(jobs, int) and jobs > 0 else 1
+		self._nice = nice if isinstance(nice, int) else 0
+		self._idle_io = idle_io is True
+		self._executor = None
+
+	def jobs(self) -> int:
+		return self._jobs
+
+	@staticmethod
+	def is_quarantined(result: dict, duration: float = None) -> bool:
+		"""
+		Decide whether a verification result should keep the file off the air
+
+		:param result: dict from verify_media
+		:param duration: float|None probed duration to compare the decoded duration against
+		:return: bool
+		"""
+
+		if len(result.get('errors', [])):
+			return True
+
+		decoded = result.get('decoded_duration')
+
+		if decoded is None:
+			return True
+
+		if duration not in (None, 0.00) and decoded < duration - MediaVerifier.DURATION_TOLERANCE:
+			return True
+
+		return False
+
+	def map(self, sources):
+		"""
+		Verify every source, yielding (source, result) pairs in the order given
+
+		:param sources: iterable of str
+		:return: generator of (str, dict)
+		"""
+
+		if self._executor is None:
+			self._executor = ProcessPoolExecutor(max_workers=self._jobs, initializer=_init_worker, initargs=(self._nice,))
+
+		sources = list(sources)
+		results = self._executor.map(verify_media, sources, [self._idle_io] * len(sources))
+
+		for source, result in zip(sources, results):
+			yield source, result
+
+	def shutdown(self):
+		if self._executor is not None:
+			self._executor.shutdown(wait=True, cancel_futures=True)
+			self._executor = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.shutdown()
@@ -0,0 +1,90 @@
+import os
+import json
+from .playlist import Playlist
+
+
+"""
+JsonPlaylistWriter - Writes json playlists one entry at a time
+
+The output is the same as json.dumps(playlist.serialize(), indent=indent), but entries
+are serialized and written as they come, so neither the entry list nor the document is
+held in memory. The file is written to a temporary path and renamed into place.
+"""
+
+
+class JsonPlaylistWriter:
+	def __init__(self, indent: int = 4):
+		self._indent = indent
+
+	def _dumps(self, value, depth: int) -> str:
+		# nested values are indented as json.dumps would at this depth
+		return json.dumps(value, indent=self._indent).replace('\n', '\n' + ' ' * (self._indent * depth))
+
+	def write(self, playlist: Playlist, path: str, entries=None) -> int:
+		"""
+		Write the playlist atomically
+
+		:param playlist: Playlist for the playlist level members
+		:param path: str
+		:param entries: iterable of PlaylistEntry, defaults to playlist.entries()
+		:return: int number of entries written
+		:raises PlaylistWriterError:
+		"""
+
+		entries = entries if entries is not None else playlist.entries()
+		pad = ' ' * self._indent
+		tmp = path + '.tmp'
+		count = 0
+
+		header = playlist.serialize(entries=False)
+		header['entries'] = None
+
+		try:
+			with open(tmp, 'w') as fp:
+				fp.write('{')
+
+				for i, (key, value) in enumerate(header.items()):
+					fp.write(',\n' if i else '\n')
+					fp.write('%s%s: ' % (pad, json.dumps(key)))
+
+					if key != 'entries':
+						fp.write(self._dumps(value, 1))
+						continue
+
+					fp.write('[')
+
+					for entry in entries:
+						fp.write(',\n' if count else '\n')
+						fp.write(pad * 2 + self._dumps(entry.serialize(), 2))
+						count += 1
+
+					fp.write(('\n' + pad + ']') if count else ']')
+
+				fp.write('\n}')
+
+			os.replace(tmp, path)
+		except OSError as e:
+			raise PlaylistWriterError('Unable to write playlist %s' % path, e)
+		finally:
+			# a failed write, including one raised by the entries, leaves the old playlist alone
+			if os.path.exists(tmp):
+				os.remove(tmp)
+
+		return count
+
+
+"""
+PlaylistWriterError
+"""
+
+
+class PlaylistWriterError(Exception):
+	def __init__(self, message: str = '', other: Exception = None):
+		self._message = message
+		self._other = other
+
+	def message(self) -> str:
+		return self._message
+
+	def other(self) -> Exception:
+		return self._other
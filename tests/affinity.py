@@ -0,0 +1,71 @@
+import os
+import json
+import subprocess
+from ffstream.affinity import CpuScheduler, CpuAssignment
+from ffstream.ffmpeg import ArgumentContainer, ProfileCompiler
+
+
+"""
+test_scheduler_allocate
+"""
+
+
+def test_scheduler_allocate(tmp_path):
+	scheduler = CpuScheduler(str(tmp_path / 'cpu.json'), cores=[0, 1, 2, 3, 4, 5])
+
+	first = scheduler.allocate('first', 2, 1)
+	second = scheduler.allocate('second', 2, 1)
+
+	assert first.encoder() == [0, 1]
+	assert first.decoder() == [2]
+	# free cores go first, then the least shared
+	assert second.encoder() == [3, 4]
+	assert second.decoder() == [5]
+	assert scheduler.allocate('third', 1, 1).encoder() == [0]
+
+	scheduler.release('first')
+	leases = scheduler.leases()
+
+	assert sorted(leases.keys()) == ['second', 'third']
+	assert leases['second'] == {'pid': os.getpid(), 'encoder': [3, 4], 'decoder': [5]}
+
+
+"""
+test_scheduler_prunes_dead_channels
+"""
+
+
+def test_scheduler_prunes_dead_channels(tmp_path):
+	path = tmp_path / 'cpu.json'
+	p = subprocess.Popen(['true'])
+	p.wait()
+
+	path.write_text(json.dumps({'gone': {'pid': p.pid, 'encoder': [0, 1], 'decoder': [2]}}))
+
+	scheduler = CpuScheduler(str(path), cores=[0, 1, 2, 3])
+
+	assert scheduler.allocate('live', 2, 1).encoder() == [0, 1]
+	assert list(scheduler.leases().keys()) == ['live']
+
+
+"""
+test_assignment_budget
+"""
+
+
+def test_assignment_budget():
+	defaults = ArgumentContainer({'global': ['-hide_banner'], 'input': {}, 'output': {'c:v': 'libx264'}})
+	profile = ArgumentContainer({'global': ['-filter_threads', '4'], 'input': {}, 'output': {'threads': '8'}})
+	compiler = ProfileCompiler([defaults, CpuAssignment.budget([2, 3])], [])
+
+	args = compiler.compile(*compiler.encoder_layers())
+
+	assert args.input_args()['threads'] == '2'
+	assert args.output_args()['threads'] == '2'
+	assert args.global_args() == ('-hide_banner', '-filter_threads', '2', '-filter_complex_threads', '2')
+
+	# thread counts the profile sets win
+	args = compiler.compile(*(compiler.encoder_layers() + (profile,)))
+
+	assert args.output_args()['threads'] == '8'
+	assert args.global_args() == ('-hide_banner', '-filter_threads', '4', '-filter_complex_threads', '2')
@@ -0,0 +1,179 @@
+import os
+import copy
+import glob
+import ffmpeg
+import pytest
+from PIL import Image
+from ffstream.assets import AssetCache, TextRenderer
+from ffstream.filter import ImageOverlayFilter, IntervalTextFilter
+from ffstream.playlist import Playlist, PlaylistEntry
+from ffstream.util import MediaInfo
+
+
+"""
+test_asset_cache
+"""
+
+
+def test_asset_cache(tmp_path):
+	cache = AssetCache(str(tmp_path / 'cache'))
+	calls = []
+
+	def create(path: str):
+		calls.append(path)
+		with open(path, 'w') as fp:
+			fp.write('asset')
+
+	key = cache.key('test', 1)
+	path = cache.get(key, 'txt', create)
+
+	assert path == cache.get(key, 'txt', create)
+	assert len(calls) == 1
+	assert open(path).read() == 'asset'
+	assert cache.key('test', 2) != key
+
+	source = tmp_path / 'source.bin'
+	source.write_bytes(b'one')
+	first = cache.file_hash(str(source))
+	source.write_bytes(b'three')
+
+	assert cache.file_hash(str(source)) != first
+
+
+"""
+test_image_overlay_prepare
+"""
+
+
+def test_image_overlay_prepare(tmp_path):
+	AssetCache.set_default(AssetCache(str(tmp_path / 'cache')))
+
+	try:
+		playlist = Playlist('overlay.json')
+		playlist.output().resolution().parse_str('1280x720')
+
+		# a 200x100 image with only a 20x10 opaque block in it
+		image = Image.new('RGBA', (200, 100), (0, 0, 0, 0))
+		image.paste((255, 0, 0, 255), (50, 20, 70, 30))
+		image.save(str(tmp_path / 'logo.png'))
+
+		options = {'image': str(tmp_path / 'logo.png'), 'kwargs': {'x': 10, 'y': 5}}
+		path, kwargs = ImageOverlayFilter().prepare(playlist, options)
+
+		assert kwargs == {'x': 60, 'y': 25}
+		assert options['kwargs'] == {'x': 10, 'y': 5}
+
+		with Image.open(path) as prepared:
+			assert prepared.size == (20, 10)
+			assert prepared.mode == 'RGB'
+
+		# a new filter instance finds the same file, offsets included
+		assert ImageOverlayFilter().prepare(playlist, options) == (path, kwargs)
+
+		# expressions keep the image whole, only fitted to the output
+		path, kwargs = ImageOverlayFilter().prepare(playlist, {'image': str(tmp_path / 'logo.png'), 'width': 100, 'kwargs': {'x': 'W-w'}})
+
+		assert kwargs == {'x': 'W-w'}
+
+		with Image.open(path) as prepared:
+			assert prepared.size == (100, 50)
+			assert prepared.mode == 'RGBA'
+
+		image.paste((0, 255, 0, 255), (0, 0, 10, 10))
+		image.save(str(tmp_path / 'logo.png'))
+		os.utime(str(tmp_path / 'logo.png'), ns=(0, 0))
+
+		changed, kwargs = ImageOverlayFilter().prepare(playlist, options)
+
+		assert kwargs == {'x': 10, 'y': 5}
+		assert changed != path
+
+		# prepared images are held on to up to the cache size, the least recently used go first
+		handler = ImageOverlayFilter()
+		handler.PRELOAD_CACHE_SIZE = 2
+
+		for x in range(4):
+			handler.prepare(playlist, {'image': str(tmp_path / 'logo.png'), 'kwargs': {'x': x, 'y': 5}})
+
+		assert len(handler._prepared) == 2
+	finally:
+		AssetCache.set_default(None)
+
+
+def find_font() -> str:
+	for pattern in ('/usr/share/fonts/**/*.ttf', '/usr/local/share/fonts/**/*.ttf', '/Library/Fonts/*.ttf'):
+		fonts = sorted(glob.glob(pattern, recursive=True))
+		if len(fonts):
+			return fonts[0]
+	pytest.skip('No TrueType font found')
+
+
+"""
+test_text_renderer_supports
+"""
+
+
+def test_text_renderer_supports():
+	assert TextRenderer.supports('Up next', {'fontfile': 'font.ttf', 'fontsize': 24, 'x': 10, 'y': 10, 'enable': 'lte(t,5)'})
+	assert not TextRenderer.supports('Up next', {'fontsize': 24})
+	assert not TextRenderer.supports('Up next', {'fontfile': 'font.ttf', 'x': '(w-text_w)/2'})
+	assert not TextRenderer.supports('%{localtime}', {'fontfile': 'font.ttf'})
+	assert not TextRenderer.supports('Up next', {'fontfile': 'font.ttf', 'textfile': 'text.txt'})
+
+	assert TextRenderer.color('white') == (255, 255, 255, 255)
+	assert TextRenderer.color('0xFF0000') == (255, 0, 0, 255)
+	assert TextRenderer.color('black@0.5') == (0, 0, 0, 128)
+	assert TextRenderer.color('#00FF0080') == (0, 255, 0, 128)
+
+
+"""
+test_text_renderer_render
+"""
+
+
+def test_text_renderer_render(tmp_path):
+	renderer = TextRenderer(AssetCache(str(tmp_path / 'cache')))
+	kwargs = {'fontfile': find_font(), 'fontsize': 32, 'fontcolor': 'white', 'x': 100, 'y': 50, 'box': 1, 'boxborderw': 8}
+
+	path, x, y = renderer.render('Up next', kwargs)
+
+	# the box reaches boxborderw past the text on each side
+	assert (x, y) == (92, 42)
+
+	with Image.open(path) as im:
+		assert im.mode == 'RGBA'
+		assert im.size[0] > 16 and im.size[1] > 16
+
+	# the same text and style anywhere else reuses the image
+	assert renderer.render('Up next', dict(kwargs, x=0, y=0)) == (path, -8, -8)
+	assert TextRenderer(AssetCache(str(tmp_path / 'cache'))).render('Up next', kwargs) == (path, x, y)
+	assert renderer.render('Up later', kwargs)[0] != path
+
+
+"""
+test_filter_draw_text
+"""
+
+
+def test_filter_draw_text(tmp_path):
+	AssetCache.set_default(AssetCache(str(tmp_path / 'cache')))
+
+	try:
+		font = find_font()
+		playlist = Playlist('text.json')
+		playlist.output().resolution().parse_str('1280x720')
+		entry = PlaylistEntry(MediaInfo.from_probe_data('clip.mp4', {'streams': [{'codec_type': 'video', 'width': 1280, 'height': 720, 'duration': '120.0'}]}))
+		options = {'text': 'Up next', 'duration': 5.0, 'interval': 60, 'fallback_divisor': 2, 'kwargs': {'fontfile': font, 'x': 10, 'y': 10}}
+
+		video = ffmpeg.input('clip.mp4')
+		rendered, _ = IntervalTextFilter().apply(playlist, entry, video.video, video.audio, copy.deepcopy(options))
+		args = ' '.join(ffmpeg.output(rendered, 'out.ts').compile())
+
+		assert 'overlay=enable=' in args
+		assert 'drawtext' not in args
+
+		drawn, _ = IntervalTextFilter().apply(playlist, entry, video.video, video.audio, dict(copy.deepcopy(options), prerender=False))
+
+		assert 'drawtext' in ' '.join(ffmpeg.output(drawn, 'out.ts').compile())
+	finally:
+		AssetCache.set_default(None)
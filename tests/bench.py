@@ -0,0 +1,125 @@
+import json
+from ffstream.assets import AssetCache
+from ffstream.bench import FilterBenchmark, FilterBenchmarkError, ProfileBenchmark, BenchProfileCommand
+from ffstream.filter import ContinuousTextFilter, IntervalTextFilter, ImageOverlayFilter, VideoInformationFilter
+from ffstream.graph import EncoderGraph
+from ffstream.playlist import Playlist
+
+
+"""
+test_filter_benchmark_parse
+"""
+
+
+def test_filter_benchmark_parse():
+	output = 'frame=  250\nbench: utime=3.250s stime=0.750s rtime=2.000s\nbench: maxrss=81234KiB\n'
+
+	assert FilterBenchmark.parse(output) == {'utime': 3.25, 'stime': 0.75, 'rtime': 2.0, 'maxrss': 81234}
+
+	try:
+		FilterBenchmark.parse('Conversion failed!')
+		assert False
+	except FilterBenchmarkError:
+		pass
+
+
+"""
+test_filter_benchmark_build
+"""
+
+
+def test_filter_benchmark_build():
+	playlist = Playlist('bench.json')
+	playlist.output().resolution().parse_str('1280x720')
+	benchmark = FilterBenchmark(playlist, 5)
+
+	assert benchmark.entry().output_duration() == 5.0
+
+	args = benchmark.build([(ContinuousTextFilter(), {'text': 'On air', 'prerender': False, 'kwargs': {}})]).compile()
+
+	assert '-benchmark' in args
+	assert 'testsrc2=size=1280x720:rate=25' in args
+	assert any('drawtext' in arg for arg in args)
+	assert '-' in args
+
+
+"""
+test_filter_sample_options
+"""
+
+
+def test_filter_sample_options(tmp_path):
+	AssetCache.set_default(AssetCache(str(tmp_path / 'cache')))
+
+	try:
+		playlist = Playlist('bench.json')
+		playlist.output().resolution().parse_str('1280x720')
+		benchmark = FilterBenchmark(playlist, 5)
+
+		for handler in (ContinuousTextFilter(), IntervalTextFilter(), ImageOverlayFilter(), VideoInformationFilter()):
+			options = handler.sample_options(str(tmp_path))
+			handler.validate(options)
+
+			args = benchmark.build([(handler, options)]).compile()
+			filters = args[args.index('-filter_complex') + 1]
+
+			assert filters.count('drawtext') + filters.count('overlay') > 0
+	finally:
+		AssetCache.set_default(None)
+
+
+"""
+test_profile_benchmark_candidates
+"""
+
+
+def test_profile_benchmark_candidates():
+	candidates = ProfileBenchmark.candidates(['fast', 'slow'], [23, 20], ['1300k', '2.5M'])
+
+	# slowest preset first, then the lowest crf, then the highest maxrate
+	assert candidates[:3] == [('slow', 20, '2.5M'), ('slow', 20, '1300k'), ('slow', 23, '2.5M')]
+	assert candidates[-1] == ('fast', 23, '1300k')
+
+	try:
+		ProfileBenchmark.candidates(['warp'], [None], [None])
+		assert False
+	except ValueError:
+		pass
+
+
+"""
+test_profile_benchmark_encoder_args
+"""
+
+
+def test_profile_benchmark_encoder_args():
+	playlist = Playlist('bench.json')
+	playlist.output().set_destination('rtmp://example/live')
+	graph = EncoderGraph(playlist, ProfileBenchmark.candidate('slow', 20, '2500k'))
+
+	args = graph.build(source='sample.ts', destination='encoded').global_args('-benchmark').compile()
+
+	assert '-re' not in args
+	assert args[args.index('-i') + 1] == 'sample.ts'
+	assert args[args.index('-preset') + 1] == 'slow'
+	assert args[args.index('-crf') + 1] == '20'
+	assert args[args.index('-bufsize') + 1] == '5000k'
+	assert 'encoded' in args and 'rtmp://example/live' not in args
+	assert '-benchmark' in args
+
+
+"""
+test_profile_benchmark_write
+"""
+
+
+def test_profile_benchmark_write(tmp_path):
+	path = tmp_path / 'playlist.json'
+	path.write_text(json.dumps({'name': 'Bench', 'profile': {'encoder': {'global': [], 'input': {}, 'output': {'c:v': 'libx264', 'preset': 'medium'}}}, 'entries': []}))
+
+	BenchProfileCommand.write(str(path), {'preset': 'slow', 'crf': '20'})
+
+	document = json.loads(path.read_text())
+
+	assert document['name'] == 'Bench'
+	assert document['profile']['encoder']['output'] == {'c:v': 'libx264', 'preset': 'slow', 'crf': '20'}
@@ -0,0 +1,141 @@
+import os
+import json
+import pytest
+from ffstream.compiled import CompiledPlaylist, CompiledPlaylistWriter, CompiledPlaylistError
+from ffstream.loader import JsonPlaylistLoader, CompiledPlaylistLoader
+from ffstream.playlist import Playlist
+from .mock import application, playlist_with_entries
+
+
+"""
+test_compiled_playlist_roundtrip
+"""
+
+
+def test_compiled_playlist_roundtrip(tmp_path):
+	path = str(tmp_path / 'playlist.ffsp')
+	playlist = playlist_with_entries(5)
+
+	CompiledPlaylistWriter().write(playlist, path)
+
+	assert CompiledPlaylist.is_compiled(path) is True
+	assert CompiledPlaylist.is_compiled('tests/data/playlist.json') is False
+
+	with CompiledPlaylist(path) as compiled:
+		assert len(compiled) == 5
+		assert compiled.total_duration() == sum(e.output_duration() for e in playlist.entries())
+		assert list(compiled.column('duration')) == [10.0, 11.0, 12.0, 13.0, 14.0]
+
+		# repeated sources share a string id
+		sources = list(compiled.column('source'))
+		assert sources[0] == sources[3] and sources[1] == sources[4]
+		assert len(set(sources)) == 3
+
+		assert compiled.playlist().serialize() == Playlist('entries.json').serialize() | {
+			'name': 'Entries',
+			'output': playlist.output().serialize()
+		}
+
+		for i, entry in enumerate(compiled.entries()):
+			assert entry.serialize() == playlist.entries()[i].serialize()
+			assert entry.media_info().was_probed() is False
+
+		assert compiled.entry(1).profile() is compiled.entry(3).profile()
+
+
+"""
+test_compiled_playlist_entry_at
+"""
+
+
+def test_compiled_playlist_entry_at(tmp_path):
+	path = str(tmp_path / 'playlist.ffsp')
+	playlist = playlist_with_entries(4)
+
+	CompiledPlaylistWriter().write(playlist, path)
+
+	# output durations are 10, 10, 12 and 12 seconds
+	with CompiledPlaylist(path) as compiled:
+		assert compiled.entry_at(0.0) == 0
+		assert compiled.entry_at(9.99) == 0
+		assert compiled.entry_at(10.0) == 1
+		assert compiled.entry_at(43.9) == 3
+		assert compiled.entry_at(44.0) == -1
+		assert compiled.entry_at(-1.0) == -1
+
+
+"""
+test_compiled_playlist_errors
+"""
+
+
+def test_compiled_playlist_errors(tmp_path):
+	with pytest.raises(CompiledPlaylistError):
+		CompiledPlaylist('tests/data/playlist.json')
+
+	with pytest.raises(CompiledPlaylistError):
+		CompiledPlaylist(str(tmp_path / 'missing.ffsp'))
+
+	path = str(tmp_path / 'playlist.ffsp')
+	CompiledPlaylistWriter().write(playlist_with_entries(3), path)
+
+	with open(path, 'rb') as fp:
+		data = bytearray(fp.read())
+
+	header = CompiledPlaylist.HEADER.unpack_from(data, 0)
+	meta = json.loads(bytes(data[header[3]:header[3] + header[4]]))
+
+	def corrupt(name: str, meta_bytes: bytes) -> str:
+		corrupted = str(tmp_path / name)
+		with open(corrupted, 'wb') as fp:
+			fp.write(CompiledPlaylist.HEADER.pack(*header[:4], len(meta_bytes), header[5]))
+			fp.write(data[CompiledPlaylist.HEADER.size:header[3]] + meta_bytes)
+		return corrupted
+
+	missing = dict(meta)
+	del missing['strings']
+	past_end = json.loads(json.dumps(meta))
+	past_end['columns']['title'] = len(data)
+
+	paths = [
+		corrupt('broken.ffsp', b'{"columns": '),
+		corrupt('missing.ffsp', json.dumps(missing).encode('utf8')),
+		corrupt('past-end.ffsp', json.dumps(past_end).encode('utf8')),
+		corrupt('listed.ffsp', b'[]')
+	]
+
+	opened = len(os.listdir('/proc/self/fd')) if os.path.isdir('/proc/self/fd') else None
+
+	# a valid header does not let corrupt metadata through, and the rejected file is closed
+	for corrupted in paths:
+		with pytest.raises(CompiledPlaylistError):
+			CompiledPlaylist(corrupted)
+
+	if opened is not None:
+		assert len(os.listdir('/proc/self/fd')) == opened
+
+	# a failed write leaves nothing behind
+	os.mkdir(str(tmp_path / 'directory.ffsp'))
+
+	with pytest.raises(CompiledPlaylistError):
+		CompiledPlaylistWriter().write(playlist_with_entries(3), str(tmp_path / 'directory.ffsp'))
+
+	assert not os.path.exists(str(tmp_path / 'directory.ffsp.tmp'))
+
+
+"""
+test_compiled_playlist_loader
+"""
+
+
+def test_compiled_playlist_loader(tmp_path):
+	path = str(tmp_path / 'playlist.ffsp')
+	expected = JsonPlaylistLoader(application()).load('tests/data/playlist.json', {'lazy': True})
+
+	CompiledPlaylistWriter().write(expected, path)
+
+	playlist = CompiledPlaylistLoader(application()).load(path, {'lazy': True})
+	serialized = playlist.serialize()
+
+	assert playlist.path() == path
+	assert serialized == expected.serialize()
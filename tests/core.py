@@ -0,0 +1,89 @@
+import os
+import re
+import sys
+import subprocess
+from ffstream.core import Application
+from ffstream.compile import CompilePlaylistCommand
+from .mock import registered_application
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+"""
+test_application_register_command
+"""
+
+
+def test_application_register_command(monkeypatch):
+	# a fresh application for its own command table, the shared singleton is restored after
+	monkeypatch.setattr(Application, 'singleton', None)
+	application = Application()
+	application.register_command('playlist:compile', 'ffstream.compile:CompilePlaylistCommand', 'Compiles')
+	application.register_command('bench:filters', 'ffstream.compile:CompilePlaylistCommand', 'Wrong class')
+
+	assert application.command_names() == ['playlist:compile', 'bench:filters']
+	assert application.command_description('playlist:compile') == 'Compiles'
+	assert application.command('missing') is None
+
+	command = application.command('playlist:compile')
+
+	assert isinstance(command, CompilePlaylistCommand)
+	assert command.application() is application
+	assert application.command('playlist:compile') is command
+
+	# the reference has to name the command it is registered as
+	try:
+		application.command('bench:filters')
+		assert False
+	except ImportError:
+		pass
+
+	# a command added as an instance is not replaced by a later registration
+	added = CompilePlaylistCommand(application)
+	application.add_command(added)
+	application.register_command('playlist:compile', 'ffstream.missing:Command')
+
+	assert application.command('playlist:compile') is added
+
+
+"""
+test_application_registered_descriptions
+"""
+
+
+def test_application_registered_descriptions(monkeypatch):
+	application = registered_application(monkeypatch)
+
+	assert len(application.command_names()) == 10
+
+	# the help shows the description ffstream.py registers, it has to stay the command's own
+	for name in application.command_names():
+		assert application.command_description(name) == application.command(name).description()
+
+
+"""
+test_cold_start
+"""
+
+
+def test_cold_start():
+	p = subprocess.run(
+		[sys.executable, '-X', 'importtime', os.path.join(ROOT, 'ffstream.py'), '-h'],
+		stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=ROOT
+	)
+
+	assert p.returncode == 0
+	assert b'stream:playlist' in p.stdout
+
+	imported = []
+
+	# only which modules are imported is checked, how long they take depends on the machine
+	for line in p.stderr.decode('utf8', 'replace').splitlines():
+		match = re.match(r'import time:\s+\d+ \|\s+\d+ \|\s*(\S+)', line)
+		if match is not None:
+			imported.append(match.group(1))
+
+	# listing the commands imports none of them, nor what they need to run
+	assert not [name for name in imported if name.split('.')[0] in ('ffmpeg', 'PIL', 'curses')]
+	assert not [name for name in imported if name.startswith('ffstream.') and name not in ('ffstream.core', 'ffstream.registry', 'ffstream.util', 'ffstream.version')]
+	assert 'ffstream.core' in imported
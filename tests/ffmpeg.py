@@ -1,5 +1,9 @@
+import os
+import sys
+import time
+import signal
 import pytest
-from ffstream.ffmpeg import ArgumentContainer
+from ffstream.ffmpeg import ArgumentContainer, FfmpegProcessThread, EncoderProcessThread, DecoderProcessThread, Profile, ProfileCompiler, ProfileError
 from collections import OrderedDict
 
 """
@@ -48,4 +52,138 @@ def test_argument_container_default():
 	assert 'bin' in args.output_args()
 	assert 'foo' in args.output_args()
 	assert args.output_args()['bin'] == 'baz'
-	assert args.output_args()['foo'] == 'bar'
\ No newline at end of file
+	assert args.output_args()['foo'] == 'bar'
+
+def python_args(code: str) -> list:
+	return [sys.executable, '-c', code]
+
+
+"""
+test_process_supervisor_pump
+"""
+
+
+def test_process_supervisor_pump():
+	encoder = EncoderProcessThread(args=python_args('import sys; data = sys.stdin.buffer.read(); sys.stderr.write("got %d\\n" % len(data))'))
+	decoder = DecoderProcessThread(args=python_args('import sys; sys.stdout.buffer.write(b"x" * 100000); sys.stderr.write("decoded\\n")'))
+
+	encoder.run()
+	decoder.run()
+
+	assert decoder.pump(encoder) == 100000
+	assert decoder.stop() == 0
+	assert decoder.errors() == ['decoded']
+	assert encoder.stop() == 0
+	assert encoder.errors() == ['got 100000']
+	assert encoder.stats()['running'] is False
+	assert encoder.stats()['uptime'] > 0
+
+
+"""
+test_process_supervisor_stop
+"""
+
+
+def test_process_supervisor_stop(monkeypatch):
+	monkeypatch.setattr(FfmpegProcessThread, 'KILL_TIMEOUT', 0.2)
+
+	# ignores both a closed stdin and SIGTERM, only SIGKILL stops it
+	supervisor = FfmpegProcessThread(args=python_args('import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); import sys; sys.stderr.write("ready\\n"); sys.stderr.flush(); time.sleep(60)'))
+	supervisor.run()
+
+	# the handler has to be in place before stopping, else SIGTERM already ends it
+	deadline = time.monotonic() + 10
+
+	while 'ready' not in supervisor.errors(clear=False) and time.monotonic() < deadline:
+		time.sleep(0.01)
+
+	assert supervisor.is_running()
+	assert supervisor.stop(0.2) == -signal.SIGKILL
+	assert not supervisor.is_running()
+
+
+"""
+test_process_supervisor_restart
+"""
+
+
+def test_process_supervisor_restart():
+	supervisor = EncoderProcessThread(args=python_args('import sys; sys.exit(3)'), restarts=1, restart_delay=0)
+	supervisor.run().wait()
+
+	assert supervisor.should_restart()
+
+	supervisor.restart().wait()
+
+	assert supervisor.restarts() == 1
+	assert supervisor.returncode() == 3
+	assert not supervisor.should_restart()
+
+	supervisor.stop()
+
+	assert not supervisor.should_restart()
+
+
+"""
+test_process_supervisor_affinity
+"""
+
+
+def test_process_supervisor_affinity():
+	core = min(os.sched_getaffinity(0))
+	before = os.sched_getaffinity(0)
+	supervisor = FfmpegProcessThread(args=python_args('import os, sys; sys.stderr.write(",".join(str(c) for c in sorted(os.sched_getaffinity(0))) + "\\n")'), affinity=[core])
+	supervisor.run().wait()
+
+	assert supervisor.stop() == 0
+	assert supervisor.errors() == [str(core)]
+	# only the process is pinned, not the thread that started it
+	assert os.sched_getaffinity(0) == before
+
+
+"""
+test_profile_compiler
+"""
+
+
+def test_profile_compiler():
+	defaults = ArgumentContainer({
+		'global': ['-v', 'error', '-hide_banner'],
+		'input': OrderedDict({'re': None}),
+		'output': OrderedDict({'c:v': 'mpeg2video', 'intra': None, 'b:v': '51200k', 'f': 'mpegts'})
+	})
+	playlist = ArgumentContainer({'global': ['-loglevel', 'warning'], 'input': {}, 'output': OrderedDict({'codec:v': 'libx264', 'intra': False})})
+	entry = ArgumentContainer({'global': [], 'input': {'re': False}, 'output': {'b:v': '8M'}})
+	compiler = ProfileCompiler([], [defaults])
+
+	compiled = compiler.compile(defaults, playlist, entry)
+
+	assert compiled.global_args() == ('-loglevel', 'warning', '-hide_banner')
+	assert dict(compiled.input_args()) == {}
+	assert compiled.output_argv() == ('-codec:v', 'libx264', '-b:v', '8M', '-f', 'mpegts')
+
+	# the same layers are a cache hit, empty layers do not count
+	assert compiler.compile(defaults, ArgumentContainer(), playlist, entry) is compiled
+	assert compiler.compile(defaults, playlist) is not compiled
+
+	with pytest.raises(TypeError):
+		compiled.output_args()['f'] = 'flv'
+
+
+"""
+test_profile_compiler_validate
+"""
+
+
+def test_profile_compiler_validate():
+	ProfileCompiler.validate(Profile.ffplayout_encoder())
+	ProfileCompiler.validate(Profile.ffplayout_decoder())
+
+	with pytest.raises(ProfileError, match='Conflicting output options b:a and ab'):
+		ProfileCompiler.validate(ArgumentContainer({'global': [], 'input': {}, 'output': {'b:a': '128k', 'ab': '64k'}}))
+
+	with pytest.raises(ProfileError, match='Conflicting global options -v and -loglevel'):
+		ProfileCompiler.validate(ArgumentContainer({'global': ['-v', 'error', '-loglevel', 'info'], 'input': {}, 'output': {}}))
+
+	with pytest.raises(ProfileError):
+		ProfileCompiler.validate(ArgumentContainer({'global': [], 'input': {'re': True}, 'output': {}}))
@@ -0,0 +1,158 @@
+from PIL import Image
+from ffstream.assets import AssetCache
+from ffstream.filter import ImageOverlayFilter
+from ffstream.graph import DecoderGraph, EncoderGraph
+from ffstream.playlist import Playlist, PlaylistFilterEntry
+from .mock import probed_entry
+
+
+def output_playlist() -> Playlist:
+	playlist = Playlist('graph.json')
+	playlist.output().resolution().parse_str('1280x720')
+	return playlist
+
+
+"""
+test_decoder_graph_scale
+"""
+
+
+def test_decoder_graph_scale():
+	playlist = output_playlist()
+
+	graph = DecoderGraph(playlist, probed_entry('native.mp4', 1280, 720))
+	args = ' '.join(graph.build().compile())
+
+	assert 'scale' not in args
+	assert 'pad' not in args
+	assert graph.removed() == ['scale']
+
+	# a 4:3 source wider than the output still needs pillarboxing
+	args = ' '.join(DecoderGraph(playlist, probed_entry('square.mp4', 1440, 1080)).build().compile())
+
+	assert 'scale=960:720' in args
+	assert 'pad=1280:720' in args
+
+	args = ' '.join(DecoderGraph(playlist, probed_entry('square.mp4', 1440, 1080), optimize=False).build().compile())
+
+	assert 'force_original_aspect_ratio=1' in args
+	assert 'pad' not in args
+
+	# an upscale to the output's aspect ratio needs no border, only the scale is kept
+	graph = DecoderGraph(playlist, probed_entry('small.mp4', 640, 360))
+	args = ' '.join(graph.build().compile())
+
+	assert 'scale=1280:720' in args
+	assert 'pad' not in args
+	assert graph.removed() == ['pad']
+
+	assert DecoderGraph.scaled_size((1920, 1080), (1280, 720)) == (1280, 720)
+	assert DecoderGraph.scaled_size((720, 576), (1280, 720)) == (900, 720)
+
+
+"""
+test_decoder_graph_trim
+"""
+
+
+def test_decoder_graph_trim():
+	entry = probed_entry('trimmed.mp4', 1920, 1080, 60.0)
+	entry.set_start(10.0)
+	entry.set_end(40.0)
+
+	graph = DecoderGraph(output_playlist(), entry)
+	args = graph.build().compile()
+
+	assert args[args.index('-i') - 4:args.index('-i')] == ['-ss', '10.0', '-t', '30.0']
+	assert 'concat' not in ' '.join(args)
+	assert 'setpts=PTS-STARTPTS' in ' '.join(args)
+	assert graph.removed() == ['trim', 'atrim', 'concat']
+
+	args = ' '.join(DecoderGraph(output_playlist(), entry, optimize=False).build().compile())
+
+	assert 'trim=end=40.0:start=10.0' in args
+	assert 'concat' in args
+
+
+"""
+test_decoder_graph_fuse_overlays
+"""
+
+
+def test_decoder_graph_fuse_overlays(tmp_path):
+	AssetCache.set_default(AssetCache(str(tmp_path / 'cache')))
+
+	try:
+		playlist = output_playlist()
+
+		for name, color, position in (('logo', (255, 0, 0, 255), (20, 20)), ('bug', (0, 0, 255, 128), (20, 100))):
+			Image.new('RGBA', (80, 80), color).save(str(tmp_path / ('%s.png' % name)))
+			playlist.add_filter(PlaylistFilterEntry(ImageOverlayFilter(), {
+				'image': str(tmp_path / ('%s.png' % name)),
+				'kwargs': {'x': position[0], 'y': position[1]}
+			}))
+
+		graph = DecoderGraph(playlist, probed_entry('native.mp4', 1280, 720))
+		args = graph.build().compile()
+		filters = args[args.index('-filter_complex') + 1]
+
+		assert filters.count('overlay') == 1
+		assert 'overlay=eof_action=repeat:x=20:y=20' in filters
+		assert graph.removed() == ['scale', 'overlay']
+
+		composite = [arg for arg in args if arg.endswith('.png')]
+
+		assert len(composite) == 1
+
+		with Image.open(composite[0]) as im:
+			assert im.size == (80, 160)
+
+		args = DecoderGraph(playlist, probed_entry('native.mp4', 1280, 720), optimize=False).build().compile()
+
+		assert args[args.index('-filter_complex') + 1].count('overlay') == 2
+
+		# far apart the composite would cover more than it saves
+		playlist.filters()[1].options()['kwargs'] = {'x': 1180, 'y': 620}
+		args = DecoderGraph(playlist, probed_entry('native.mp4', 1280, 720)).build().compile()
+
+		assert args[args.index('-filter_complex') + 1].count('overlay') == 2
+	finally:
+		AssetCache.set_default(None)
+
+
+"""
+test_encoder_graph
+"""
+
+
+def test_encoder_graph(tmp_path):
+	AssetCache.set_default(AssetCache(str(tmp_path / 'cache')))
+
+	try:
+		playlist = output_playlist()
+		playlist.output().set_destination('rtmp://localhost/live')
+		Image.new('RGBA', (80, 80), (255, 0, 0, 255)).save(str(tmp_path / 'logo.png'))
+
+		logo = PlaylistFilterEntry(ImageOverlayFilter(), {'image': str(tmp_path / 'logo.png'), 'kwargs': {'x': 20, 'y': 20}}, encoder=True)
+		playlist.add_filter(logo)
+
+		assert logo.serialize()['encoder'] is True
+		assert playlist.decoder_filters() == []
+
+		# the logo is left out of every entry and drawn once by the encoder
+		args = DecoderGraph(playlist, probed_entry('native.mp4', 1280, 720)).build().compile()
+
+		assert 'overlay' not in ' '.join(args)
+
+		args = EncoderGraph(playlist).build().compile()
+
+		assert args[args.index('-i') + 1] == 'pipe:'
+		assert 'overlay' in args[args.index('-filter_complex') + 1]
+		assert 'rtmp://localhost/live' in args
+
+		playlist.filters().clear()
+		args = EncoderGraph(playlist).build().compile()
+
+		assert '-filter_complex' not in args
+	finally:
+		AssetCache.set_default(None)
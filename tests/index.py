@@ -0,0 +1,116 @@
+import os
+import json
+import pytest
+from ffstream.index import DirectoryIndex
+from ffstream.probe import ProbePool
+from ffstream.util import MediaInfo, MediaInfoError
+
+
+class FixtureProbePool(ProbePool):
+	def __init__(self, jobs: int = None):
+		super().__init__(jobs)
+		self.probed = []
+		with open('tests/data/probe-selective.json', 'r') as fp:
+			self._data = fp.read()
+
+	def probe(self, file_path: str):
+		self.probed.append(file_path)
+		if file_path.endswith('broken.mp4'):
+			raise MediaInfoError('Error probing %s' % file_path)
+		return MediaInfo.from_probe_data(file_path, json.loads(self._data))
+
+
+def touch(path, content: bytes = b'x'):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	with open(path, 'wb') as fp:
+		fp.write(content)
+
+
+"""
+test_directory_index_walk
+"""
+
+
+def test_directory_index_walk(tmp_path):
+	touch(str(tmp_path / 'a.mp4'))
+	touch(str(tmp_path / 'notes.txt'))
+	touch(str(tmp_path / 'show' / 'b.mkv'))
+	touch(str(tmp_path / 'show' / 'season' / 'c.webm'))
+
+	index = DirectoryIndex(str(tmp_path))
+	assert [os.path.basename(f[0]) for f in index.walk()] == ['a.mp4']
+
+	index = DirectoryIndex(str(tmp_path), recursive=True)
+	assert [os.path.basename(f[0]) for f in index.walk(4)] == ['a.mp4', 'b.mkv', 'c.webm']
+
+
+"""
+test_directory_index_update
+"""
+
+
+def test_directory_index_update(tmp_path):
+	touch(str(tmp_path / 'library' / 'a.mp4'))
+	touch(str(tmp_path / 'library' / 'b.mp4'))
+	touch(str(tmp_path / 'library' / 'broken.mp4'))
+	index_path = str(tmp_path / 'index.json')
+
+	pool = FixtureProbePool(2)
+	index = DirectoryIndex(str(tmp_path / 'library'), index_path)
+
+	assert index.update(pool) == (3, 0)
+	assert len(pool.probed) == 3
+	assert len(list(index.media())) == 2
+	assert 'error' in index.files()[str(tmp_path / 'library' / 'broken.mp4')]
+	index.write()
+
+	# a fresh index read back from disk probes nothing
+	pool = FixtureProbePool(2)
+	index = DirectoryIndex(str(tmp_path / 'library'), index_path)
+
+	assert index.update(pool) == (0, 0)
+	assert index.has_changes() is False
+	assert pool.probed == []
+
+	media = list(index.media())
+	assert media[0].source() == str(tmp_path / 'library' / 'a.mp4')
+	assert media[0].video_stream().duration() == 11.933
+
+	touch(str(tmp_path / 'library' / 'a.mp4'), b'changed')
+	os.remove(str(tmp_path / 'library' / 'b.mp4'))
+
+	assert index.update(pool) == (1, 1)
+	assert pool.probed == [str(tmp_path / 'library' / 'a.mp4')]
+	pool.shutdown()
+
+
+"""
+test_directory_index_verification
+"""
+
+
+def test_directory_index_verification(tmp_path):
+	touch(str(tmp_path / 'library' / 'a.mp4'))
+	touch(str(tmp_path / 'library' / 'b.mp4'))
+	a = str(tmp_path / 'library' / 'a.mp4')
+	b = str(tmp_path / 'library' / 'b.mp4')
+
+	index = DirectoryIndex(str(tmp_path / 'library'), str(tmp_path / 'index.json'))
+	index.update(FixtureProbePool())
+
+	assert index.unverified() == [a, b]
+
+	assert index.set_verification(a, {'errors': [], 'decoded_duration': 11.933}) is False
+	assert index.set_verification(b, {'errors': [], 'decoded_duration': 4.2}) is True
+
+	assert index.unverified() == []
+	assert index.quarantined() == [b]
+	assert [m.source() for m in index.media()] == [a]
+	assert len(list(index.media(include_quarantined=True))) == 2
+
+	# a changed file loses its verification and is checked again
+	touch(b, b'replaced')
+	index.update(FixtureProbePool())
+
+	assert index.unverified() == [b]
+	assert index.quarantined() == []
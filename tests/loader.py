@@ -0,0 +1,121 @@
+import io
+import json
+import pytest
+from ffstream.loader import JsonPlaylistLoader, StreamingJsonPlaylistLoader, JsonMemberReader, PlaylistLoaderError
+from ffstream.playlist import Playlist
+from ffstream.util import LazyMediaInfo
+from .mock import application
+
+
+"""
+test_json_loader_lazy
+"""
+
+
+def test_json_loader_lazy():
+	loader = JsonPlaylistLoader(application())
+
+	playlist = loader.load('tests/data/playlist.json', {
+		'lazy': True
+	})
+
+	assert playlist.entry_count() == 2
+
+	for entry in playlist.entries():
+		assert isinstance(entry.media_info(), LazyMediaInfo)
+		assert entry.media_info().was_probed() is False
+
+	assert playlist.entries()[0].source() == 'tests/data/short.mp4'
+	assert playlist.entries()[0].duration() == 11.933008
+	assert playlist.entries()[0].end() == 11.933008
+	assert playlist.entries()[1].source() == 'tests/data/medium.mp4'
+	assert playlist.entries()[1].duration() == 191.224933
+
+
+"""
+test_json_member_reader
+"""
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 64 * 1024])
+def test_json_member_reader(chunk_size, monkeypatch):
+	monkeypatch.setattr(JsonMemberReader, 'CHUNK_SIZE', chunk_size)
+
+	document = {
+		'name': 'Streamed',
+		'entries': [{'source': 'a.mp4', 'duration': 12345.678}, {'source': 'b "quoted" \\u00e9.mp4', 'duration': 10}, [], 7],
+		'loop': True,
+		'profile': {'encoder': {'global': [], 'input': {}, 'output': {'b:v': '800k'}}},
+		'count': 1234567
+	}
+
+	members = list(JsonMemberReader(io.StringIO(json.dumps(document, indent=4))).read())
+
+	assert members == [
+		('name', 'Streamed'),
+		('entries', {'source': 'a.mp4', 'duration': 12345.678}),
+		('entries', {'source': 'b "quoted" \\u00e9.mp4', 'duration': 10}),
+		('entries', []),
+		('entries', 7),
+		('loop', True),
+		('profile', document['profile']),
+		('count', 1234567)
+	]
+
+	assert list(JsonMemberReader(io.StringIO('{"entries": [], "name": "x"}')).read()) == [('name', 'x')]
+	assert list(JsonMemberReader(io.StringIO(' { } ')).read()) == []
+
+	with pytest.raises(PlaylistLoaderError):
+		list(JsonMemberReader(io.StringIO('{"entries": [{"source": "a.mp4"}, ')).read())
+
+
+"""
+test_streaming_json_loader
+"""
+
+
+def test_streaming_json_loader(monkeypatch):
+	monkeypatch.setattr(JsonMemberReader, 'CHUNK_SIZE', 16)
+
+	loader = StreamingJsonPlaylistLoader(application())
+	playlist = Playlist('tests/data/playlist.json')
+	stream = loader.stream(playlist, {
+		'lazy': True
+	})
+
+	first = next(stream)
+
+	# the header is applied before the first entry is handed out
+	assert first.source() == 'tests/data/short.mp4'
+	assert playlist.output().resolution().x() == 1280
+	assert playlist.entry_count() == 1
+
+	rest = list(stream)
+
+	assert [e.source() for e in rest] == ['tests/data/medium.mp4']
+
+	expected = JsonPlaylistLoader(application()).load('tests/data/playlist.json', {'lazy': True})
+
+	assert playlist.serialize() == expected.serialize()
+
+
+"""
+test_json_loader_profiles
+"""
+
+
+def test_json_loader_profiles(tmp_path):
+	playlist = JsonPlaylistLoader(application()).load('tests/data/playlist.json', {'lazy': True})
+
+	# identical entry profiles are loaded once, so they compile once
+	assert playlist.entries()[0].profile() is playlist.entries()[1].profile()
+
+	with open('tests/data/playlist.json', 'r') as fp:
+		document = json.load(fp)
+
+	document['entries'][1]['profile']['decoder']['output'] = {'c:v': 'libx264', 'vcodec': 'mpeg2video'}
+	path = tmp_path / 'conflicting.json'
+	path.write_text(json.dumps(document))
+
+	with pytest.raises(PlaylistLoaderError, match='Conflicting output options c:v and vcodec'):
+		JsonPlaylistLoader(application()).load(str(path), {'lazy': True})
@@ -1,6 +1,10 @@
+import os
+import json
+import runpy
+from ffstream.core import Application
 from ffstream.filter import Filter
-from ffstream.playlist import Playlist, PlaylistEntry
-from ffstream.util import MediaInfo
+from ffstream.playlist import Playlist, PlaylistEntry, PlaylistFilterEntry, PlaylistEntryProfile
+from ffstream.util import MediaInfo, LazyMediaInfo
 from ffmpeg.nodes import Node
 
 
@@ -12,8 +16,103 @@ class FilterMock(Filter):
 	def validate(self, options: dict):
 		return True
 
-	def preload(self, playlist: Playlist, entry: PlaylistEntry):
-		pass
+	def preload(self, playlist: Playlist, entry: PlaylistEntry, options: dict):
+		return None
 
 	def apply(self, playlist: Playlist, entry: PlaylistEntry, video: Node, audio: Node, apply_options: dict) -> [Node, Node]:
 		return video, audio
+
+
+class EncoderMock:
+	def __init__(self, args, argv: list, restarts: int = 0, affinity: list = None):
+		self._running = False
+
+	def run(self):
+		self._running = True
+
+	def is_running(self) -> bool:
+		return self._running
+
+	def should_restart(self) -> bool:
+		return False
+
+	def returncode(self):
+		return None if self._running else 0
+
+	def flush(self) -> bool:
+		return True
+
+	def errors(self) -> list:
+		return []
+
+	def stop(self, timeout: float = None):
+		self._running = False
+
+	def stats(self) -> dict:
+		return {}
+
+
+def registered_application(monkeypatch) -> Application:
+	"""
+	The application ffstream.py sets up, with everything it registers but without running a command
+	"""
+
+	monkeypatch.setattr(Application, 'singleton', None)
+	monkeypatch.setattr(Application, 'run', lambda application: 0)
+
+	runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ffstream.py'))['main']()
+
+	return Application.singleton
+
+
+def application() -> Application:
+	return Application.singleton if Application.singleton is not None else Application()
+
+
+def probed_entry(source: str, width: int = None, height: int = None, duration: float = None) -> PlaylistEntry:
+	"""
+	An entry probed as tests/data/probe-selective.json, a 1280x720 clip of about 12 seconds,
+	with the video size and the stream durations replaced when given
+	"""
+
+	with open('tests/data/probe-selective.json', 'r') as fp:
+		probe_data = json.load(fp)
+
+	for stream in probe_data['streams']:
+		if stream['codec_type'] == 'video' and width is not None:
+			stream['width'] = width
+			stream['height'] = height
+		if duration is not None:
+			stream['duration'] = str(duration)
+
+	return PlaylistEntry(MediaInfo.from_probe_data(source, probe_data))
+
+
+def playlist_with_entries(count: int, filters: bool = False) -> Playlist:
+	"""
+	Unprobed entries over three sources, every other one trimmed at the start, with an author
+	and sharing a profile. With filters the playlist and each entry carry a FilterMock
+	"""
+
+	playlist = Playlist('entries.json')
+	playlist.set_name('Entries')
+	playlist.output().resolution().parse_str('1920x1080')
+	profile = PlaylistEntryProfile({'decoder': {'global': [], 'input': {'re': None}, 'output': {}}})
+
+	if filters:
+		playlist.add_filter(PlaylistFilterEntry(FilterMock(), {'text': 'nested\nvalue'}))
+
+	for i in range(count):
+		entry = PlaylistEntry(LazyMediaInfo('media/%d.mp4' % (i % 3)))
+		entry.set_duration(10.0 + i)
+		entry.set_start(1.0 if i % 2 else 0.0)
+		entry.set_end(10.0 + i)
+		entry.set_title('Title "%d"' % i)
+		entry.set_author('Author' if i % 2 else '')
+		if i % 2:
+			entry.set_profile(profile)
+		if filters:
+			entry.add_filter(PlaylistFilterEntry(FilterMock(), {'x': i}))
+		playlist.add_entry(entry)
+
+	return playlist
@@ -1,8 +1,13 @@
+import gc
+import json
+import random
 import pytest
+import tracemalloc
 from ffstream.playlist import Playlist, PlaylistEntry, PlaylistOutput, PlaylistProfile, PlaylistEntryProfile, \
 								PlaylistFilterEntry, PlaylistQueue
 
-from ffstream.util import MediaInfo, VideoResolution
+from ffstream.rotation import AliasTable, Rotation
+from ffstream.util import MediaInfo, LazyMediaInfo, VideoResolution
 from ffstream.ffmpeg import ArgumentContainer
 from .mock import FilterMock
 
@@ -316,3 +321,152 @@ def test_playlist_queue_loop():
 	assert queue.queue()[0].source() == 'tests/data/medium.mp4'
 	assert queue.queue()[1].source() == 'tests/data/short.mp4'
 
+
+
+"""
+test_playlist_entry_memory
+"""
+
+
+def test_playlist_entry_memory():
+	with open('tests/data/probe.json', 'r') as fp:
+		raw = fp.read()
+
+	count = 10000
+
+	gc.collect()
+	tracemalloc.start()
+
+	entries = []
+	for i in range(count):
+		info = MediaInfo.from_probe_data('/library/show/episode-%05d.mp4' % i, json.loads(raw))
+		entries.append(PlaylistEntry(info))
+
+	used, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+
+	# full ffprobe dicts per entry used about 12kb each
+	assert used / count < 2048
+
+	assert entries[0].duration() == 11.933
+	assert entries[0].media_info().video_stream().resolution().x() == 1280
+	assert entries[0].media_info().audio_stream().sample_rate() == 44100
+	assert entries[0].profile() is entries[1].profile()
+	assert entries[0].has_filters() is False
+
+
+"""
+test_playlist_queue_quarantine
+"""
+
+
+def test_playlist_queue_quarantine():
+	with open('tests/data/probe-selective.json', 'r') as fp:
+		data = json.load(fp)
+
+	playlist = Playlist()
+	playlist.add_entry(PlaylistEntry(MediaInfo.from_probe_data('a.mp4', data)))
+	playlist.add_entry(PlaylistEntry(MediaInfo.from_probe_data('b.mp4', data)).set_quarantined(True))
+	playlist.add_entry(PlaylistEntry(MediaInfo.from_probe_data('c.mp4', data)))
+	playlist.set_should_loop(True)
+
+	queue = PlaylistQueue(playlist)
+
+	assert queue.next().source() == 'a.mp4'
+	assert queue.next().source() == 'c.mp4'
+	assert queue.next().source() in ('a.mp4', 'c.mp4')
+
+	for entry in playlist.entries():
+		entry.set_quarantined(True)
+
+	assert queue.next() is None
+
+
+"""
+test_playlist_rotation
+"""
+
+
+def test_playlist_rotation():
+	playlist = Playlist()
+	playlist.set_separation({'author': 2})
+
+	for i in range(60):
+		entry = PlaylistEntry(LazyMediaInfo('tests/data/%d.mp4' % i))
+		entry.set_author('author %d' % (i % 4))
+		playlist.add_entry(entry)
+
+	def repeats(entries: list, seed: int) -> list:
+		authors = [e.author() for e in Rotation(playlist.separation(), random.Random(seed)).order(entries)]
+		return [i for i in range(2, len(authors)) if authors[i] in authors[i - 2:i]]
+
+	passes = [repeats(playlist.entries(), seed) for seed in range(100)]
+
+	# a plain shuffle repeats an author within two entries about half the time, only the
+	# last few picks may be left without a choice
+	assert all(i >= 54 for found in passes for i in found)
+	assert sum(len(found) for found in passes) <= 150
+
+	# long passes keep their authors apart until the very end too
+	entries = [PlaylistEntry(LazyMediaInfo('tests/data/%d.mp4' % i)).set_author('author %d' % (i % 4)) for i in range(2000)]
+
+	for seed in range(10):
+		assert all(i >= 1960 for i in repeats(entries, seed))
+
+	playlist.shuffle()
+
+	assert len(set(e.source() for e in playlist.entries())) == 60
+
+
+"""
+test_rotation_weights
+"""
+
+
+def test_rotation_weights():
+	table = AliasTable([1.0, 3.0, 0.0, 4.0])
+	rng = random.Random(1)
+	counts = [0, 0, 0, 0]
+
+	for i in range(80000):
+		counts[table.pick(rng)] += 1
+
+	assert counts[2] == 0
+	assert abs(counts[0] / 80000 - 0.125) < 0.01
+	assert abs(counts[1] / 80000 - 0.375) < 0.01
+	assert abs(counts[3] / 80000 - 0.5) < 0.01
+
+	entries = []
+	for i, weight in enumerate([0.0, 1.0, 50.0]):
+		entries.append(PlaylistEntry(LazyMediaInfo('tests/data/%d.mp4' % i)).set_weight(weight))
+
+	firsts = [list(Rotation(rng=rng).order(entries))[0].source() for i in range(200)]
+
+	# heavy entries tend to come first, weightless ones always come last
+	assert firsts.count('tests/data/2.mp4') > 150
+	assert all(list(Rotation(rng=rng).order(entries))[-1].source() == 'tests/data/0.mp4' for i in range(20))
+
+
+"""
+test_playlist_queue_loop_separation
+"""
+
+
+def test_playlist_queue_loop_separation():
+	playlist = Playlist()
+	playlist.set_should_loop(True)
+	playlist.set_should_loop_shuffle(True)
+	playlist.set_separation({'source': 2})
+
+	for i in range(4):
+		playlist.add_entry(PlaylistEntry(LazyMediaInfo('tests/data/%d.mp4' % i)))
+
+	queue = PlaylistQueue(playlist)
+	played = []
+
+	for i in range(40):
+		played.append(queue.next().source())
+
+	# the last two played stay apart from the next, across loop boundaries too
+	for i in range(2, len(played)):
+		assert played[i] not in played[i - 2:i]
@@ -0,0 +1,95 @@
+import json
+import threading
+from ffstream.playlist import Playlist, PlaylistEntry, PlaylistFilterEntry
+from ffstream.preload import FilterPreloader
+from ffstream.util import MediaInfo
+from .mock import FilterMock
+
+
+class CountingFilterMock(FilterMock):
+	def __init__(self, options: dict = None):
+		super().__init__(options)
+		self.calls = []
+		self.release = threading.Event()
+		self.release.set()
+
+	def preload(self, playlist: Playlist, entry: PlaylistEntry, options: dict):
+		self.release.wait(5)
+		self.calls.append(entry.source())
+		if options.get('fail'):
+			raise ValueError('Failed preloading %s' % entry.source())
+		return 'prepared %s' % entry.source()
+
+
+def entry(source: str) -> PlaylistEntry:
+	with open('tests/data/probe-selective.json', 'r') as fp:
+		return PlaylistEntry(MediaInfo.from_probe_data(source, json.load(fp)))
+
+
+"""
+test_filter_prepared
+"""
+
+
+def test_filter_prepared():
+	playlist = Playlist('preload.json')
+	handler = CountingFilterMock()
+	first = entry('first.mp4')
+
+	assert handler.prepared(playlist, first, {'a': 1}) == 'prepared first.mp4'
+	assert handler.prepared(playlist, first, {'a': 1}) == 'prepared first.mp4'
+	assert handler.is_prepared(first, {'a': 1})
+	assert not handler.is_prepared(first, {'a': 2})
+	assert handler.calls == ['first.mp4']
+
+	# failures are raised to every caller and tried again
+	for i in range(2):
+		try:
+			handler.prepared(playlist, first, {'fail': True})
+			assert False
+		except ValueError:
+			pass
+
+	assert not handler.is_prepared(first, {'fail': True})
+	assert handler.calls == ['first.mp4'] * 3
+
+	handler.PRELOAD_CACHE_SIZE = 2
+	handler.prepared(playlist, entry('second.mp4'), {'a': 1})
+	handler.prepared(playlist, entry('third.mp4'), {'a': 1})
+
+	assert not handler.is_prepared(first, {'a': 1})
+
+
+"""
+test_filter_preloader
+"""
+
+
+def test_filter_preloader():
+	playlist = Playlist('preload.json')
+	shared = CountingFilterMock()
+	own = CountingFilterMock()
+	playlist.add_filter(PlaylistFilterEntry(shared, {'a': 1}))
+
+	upcoming = entry('upcoming.mp4')
+	upcoming.add_filter(PlaylistFilterEntry(own, {'b': 2}))
+
+	shared.release.clear()
+
+	with FilterPreloader(2) as preloader:
+		future = preloader.prefetch(playlist, upcoming)
+
+		assert future is not None
+		assert preloader.prefetch(playlist, upcoming) is None
+
+		shared.release.set()
+		future.result(5)
+
+		assert shared.is_prepared(upcoming, {'a': 1})
+		assert own.is_prepared(upcoming, {'b': 2})
+		assert preloader.prefetch(playlist, upcoming) is None
+
+	# playout picks up the prepared result instead of preloading again
+	assert shared.prepared(playlist, upcoming, {'a': 1}) == 'prepared upcoming.mp4'
+	assert shared.calls == ['upcoming.mp4']
+	assert own.calls == ['upcoming.mp4']
@@ -0,0 +1,131 @@
+import time
+import random
+from threading import Lock
+from ffstream.probe import ProbePool
+from ffstream.util import MediaInfoError
+
+
+class SleepingProbePool(ProbePool):
+	def __init__(self, jobs: int = None, mount_jobs: int = None):
+		super().__init__(jobs, mount_jobs)
+		self.active = 0
+		self.peak = 0
+		self._count_lock = Lock()
+
+	def probe(self, file_path: str):
+		semaphore = self._mount_semaphore(file_path)
+		if semaphore is not None:
+			semaphore.acquire()
+		try:
+			with self._count_lock:
+				self.active += 1
+				self.peak = max(self.peak, self.active)
+			time.sleep(random.uniform(0, 0.01))
+			with self._count_lock:
+				self.active -= 1
+			if file_path.endswith('.bad'):
+				raise MediaInfoError('Error probing %s' % file_path)
+			return file_path
+		finally:
+			if semaphore is not None:
+				semaphore.release()
+
+
+"""
+test_probe_pool_order
+"""
+
+
+def test_probe_pool_order():
+	sources = ['/tmp/%d.mp4' % i for i in range(50)]
+
+	with SleepingProbePool(8) as pool:
+		results = list(pool.map(sources))
+
+	assert [s for s, r in results] == sources
+	assert [r for s, r in results] == sources
+
+
+"""
+test_probe_pool_errors
+"""
+
+
+def test_probe_pool_errors():
+	sources = ['/tmp/a.mp4', '/tmp/b.bad', '/tmp/c.mp4', '/tmp/d.bad']
+
+	with SleepingProbePool(4) as pool:
+		results = list(pool.map(sources))
+
+	assert isinstance(results[1][1], MediaInfoError)
+	assert isinstance(results[3][1], MediaInfoError)
+	assert results[1][1].message() == 'Error probing /tmp/b.bad'
+	assert results[0][1] == '/tmp/a.mp4'
+	assert results[2][1] == '/tmp/c.mp4'
+
+
+"""
+test_probe_pool_mount_jobs
+"""
+
+
+def test_probe_pool_mount_jobs():
+	sources = ['/tmp/%d.mp4' % i for i in range(40)]
+
+	with SleepingProbePool(8, 2) as pool:
+		list(pool.map(sources))
+		assert pool.peak <= 2
+		assert pool.mount_point('/tmp/0.mp4') == pool.mount_point('/tmp/1.mp4')
+
+
+"""
+test_probe_pool_interning
+"""
+
+
+def test_probe_pool_interning():
+	class CountingProbePool(ProbePool):
+		probes = []
+
+		def probe(self, file_path: str):
+			self.probes.append(file_path)
+			return object()
+
+	sources = ['/tmp/a.mp4', '/tmp/b.mp4', '/tmp/a.mp4', '/tmp/a.mp4']
+
+	for jobs in (1, 4):
+		CountingProbePool.probes = []
+		with CountingProbePool(jobs) as pool:
+			results = list(pool.map(sources))
+
+		assert sorted(CountingProbePool.probes) == ['/tmp/a.mp4', '/tmp/b.mp4']
+		assert results[0][1] is results[2][1]
+		assert results[0][1] is results[3][1]
+		assert results[0][1] is not results[1][1]
+
+
+"""
+test_probe_pool_interning_bounded
+"""
+
+
+def test_probe_pool_interning_bounded(monkeypatch):
+	class CountingProbePool(ProbePool):
+		probes = []
+
+		def probe(self, file_path: str):
+			self.probes.append(file_path)
+			return object()
+
+	monkeypatch.setattr(ProbePool, 'INTERN_SIZE', 2)
+	sources = ['/tmp/a.mp4', '/tmp/b.mp4', '/tmp/a.mp4', '/tmp/c.mp4', '/tmp/d.mp4', '/tmp/a.mp4']
+
+	for jobs in (1, 4):
+		CountingProbePool.probes = []
+		with CountingProbePool(jobs) as pool:
+			results = list(pool.map(sources))
+
+		# a is shared while recent, then forgotten and probed again
+		assert CountingProbePool.probes.count('/tmp/a.mp4') == 2
+		assert results[0][1] is results[2][1]
+		assert results[0][1] is not results[5][1]
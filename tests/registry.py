@@ -0,0 +1,92 @@
+import importlib.metadata
+from ffstream import filter
+from ffstream.registry import FilterManager, FilterManagerError
+from .mock import FilterMock, registered_application
+
+
+class EntryPointMock:
+	def __init__(self, name: str, cls):
+		self.name = name
+		self.loads = 0
+		self._cls = cls
+
+	def load(self):
+		self.loads += 1
+		return self._cls
+
+
+"""
+test_filter_manager
+"""
+
+
+def test_filter_manager():
+	manager = FilterManager(discover=False)
+	manager.register('interval_text', 'ffstream.filter:IntervalTextFilter')
+	manager.add(FilterMock())
+
+	assert manager.has('interval_text')
+	assert manager.has('mock_filter')
+	assert not manager.has('missing')
+	assert manager.get('missing') is None
+	assert manager.names() == ['interval_text', 'mock_filter']
+
+	handler = manager.get('interval_text')
+
+	assert handler.name() == 'interval_text'
+	assert manager.get('interval_text') is handler
+
+	# the reference has to name the filter it is registered as
+	manager.register('image_overlay', 'ffstream.filter:IntervalTextFilter')
+	manager.register('broken', 'ffstream.missing:Filter')
+
+	for name in ('image_overlay', 'broken'):
+		try:
+			manager.get(name)
+			assert False
+		except FilterManagerError:
+			pass
+
+
+"""
+test_filter_manager_entry_points
+"""
+
+
+def test_filter_manager_entry_points(monkeypatch):
+	manager = FilterManager(discover=False)
+	entry_point = EntryPointMock('mock_filter', FilterMock)
+	manager.register('mock_filter', entry_point)
+
+	assert entry_point.loads == 0
+	assert isinstance(manager.get('mock_filter'), FilterMock)
+	assert manager.get('mock_filter') is manager.get('mock_filter')
+	assert entry_point.loads == 1
+
+	# python before 3.10 has no group argument and hands back every group at once
+	def entry_points(**kwargs):
+		if kwargs:
+			raise TypeError('entry_points() got an unexpected keyword argument')
+		return {FilterManager.ENTRY_POINT_GROUP: [EntryPointMock('mock_filter', FilterMock)]}
+
+	monkeypatch.setattr(importlib.metadata, 'entry_points', entry_points)
+	manager = FilterManager()
+
+	assert manager.get('missing') is None
+	assert isinstance(manager.get('mock_filter'), FilterMock)
+
+
+"""
+test_filter_manager_registered
+"""
+
+
+def test_filter_manager_registered(monkeypatch):
+	manager = registered_application(monkeypatch).filter_manager()
+	shipped = [cls for cls in vars(filter).values() if isinstance(cls, type) and issubclass(cls, filter.Filter) and cls is not filter.Filter]
+
+	assert len(shipped) == 4
+
+	# every filter ffstream ships can be used by the name it reports
+	for cls in shipped:
+		assert isinstance(manager.get(cls().name()), cls)
@@ -0,0 +1,94 @@
+import os
+import pytest
+from ffstream.ffmpeg import ProfileCompiler, Profile
+from ffstream.playlist import Playlist, PlaylistSegments, PlaylistError
+from ffstream.segments import SegmentedOutput, SegmentPublisher
+
+
+def touch(path, content: bytes, mtime: float):
+	path.write_bytes(content)
+	os.utime(str(path), (mtime, mtime))
+
+
+"""
+test_segmented_output_hls
+"""
+
+
+def test_segmented_output_hls(tmp_path):
+	playlist = Playlist('segments.json')
+	compiler = playlist.profile_compiler()
+	output = SegmentedOutput(PlaylistSegments({'seconds': 5, 'window': 4, 'staging': str(tmp_path / 'shm')}), str(tmp_path / 'www' / 'live.m3u8'))
+
+	# keyint=50 at 25 fps, segments are whole 2 second GOPs
+	layer = output.layer(compiler.encoder(playlist), 25)
+	args = compiler.encoder(playlist, layer).output_args()
+
+	assert output.manifest() == str(tmp_path / 'shm' / 'live.m3u8')
+	assert args['f'] == 'hls'
+	assert args['hls_time'] == '4'
+	assert args['hls_list_size'] == '4'
+	assert args['hls_segment_filename'] == str(tmp_path / 'shm' / 'live_%06d.ts')
+	assert 'temp_file' in args['hls_flags'] and 'delete_segments' in args['hls_flags']
+	assert 'flags' not in args
+	assert 'force_key_frames' not in args
+
+	with pytest.raises(PlaylistError):
+		PlaylistSegments({'format': 'rtmp'})
+
+
+"""
+test_segmented_output_dash
+"""
+
+
+def test_segmented_output_dash(tmp_path):
+	playlist = Playlist('segments.json')
+	playlist.set_profile_compiler(ProfileCompiler([Profile.default_encoder()], None))
+	output = SegmentedOutput(PlaylistSegments({'format': 'dash', 'seconds': 3}), str(tmp_path / 'live.mpd'))
+
+	# g=60 without a known frame rate, keyframes are forced at the boundaries
+	args = output.layer(playlist.profile_compiler().encoder(playlist)).output_args()
+
+	assert args['f'] == 'dash'
+	assert args['seg_duration'] == '3'
+	assert args['force_key_frames'] == 'expr:gte(t,n_forced*3)'
+	assert args['media_seg_name'].startswith('live_')
+
+
+"""
+test_segment_publisher
+"""
+
+
+def test_segment_publisher(tmp_path):
+	staging = tmp_path / 'shm'
+	target = tmp_path / 'www'
+	output = SegmentedOutput(PlaylistSegments({'staging': str(staging)}), str(target / 'live.m3u8'))
+	output.prepare()
+	publisher = SegmentPublisher(output)
+
+	touch(staging / 'live_000001.ts', b'a' * 100, 1000)
+	touch(staging / 'live.m3u8', b'#EXTM3U\nlive_000001.ts\n', 1001)
+	# still being written, newer than the playlist
+	touch(staging / 'live_000002.ts', b'b' * 10, 1002)
+	touch(staging / 'other.ts', b'c', 900)
+
+	assert publisher.publish() == 1
+	assert sorted(os.listdir(str(target))) == ['live.m3u8', 'live_000001.ts']
+	assert (target / 'live.m3u8').read_bytes() == b'#EXTM3U\nlive_000001.ts\n'
+
+	os.remove(str(staging / 'live_000001.ts'))
+	touch(staging / 'live.m3u8', b'#EXTM3U\nlive_000002.ts\n', 1003)
+
+	assert publisher.publish() == 1
+	assert sorted(os.listdir(str(target))) == ['live.m3u8', 'live_000002.ts']
+
+	stats = publisher.stats()
+
+	assert stats['segments'] == 2
+	assert stats['bytes'] == 110
+	assert stats['deleted'] == 1
+	assert stats['last_size'] == 10
+	assert stats['mean_size'] == 55
+	assert stats['max_latency'] > 0
@@ -0,0 +1,106 @@
+import time
+import json
+import pytest
+from ffstream.loader import StorePlaylistLoader, PlaylistLoaderError
+from ffstream.playlist import Playlist, PlaylistEntry
+from ffstream.store import PlaylistStore, PlaylistStoreError
+from ffstream.util import MediaInfo, LazyMediaInfo
+from .mock import application
+
+
+def store_with_entries(path: str) -> PlaylistStore:
+	store = PlaylistStore(path)
+
+	with open('tests/data/probe-selective.json', 'r') as fp:
+		probe_data = json.load(fp)
+
+	rows = [
+		('a.mp4', 'Episode 1', 'Alice', 1200.0, ['episode']),
+		('b.mp4', 'Episode 2', 'Alice', 2400.0, ['episode']),
+		('c.mp4', 'Trailer', 'Bob', 90.0, ['trailer']),
+		('d.mp4', 'Episode 100%', 'Bob', 1500.0, ['episode', 'special'])
+	]
+
+	for source, title, author, duration, tags in rows:
+		info = MediaInfo.from_probe_data(source, probe_data) if source == 'a.mp4' else LazyMediaInfo(source)
+		entry = PlaylistEntry(info)
+		entry.set_title(title)
+		entry.set_author(author)
+		entry.set_duration(duration)
+		entry.set_end(duration)
+		store.add_entry(entry, tags)
+
+	return store
+
+
+"""
+test_playlist_store_select
+"""
+
+
+def test_playlist_store_select(tmp_path):
+	with store_with_entries(str(tmp_path / 'library.db')) as store:
+		assert store.count() == 4
+		assert PlaylistStore.is_store(str(tmp_path / 'library.db')) is True
+		assert PlaylistStore.is_store('tests/data/playlist.json') is False
+
+		def sources(query):
+			return [r['source'] for r in store.select(query)]
+
+		assert sources({}) == ['a.mp4', 'b.mp4', 'c.mp4', 'd.mp4']
+		assert sources({'author': 'Alice', 'max_duration': 1800}) == ['a.mp4']
+		assert sources({'author': ['Alice', 'Bob'], 'order': 'duration'}) == ['c.mp4', 'a.mp4', 'd.mp4', 'b.mp4']
+		assert sources({'tags': ['episode', 'special']}) == ['d.mp4']
+		assert sources({'any_tags': ['trailer', 'special']}) == ['c.mp4', 'd.mp4']
+		assert sources({'title': '100%'}) == ['d.mp4']
+		assert sources({'order': 'duration', 'limit': 2}) == ['c.mp4', 'a.mp4']
+		assert sorted(sources({'order': 'random'})) == ['a.mp4', 'b.mp4', 'c.mp4', 'd.mp4']
+
+		store.mark_aired('a.mp4')
+		store.mark_aired('b.mp4', int(time.time()) - 30 * 24 * 3600)
+
+		assert sources({'not_aired_within': 7 * 24 * 3600}) == ['b.mp4', 'c.mp4', 'd.mp4']
+
+		with pytest.raises(PlaylistStoreError):
+			list(store.select({'unknown': True}))
+
+		with pytest.raises(PlaylistStoreError):
+			list(store.select({'order': 'sideways'}))
+
+
+"""
+test_playlist_store_loader
+"""
+
+
+def test_playlist_store_loader(tmp_path):
+	path = str(tmp_path / 'library.db')
+
+	with store_with_entries(path) as store:
+		header = Playlist(path)
+		header.set_name('Alice')
+		header.set_should_loop(True)
+		header.output().resolution().parse_str('1920x1080')
+		store.save_playlist('alice', header, {'author': 'Alice', 'order': 'duration'})
+
+		assert store.playlists() == ['alice']
+
+	loader = StorePlaylistLoader(application())
+	playlist = loader.load(path, {'playlist': 'alice', 'lazy': True})
+
+	assert playlist.name() == 'Alice'
+	assert playlist.should_loop() is True
+	assert playlist.output().resolution().x() == 1920
+	assert [e.source() for e in playlist.entries()] == ['a.mp4', 'b.mp4']
+	assert [e.title() for e in playlist.entries()] == ['Episode 1', 'Episode 2']
+
+	# stored probe data is used as is, the rest stays lazy
+	assert playlist.entries()[0].media_info().was_probed() is True
+	assert playlist.entries()[1].media_info().was_probed() is False
+	assert playlist.entries()[1].duration() == 2400.0
+
+	playlist = loader.load(path, {'query': {'author': 'Bob'}, 'lazy': True})
+	assert [e.source() for e in playlist.entries()] == ['c.mp4', 'd.mp4']
+
+	with pytest.raises(PlaylistLoaderError):
+		loader.load(path, {'playlist': 'missing', 'lazy': True})
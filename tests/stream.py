@@ -0,0 +1,146 @@
+import sys
+import json
+from collections import Counter
+from ffstream import stream
+from ffstream.compiled import CompiledPlaylistWriter
+from ffstream.loader import JsonPlaylistLoader
+from ffstream.store import PlaylistStore
+from ffstream.stream import StreamPlaylistCommand
+from .mock import EncoderMock, application, probed_entry
+
+
+def play(monkeypatch, *argv, fail_at: int = None) -> (list, StreamPlaylistCommand):
+	"""
+	Run stream:playlist with a mocked encoder, recording the source of every entry played.
+	Playing fails once after fail_at entries, which starts the next pass of a looped playlist
+	"""
+
+	played = []
+
+	def play_entry(command, entry):
+		played.append(entry.source())
+		return len(played) != fail_at
+
+	monkeypatch.setattr(stream, 'EncoderProcessThread', EncoderMock)
+	monkeypatch.setattr(StreamPlaylistCommand, '_play_entry', play_entry)
+	monkeypatch.setattr(sys, 'argv', ['ffstream.py', 'stream:playlist'] + list(argv))
+
+	command = StreamPlaylistCommand(application())
+	command.init()
+	command.run()
+
+	return played, command
+
+
+def write_playlist(path, count: int, **members) -> str:
+	with open('tests/data/playlist.json', 'r') as fp:
+		document = json.load(fp)
+
+	document.update(members)
+
+	template = document['entries'][0]
+	document['entries'] = [dict(template, source='tests/data/%d.mp4' % i) for i in range(count)]
+
+	with open(str(path), 'w') as fp:
+		json.dump(document, fp)
+
+	return str(path)
+
+
+"""
+test_stream_playlist_streaming_plays_once
+"""
+
+
+def test_stream_playlist_streaming_plays_once(monkeypatch, tmp_path):
+	path = write_playlist(tmp_path / 'playlist.json', 200)
+
+	played, command = play(monkeypatch, '-p', path, '--streaming', '--lazy', '--lookahead', '0')
+
+	assert len(played) == 200
+	assert Counter(played) == Counter('tests/data/%d.mp4' % i for i in range(200))
+	assert played == ['tests/data/%d.mp4' % i for i in range(200)]
+
+
+"""
+test_stream_playlist_compiled_index_backed
+"""
+
+
+def test_stream_playlist_compiled_index_backed(monkeypatch, tmp_path):
+	sources = ['tests/data/%d.mp4' % i for i in range(200)]
+	path = write_playlist(tmp_path / 'playlist.json', 200, shuffle=True, loop=True)
+	compiled = str(tmp_path / 'playlist.ffsp')
+
+	CompiledPlaylistWriter().write(JsonPlaylistLoader(application()).load(path, {'lazy': True}), compiled)
+
+	played, command = play(monkeypatch, '-p', compiled, '--lazy', '--lookahead', '0', fail_at=200)
+
+	# every pass plays each entry once, a pass that is not reshuffled repeats the first
+	assert len(played) == 400
+	assert sorted(played[:200]) == sorted(sources)
+	assert played[:200] != sources
+	assert played[200:] == played[:200]
+
+	# entries were only materialized as they played, none were kept
+	assert command.playlist().entry_count() == 0
+
+
+"""
+test_stream_playlist_shuffle_fed
+"""
+
+
+def test_stream_playlist_shuffle_fed(monkeypatch, tmp_path):
+	sources = ['tests/data/%d.mp4' % i for i in range(200)]
+	path = write_playlist(tmp_path / 'playlist.json', 200, shuffle=True, loop=True)
+
+	# the first pass is cut short, the rest of its rotation is dropped with the feed
+	played, command = play(monkeypatch, '-p', path, '--lazy', '--lookahead', '0', fail_at=50)
+
+	assert len(played) == 250
+	assert sorted(played[50:]) == sorted(sources)
+	assert played[:50] == played[50:100]
+	assert played[50:] != sources
+
+	# a reshuffled pass plays each entry once too, in a new order
+	path = write_playlist(tmp_path / 'reshuffled.json', 200, shuffle=True, loop=True, loop_shuffle=True)
+	played, command = play(monkeypatch, '-p', path, '--lazy', '--lookahead', '0', fail_at=200)
+
+	assert len(played) == 400
+	assert sorted(played[:200]) == sorted(played[200:]) == sorted(sources)
+	assert played[:200] != played[200:]
+
+
+"""
+test_stream_playlist_check_closes_library
+"""
+
+
+def test_stream_playlist_check_closes_library(monkeypatch, tmp_path):
+	path = str(tmp_path / 'library.db')
+	playlist = JsonPlaylistLoader(application()).load(write_playlist(tmp_path / 'playlist.json', 0), {'lazy': True})
+
+	with PlaylistStore(path) as store:
+		for source in ('a.mp4', 'b.mp4'):
+			entry = probed_entry(source)
+			entry.set_duration(10.0)
+			entry.set_end(10.0)
+			store.add_entry(entry)
+
+		store.save_playlist('all', playlist, {})
+
+	closed = []
+	close = PlaylistStore.close
+
+	def record_close(store):
+		closed.append(store.path())
+		close(store)
+
+	monkeypatch.setattr(PlaylistStore, 'close', record_close)
+
+	played, command = play(monkeypatch, '-p', path, '-n', 'all', '--check-playlist')
+
+	assert played == []
+	assert command.playlist().entry_count() == 2
+	assert closed == [path]
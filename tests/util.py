@@ -0,0 +1,72 @@
+import json
+import pytest
+from ffstream.util import MediaInfo, MediaInfoError
+
+"""
+test_media_info_probe_args
+"""
+
+
+def test_media_info_probe_args():
+	args = MediaInfo.probe_args('tests/data/short.mp4', MediaInfo.PROBE_ENTRIES)
+
+	assert args[0] == 'ffprobe'
+	assert '-show_streams' not in args
+	assert '-show_format' not in args
+	assert args[args.index('-show_entries') + 1] == MediaInfo.PROBE_ENTRIES
+	assert '-select_streams' not in args
+	assert args[-1] == 'tests/data/short.mp4'
+
+	args = MediaInfo.probe_args('tests/data/short.mp4', MediaInfo.KEYFRAME_ENTRIES, 'v:0')
+
+	assert args[args.index('-select_streams') + 1] == 'v:0'
+
+
+"""
+test_media_info_from_probe_data
+"""
+
+
+def test_media_info_from_probe_data():
+	with open('tests/data/probe-selective.json', 'r') as fp:
+		info = MediaInfo.from_probe_data('tests/data/short.mp4', json.load(fp))
+
+	assert info.was_probed() is True
+	assert info.is_deep() is False
+	assert info.source() == 'tests/data/short.mp4'
+	assert info.video_stream_count() == 1
+	assert info.video_stream().duration() == 11.933
+	assert info.video_stream().resolution().x() == 1280
+	assert info.video_stream().resolution().y() == 720
+	assert info.video_stream().keyframes() is None
+	assert info.audio_stream().duration() == 11.933008
+	assert info.audio_stream().channels() == 2
+
+	with open('tests/data/probe.json', 'r') as fp:
+		data = json.load(fp)
+
+	data['keyframes'] = [0.0, 2.002, 4.004]
+	info = MediaInfo.from_probe_data('tests/data/short.mp4', data)
+
+	assert info.is_deep() is True
+	assert list(info.video_stream().keyframes()) == [0.0, 2.002, 4.004]
+	assert info.video_stream().frame_rate() == pytest.approx(29.97, 0.01)
+	assert info.video_stream().profile() == 'High'
+
+	with pytest.raises(MediaInfoError):
+		MediaInfo.from_probe_data('tests/data/short.mp4', {'streams': []})
+
+
+"""
+test_media_info_selective_payload
+"""
+
+
+def test_media_info_selective_payload():
+	with open('tests/data/probe.json', 'r') as fp:
+		full = fp.read()
+
+	with open('tests/data/probe-selective.json', 'r') as fp:
+		selective = fp.read()
+
+	assert len(selective) < len(full) / 4
@@ -0,0 +1,70 @@
+import json
+from ffstream.filter import ImageOverlayFilter, IntervalTextFilter
+from ffstream.playlist import Playlist, PlaylistEntry, PlaylistFilterEntry
+from ffstream.util import LazyMediaInfo
+from ffstream.validate import PlaylistValidator
+from .mock import probed_entry
+
+
+"""
+test_playlist_validator
+"""
+
+
+def test_playlist_validator(tmp_path):
+	playlist = Playlist('validated.json')
+	playlist.output().resolution().parse_str('1280x720')
+
+	image = tmp_path / 'logo.png'
+	image.write_bytes(b'png')
+	playlist.add_filter(PlaylistFilterEntry(ImageOverlayFilter(), {'image': str(image)}))
+
+	good = probed_entry('good.mp4')
+	good.set_start(1.0)
+	good.set_end(5.0)
+	good.add_filter(PlaylistFilterEntry(IntervalTextFilter(), {'text': 'Up next', 'duration': 5.0, 'interval': 60, 'fallback_divisor': 2, 'kwargs': {}}))
+	playlist.add_entry(good)
+
+	trimmed = probed_entry('trimmed.mp4')
+	trimmed.set_end(30.0)
+	playlist.add_entry(trimmed)
+
+	missing = probed_entry('missing.mp4')
+	missing.add_filter(PlaylistFilterEntry(ImageOverlayFilter(), {'image': str(tmp_path / 'missing.png')}))
+	missing.add_filter(PlaylistFilterEntry(IntervalTextFilter(), {'text': 'x', 'duration': 5.0, 'interval': 60, 'kwargs': {'fontfile': str(tmp_path / 'missing.ttf')}}))
+	playlist.add_entry(missing)
+
+	quarantined = probed_entry('quarantined.mp4').set_quarantined(True)
+	playlist.add_entry(quarantined)
+
+	report = PlaylistValidator(jobs=3).validate(playlist)
+
+	assert report['entries'] == 4
+	assert report['validated'] == 3
+	assert report['failed'] == 2
+	assert 'graph' in report['timing'] and 'probe' in report['timing']
+
+	failures = dict((f['source'], f) for f in report['failures'])
+
+	assert [e['check'] for e in failures['trimmed.mp4']['errors']] == ['trim']
+	# the text filter's options never went through validate(), so applying it fails too
+	assert [e['check'] for e in failures['missing.mp4']['errors']] == ['assets', 'assets', 'graph']
+	assert 'interval_text' in failures['missing.mp4']['errors'][2]['message']
+	assert failures['missing.mp4']['index'] == 2
+
+	# the report is plain json
+	json.dumps(report)
+
+
+"""
+test_playlist_validator_probe
+"""
+
+
+def test_playlist_validator_probe(tmp_path):
+	playlist = Playlist()
+	playlist.add_entry(PlaylistEntry(LazyMediaInfo(str(tmp_path / 'absent.mp4'))).set_end(10.0))
+
+	result = PlaylistValidator().validate_entry(playlist, 0, playlist.entries()[0])
+
+	assert [e['check'] for e in result['errors']] == ['probe']
@@ -0,0 +1,14 @@
+import pytest
+from ffstream.verify import MediaVerifier
+
+"""
+test_media_verifier_quarantine
+"""
+
+
+def test_media_verifier_quarantine():
+	assert MediaVerifier.is_quarantined({'errors': [], 'decoded_duration': 11.9}, 11.933) is False
+	assert MediaVerifier.is_quarantined({'errors': [], 'decoded_duration': 11.9}, None) is False
+	assert MediaVerifier.is_quarantined({'errors': ['Invalid NAL unit size'], 'decoded_duration': 11.9}, 11.933) is True
+	assert MediaVerifier.is_quarantined({'errors': [], 'decoded_duration': None}, 11.933) is True
+	assert MediaVerifier.is_quarantined({'errors': [], 'decoded_duration': 5.0}, 11.933) is True
@@ -0,0 +1,56 @@
+import os
+import json
+import pytest
+from ffstream.writer import JsonPlaylistWriter
+from .mock import playlist_with_entries
+
+
+"""
+test_json_playlist_writer
+"""
+
+
+@pytest.mark.parametrize('count', [0, 1, 3])
+def test_json_playlist_writer(tmp_path, count):
+	path = str(tmp_path / 'playlist.json')
+	playlist = playlist_with_entries(count, filters=True)
+
+	assert JsonPlaylistWriter().write(playlist, path) == count
+
+	# byte for byte what json.dumps of the whole playlist gives
+	with open(path, 'r') as fp:
+		assert fp.read() == json.dumps(playlist.serialize(), indent=4, sort_keys=False)
+
+	# entries handed in separately are written one at a time and not kept
+	header = playlist_with_entries(0, filters=True)
+
+	assert JsonPlaylistWriter().write(header, path, iter(playlist.entries())) == count
+	assert header.entry_count() == 0
+
+	with open(path, 'r') as fp:
+		assert json.load(fp) == playlist.serialize()
+
+
+"""
+test_json_playlist_writer_atomic
+"""
+
+
+def test_json_playlist_writer_atomic(tmp_path):
+	path = str(tmp_path / 'playlist.json')
+	playlist = playlist_with_entries(2, filters=True)
+
+	JsonPlaylistWriter().write(playlist, path)
+
+	def failing():
+		yield playlist.entries()[0]
+		raise RuntimeError('probe failed')
+
+	with pytest.raises(RuntimeError):
+		JsonPlaylistWriter().write(playlist_with_entries(0, filters=True), path, failing())
+
+	# the previous playlist is untouched and no temporary file is left behind
+	with open(path, 'r') as fp:
+		assert json.load(fp) == playlist.serialize()
+
+	assert os.listdir(str(tmp_path)) == ['playlist.json']